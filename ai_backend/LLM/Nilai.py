@@ -8,6 +8,8 @@ import json, requests
 import asyncio
 import aiohttp, re  # Add aiohttp for proper async HTTP requests
 
+from accounting import record_usage
+
 # API endpoint from sample.py
 API_URL = "https://nilai-a779.nillion.network/v1/chat/completions"
 
@@ -22,6 +24,8 @@ class NillionLLM(LLM):
     top_p: float = 0.95
     max_tokens: int = 2048
     create_kwargs: Optional[dict[str, Any]] = None
+    # nilRAG config (nilDB nodes) for the hosted retrieval; local retrieval is done in retrieval.py
+    nilrag: Optional[dict[str, Any]] = None
 
     @property
     def _llm_type(self) -> str:
@@ -53,13 +57,20 @@ class NillionLLM(LLM):
                     "top_p": self.top_p,
                     "max_tokens": self.max_tokens,
                     "stream": False,  # We're not streaming in the synchronous version
-                    "nilrag": {}
+                    "nilrag": self.nilrag or {}
                 }
                 
                 response = requests.post(API_URL, json=payload, headers=headers)
+                record_usage(calls=1, retries=1 if i else 0)
                 
                 if response.status_code == 200:
-                    text = response.json().get('choices')[0].get('message').get('content')
+                    json_response = response.json()
+                    usage = json_response.get('usage') or {}
+                    record_usage(
+                        prompt_tokens=usage.get('prompt_tokens', 0),
+                        completion_tokens=usage.get('completion_tokens', 0),
+                    )
+                    text = json_response.get('choices')[0].get('message').get('content')
                     if text:
                         if stop is not None:
                             text = enforce_stop_tokens(text, stop)
@@ -98,7 +109,7 @@ class NillionLLM(LLM):
                     "top_p": self.top_p,
                     "max_tokens": self.max_tokens,
                     "stream": True,  # Enable streaming
-                    "nilrag": {}
+                    "nilrag": self.nilrag or {}
                 }
                 
                 full_text = ""
@@ -106,6 +117,7 @@ class NillionLLM(LLM):
                 # Use aiohttp for proper async requests
                 async with aiohttp.ClientSession() as session:
                     async with session.post(API_URL, json=payload, headers=headers) as response:
+                        record_usage(calls=1, retries=1 if i else 0)
                         if response.status == 200:
                             # Process the streaming response properly
                             async for line in response.content:
@@ -199,6 +211,7 @@ class OGLLM(LLM):
 
                 print(f"Sending initial query with payload: {payload}")
                 response = requests.post(OG_URL, json=payload)
+                record_usage(calls=1, retries=1 if i else 0)
                 print(f"Initial response status: {response.status_code}")
 
                 if response.status_code == 200:
@@ -233,6 +246,7 @@ class OGLLM(LLM):
                         # Step 2: If fee settled successfully, retry the query
                         if settle_response.status_code == 200:
                             print("Fee settled successfully")
+                            record_usage(fee=extracted_fee)
                             
                             # Retry with the EXACT same extracted fee
                             retry_payload = {
@@ -243,6 +257,7 @@ class OGLLM(LLM):
                             
                             print(f"Retrying query with payload: {retry_payload}")
                             retry_response = requests.post(OG_URL, json=retry_payload)
+                            record_usage(calls=1, retries=1)
                             print(f"Retry response status: {retry_response.status_code}")
                             
                             if retry_response.status_code == 200:
@@ -0,0 +1,227 @@
+import os
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+import contextvars
+
+ACCOUNTING_DB = os.environ.get(
+    "ACCOUNTING_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "accounting.db")
+)
+# bearer token for the usage queries, which list conversation ids; unset keeps them disabled
+USAGE_ADMIN_TOKEN = os.environ.get("USAGE_ADMIN_TOKEN") or None
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 1.0  # seconds a record may wait in the queue before it is written
+FLUSH_TIMEOUT = 5.0   # seconds flush() waits for the writer before giving up
+
+GROUP_COLUMNS = ("conversation_id", "character", "provider")
+METRICS = ("requests", "prompt_tokens", "completion_tokens", "fee", "retries", "calls", "latency_ms")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    conversation_id TEXT,
+    character TEXT,
+    provider TEXT,
+    model TEXT,
+    status TEXT,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    fee REAL NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0,
+    calls INTEGER NOT NULL DEFAULT 0,
+    latency_ms REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS usage_conversation ON usage (conversation_id);
+CREATE INDEX IF NOT EXISTS usage_character ON usage (character);
+CREATE INDEX IF NOT EXISTS usage_provider ON usage (provider);
+CREATE INDEX IF NOT EXISTS usage_ts ON usage (ts);
+"""
+
+
+class AccountingUnavailable(Exception):
+    pass
+
+
+class UsageRecord:
+    """Usage of one /chat request; LLM clients add to it through record_usage()"""
+
+    def __init__(self, conversation_id, character, provider, model=None):
+        self.ts = time.time()
+        self.conversation_id = conversation_id
+        self.character = character
+        self.provider = provider
+        self.model = model
+        self.status = "ok"
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.fee = 0.0
+        self.retries = 0
+        self.calls = 0
+        self.latency_ms = 0.0
+        self._started = time.perf_counter()
+
+    def as_row(self):
+        return (
+            self.ts, self.conversation_id, self.character, self.provider, self.model, self.status,
+            self.prompt_tokens, self.completion_tokens, self.fee, self.retries, self.calls, self.latency_ms,
+        )
+
+
+class UsageWriter:
+    """Background thread that writes queued records to SQLite in batches"""
+
+    def __init__(self, path=ACCOUNTING_DB, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="usage-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, record):
+        self._ensure_started()
+        self._queue.put(record.as_row())
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """Wait until every submitted record has been handled, returns False on timeout or if the writer died"""
+        if self._thread is None:
+            return True
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._thread.is_alive():
+                    return False
+                self._queue.all_tasks_done.wait(min(remaining, 0.1))
+        return True
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.executescript(SCHEMA)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+
+    def _run(self):
+        conn = None
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                if conn is None:
+                    # retried with every batch, so the writer survives a database that can't be opened yet
+                    conn = self._connect()
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO usage (ts, conversation_id, character, provider, model, status, "
+                        "prompt_tokens, completion_tokens, fee, retries, calls, latency_ms) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        batch,
+                    )
+            except Exception as e:
+                print(f"Failed to write {len(batch)} usage records: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+writer = UsageWriter()
+atexit.register(writer.flush)
+
+_current_record = contextvars.ContextVar("usage_record", default=None)
+
+
+def begin_request(conversation_id, character, provider, model=None):
+    """Start accounting for the current request; LLM calls made until finish_request() are added to it"""
+    record = UsageRecord(conversation_id, character, provider, model)
+    record._token = _current_record.set(record)
+    return record
+
+
+def record_usage(prompt_tokens=0, completion_tokens=0, fee=0.0, retries=0, calls=0):
+    """Add usage to the request being accounted in this context, no-op outside of a request"""
+    record = _current_record.get()
+    if record is None:
+        return
+    record.prompt_tokens += prompt_tokens or 0
+    record.completion_tokens += completion_tokens or 0
+    record.fee += fee or 0.0
+    record.retries += retries
+    record.calls += calls
+
+
+def finish_request(record, status="ok"):
+    record.status = status
+    record.latency_ms = (time.perf_counter() - record._started) * 1000
+    _current_record.reset(record._token)
+    writer.submit(record)
+
+
+def _connect():
+    conn = sqlite3.connect(ACCOUNTING_DB)
+    conn.executescript(SCHEMA)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _query(sql, params):
+    """Rows of sql as dicts, raises AccountingUnavailable when the database can't be read"""
+    try:
+        conn = _connect()
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        raise AccountingUnavailable(f"Usage data is unavailable: {e}") from e
+
+
+def usage_by(group_by="conversation_id", order_by="fee", since=None, limit=50):
+    """Aggregate usage per conversation_id, character or provider, largest order_by first"""
+    if group_by not in GROUP_COLUMNS:
+        raise ValueError(f"group_by must be one of {GROUP_COLUMNS}")
+    if order_by not in METRICS:
+        raise ValueError(f"order_by must be one of {METRICS}")
+
+    writer.flush()
+    sql = (
+        f"SELECT {group_by} AS key, COUNT(*) AS requests, "
+        "SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens, "
+        "SUM(fee) AS fee, SUM(retries) AS retries, SUM(calls) AS calls, "
+        "SUM(latency_ms) AS latency_ms, AVG(latency_ms) AS avg_latency_ms, MAX(latency_ms) AS max_latency_ms, "
+        "MIN(ts) AS first_seen, MAX(ts) AS last_seen FROM usage"
+    )
+    params = []
+    if since is not None:
+        sql += " WHERE ts >= ?"
+        params.append(since)
+    sql += f" GROUP BY {group_by} ORDER BY {order_by} DESC LIMIT ?"
+    params.append(limit)
+
+    return _query(sql, params)
+
+
+def conversation_usage(conversation_id, limit=100):
+    """Per-request usage rows of one conversation, most recent first"""
+    writer.flush()
+    return _query("SELECT * FROM usage WHERE conversation_id = ? ORDER BY ts DESC LIMIT ?", (conversation_id, limit))
@@ -1,29 +1,172 @@
-def create_coin(coin_name, coin_symbol, coin_initial_supply):
-    import requests
-    
-    url = "https://agents-backend-ethglobal.vercel.app/api/action/createToken"
-    
-    data = {
-        "userAddress": "0x3ae7F2767111D8700F82122A373792B99d605749",
-        "name": coin_name,
-        "symbol": coin_symbol,
-        "initialSupply": coin_initial_supply,
-        "maxSupply": "1000000000000000000000000",
-        "initialPrice": "1",
-        "creatorLockupPeriod": "86400",
-        "lockLiquidity": True,
-        "liquidityLockPeriod": "2592000",
-        "CREATION_FEE": "0.0000000000000001"
-    }
-    
-    response = requests.post(url, json=data)
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {"success": False, "message": f"Error: {response.status_code}", "response": response.text}
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import Future
 
-def buy_coin(coin_name, coin_amount):
-    pass
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ResponseError
+
+CREATE_TOKEN_URL = os.environ.get(
+    "CREATE_TOKEN_URL", "https://agents-backend-ethglobal.vercel.app/api/action/createToken"
+)
+USER_ADDRESS = os.environ.get("CLAMPIFY_USER_ADDRESS", "0x3ae7F2767111D8700F82122A373792B99d605749")
+REQUEST_TIMEOUT = (5, 60)  # (connect, read) seconds, deployments take a while to confirm
+POOL_SIZE = 10
+IDEMPOTENCY_TTL = 24 * 3600
+LAUNCHED, REJECTED, UNKNOWN = "launched", "rejected", "unknown"
+
+# Curve and lockup parameters sent with every launch unless overridden
+DEFAULT_TOKEN_PARAMS = {
+    "maxSupply": "1000000000000000000000000",
+    "initialPrice": "1",
+    "creatorLockupPeriod": "86400",
+    "lockLiquidity": True,
+    "liquidityLockPeriod": "2592000",
+    "CREATION_FEE": "0.0000000000000001",
+}
+# The only parameters a caller may set per launch; the owner address, fee, max supply and lockups stay fixed
+ALLOWED_OVERRIDES = frozenset({"initialPrice"})
+
+
+def idempotency_key(*parts):
+    """Stable key for one launch, e.g. idempotency_key(conversation_id, name, symbol, supply)"""
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def failure(message, response=None):
+    return {"success": False, "message": message, "response": response}
+
+
+def unknown(message, response=None):
+    return dict(failure(message + " (the token may have been launched anyway)", response), unknown=True)
+
+
+def never_sent(error):
+    """Whether a requests error means the launch certainly did not reach the backend"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.RetryError):
+        # retries of 429 responses ran out
+        return True
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, (NewConnectionError, ResponseError))
+
+
+class CreateTokenClient:
+    """createToken over one pooled session, with idempotent launches.
+
+    Only failed connects and 429s are retried by the transport, a timed out or 5xx launch may
+    already be on chain. Launches with the same idempotency key share one request: a second call
+    while the first is in flight waits for it, and a later one gets the stored result, including
+    an "unknown" outcome. Only a launch that never reached the backend or got a 4xx can be retried.
+    """
 
+    def __init__(self, url=CREATE_TOKEN_URL, user_address=USER_ADDRESS, token_params=None,
+                 timeout=REQUEST_TIMEOUT, session=None, retries=3, idempotency_ttl=IDEMPOTENCY_TTL):
+        self.url = url
+        self.user_address = user_address
+        self.token_params = dict(DEFAULT_TOKEN_PARAMS, **(token_params or {}))
+        self.timeout = timeout
+        self.idempotency_ttl = idempotency_ttl
+        if session is None:
+            session = requests.Session()
+            retry = Retry(total=retries, connect=retries, read=0, status=retries, status_forcelist=(429,),
+                          allowed_methods=None, backoff_factor=0.5, respect_retry_after_header=True)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self._launches = {}  # idempotency key -> (Future, finished at)
+        self._lock = threading.Lock()
 
+    def payload(self, name, symbol, initial_supply, **overrides):
+        rejected = sorted(set(overrides) - ALLOWED_OVERRIDES)
+        if rejected:
+            raise ValueError(f"parameters that can't be overridden: {', '.join(rejected)}")
+        data = {"userAddress": self.user_address, "name": name, "symbol": symbol,
+                "initialSupply": str(initial_supply)}
+        data.update(self.token_params)
+        data.update(overrides)
+        return data
+
+    def _post(self, data, key=None):
+        """POST one launch, returns (result, outcome) with outcome one of LAUNCHED, REJECTED or UNKNOWN"""
+        headers = {"Idempotency-Key": key} if key else None
+        try:
+            response = self.session.post(self.url, json=data, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            if never_sent(e):
+                return failure(f"Error: {e}"), REJECTED
+            return unknown(f"Error: {e}"), UNKNOWN
+        if 400 <= response.status_code < 500:
+            return failure(f"Error: {response.status_code}", response.text), REJECTED
+        if response.status_code != 200:
+            return unknown(f"Error: {response.status_code}", response.text), UNKNOWN
+        try:
+            return response.json(), LAUNCHED
+        except ValueError:
+            return unknown("Error: invalid JSON in response", response.text), UNKNOWN
+
+    def create(self, name, symbol, initial_supply, idempotency_key=None, **overrides):
+        """Launch one token, returns the endpoint's JSON or a {"success": False, ...} dict.
+
+        The failure dict has "unknown": True when the request may have launched the token anyway
+        (timeout, 5xx); with an idempotency key that outcome is kept, and later calls get it back
+        instead of launching again.
+        """
+        data = self.payload(name, symbol, initial_supply, **overrides)
+        if idempotency_key is None:
+            return self._post(data)[0]
+
+        with self._lock:
+            self._expire()
+            entry = self._launches.get(idempotency_key)
+            if entry is not None:
+                future, owner = entry[0], False
+            else:
+                future, owner = Future(), True
+                self._launches[idempotency_key] = (future, None)
+        if not owner:
+            return future.result()
+
+        result, outcome = unknown("Error: launch did not complete"), UNKNOWN
+        try:
+            result, outcome = self._post(data, idempotency_key)
+        finally:
+            with self._lock:
+                if outcome == REJECTED:
+                    # the launch never reached the backend or was refused, a retry may try again
+                    del self._launches[idempotency_key]
+                else:
+                    self._launches[idempotency_key] = (future, time.time())
+            future.set_result(result)
+        return result
+
+    def _expire(self):
+        cutoff = time.time() - self.idempotency_ttl
+        for key in [k for k, (_, finished) in self._launches.items() if finished is not None and finished < cutoff]:
+            del self._launches[key]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = CreateTokenClient()
+        return _client
+
+
+def create_coin(coin_name, coin_symbol, coin_initial_supply, idempotency_key=None):
+    return get_client().create(coin_name, coin_symbol, coin_initial_supply, idempotency_key=idempotency_key)
+
+def buy_coin(coin_name, coin_amount):
+    pass
@@ -1,104 +1,115 @@
-from flask import Flask, request, Response
+from flask import Flask, request, Response, jsonify
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+import re
+import hmac
 import uuid
 from LLM.Nilai import NillionLLM, OGLLM
-from helpers import get_web3_prompt
-from api_handler import create_coin, buy_coin
+from prompts import system_prompt, compress_history
+from api_handler import create_coin, buy_coin, idempotency_key
+from retrieval import retrieve_context
+from accounting import (begin_request, finish_request, usage_by, conversation_usage, AccountingUnavailable,
+                        USAGE_ADMIN_TOKEN)
+from intents import IntentRouter
+from prefetch import SpeculativeCache
+from conversation_log import PersistentHistory
+from simulator import run_tool as run_simulation
+from snapshot import get_snapshot, SnapshotLoading
+from price_indexer import get_indexer, SOURCE_CURVE, SOURCE_DEX
+from governance_indexer import get_governance
+from compression import negotiate
+from ratelimit import (make_rate_limiter, check_chat_limits, FairScheduler, RateLimited, SchedulerTimeout,
+                       TRUSTED_PROXY_HOPS)
 app = Flask(__name__)
 CORS(app)
+if TRUSTED_PROXY_HOPS:
+    # only then is X-Forwarded-For set by our own proxies rather than by the client
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
 
-conversation_history = {}
+# conversations from before a restart are restored from the log the first time they are used;
+# the log is opened on the first request, in memory only if no directory is writable
+conversation_history = PersistentHistory()
+rate_limiter = make_rate_limiter()
+scheduler = FairScheduler()
+intent_router = IntentRouter()
+speculative = SpeculativeCache(scheduler=scheduler)
 
-@app.route('/chat', methods=['GET'])
-def chat():
-    query = request.args.get('query')
-    llm = request.args.get('llm')
-    if llm == "0g":
-        llm = OGLLM(
-            model="og-basic",
-            fallbackFee=0.000000000000000080000000000000005723
-        )
-    else:
-        llm = NillionLLM(
-            model="meta-llama/Llama-3.1-8B-Instruct",
-            temperature=0.2,
-            top_p=0.95,
-            max_tokens=2048
-        )
-        
-    print(query)
-    conversation_id = request.args.get('conversation_id')
-    character = request.args.get('character', 'blockchain-advisor')
+GOVERNANCE_QUESTION = re.compile(r"\b(proposals?|vot(e|es|ed|ing)|quorum|governance|dao)\b", re.I)
 
-    if not query:
-        return Response("Error: Query parameter is required", status=400, content_type="text/plain")
+# GET endpoints whose responses clients may revalidate with If-None-Match
+CACHEABLE_ENDPOINTS = {
+    'usage', 'usage_for_conversation', 'candles', 'tokens', 'token',
+    'governance_proposals', 'governance_proposal', 'prefetch_stats',
+}
 
-    if not conversation_id:
-        conversation_id = str(uuid.uuid4())
+@app.after_request
+def encode_response(response):
+    return negotiate(request, response, revalidate=request.endpoint in CACHEABLE_ENDPOINTS)
 
+def client_key():
+    # behind TRUSTED_PROXY_HOPS proxies ProxyFix has already put the client's address here
+    return request.remote_addr or 'unknown'
+
+def ensure_conversation(conversation_id, character):
     if conversation_id not in conversation_history:
-        # Use our new web3 prompt function instead of the previous one
-        web3_prompt = get_web3_prompt(character)
-        
-        # Add the UI formatting instructions
-        web3_prompt = web3_prompt + '''
-        Important UI formatting instructions:
-             - Don't use white color for the text. Use black color for the text.
-             - Generate clean, visually appealing HTML for a chat bubble UI response using Tailwind CSS.
-             - The response should resemble a chat bubble with no unnecessary buttons or extra spaces.
-             - Ensure the text is easy to read and visually engaging.
-             - Include appropriate blockchain/crypto-related emojis to enhance the chat experience.
-             - If any URLs are present, make them clickable and styled properly (without showing the raw URL).
-             - Use blockchain-appropriate styling #ffae5c for bg of bubble of the chat.
-             - The UI should be responsive and look good on both desktop and mobile devices.
-             - Avoid adding any unnecessary line spaces or elements outside of the chat bubble format.
-             - Don't add any line spaces in the first line of the response and all of the lines.
-             - Don't add padding in the text. Don't use unwanted padding for the tags.
-             - If you are using the link emoji, make sure the link is clickable and the link is not the raw URL.
-             - Add a 🔗 emoji before links in lists, and style links in a contrasting color.
-             - Format code examples with appropriate syntax highlighting when relevant.
-        '''
-        
-        web3_prompt = web3_prompt + """
-        Very important agent actions:
-        
-        Tocken creation or coin creation or token launch:
-         - if the user ask to create a meme coin, then ask for the name of the coin and the symbol of the coin and initialSupply of the coin. 
-         - if the user also given the details of the coins. then add the keyword in your response. of  
-         ~newcoincreaterequest#value1#value2#value3~ the following of that user selected that three thing respectively and send the response to the user.
-        
-        
-        if user ask for meme coin, to buy then based on following data list it out to the user and ask select anything.
-        data:
-        - Dogecoin
-        - Shiba Inu
-        - Pepe
-        - Banana
-        - Cat
-        
-        once user selected showw message the coin added your account successfully.
-        
-        if the user ask to sell the coin then based on following data list it out to the user and ask select anything.
-        data:
-        - Dogecoin
-        - Shiba Inu
-        - Pepe
-        - Banana
-        - Cat
-        
-        once the user select any of the coin then show message the coin sell request sent successfully.
-        
-        once the user select any of the coin then ask for the amount of coin to buy.
-        
-        
-        """
-        
-        print(web3_prompt)
+        # base web3 prompt, character block, UI formatting rules and agent actions,
+        # precomputed in compressed form per character (see prompts.py)
+        web3_prompt = system_prompt(character)
         conversation_history[conversation_id] = [
             SystemMessage(content=web3_prompt)
         ]
 
+def fast_path(conversation_id, character, query):
+    """Answer scripted buy/sell/create-coin turns without the LLM, None when the LLM is needed"""
+    response_text = intent_router.handle(conversation_id, query)
+    if response_text is None:
+        return None
+    ensure_conversation(conversation_id, character)
+    conversation_history[conversation_id].append(HumanMessage(content=query))
+    conversation_history[conversation_id].append(AIMessage(content=response_text))
+    return response_text
+
+def prompt_messages(conversation_id, query):
+    """The history followed by query, with the knowledge relevant to query just before it"""
+    # Only the knowledge chunks relevant to this turn are sent, they are not kept in the history
+    messages = compress_history(conversation_history[conversation_id]) + [HumanMessage(content=query)]
+    sections = [retrieve_context(query), get_snapshot().context_for(query)]
+    if GOVERNANCE_QUESTION.search(query):
+        sections.append(get_governance().context_for(get_snapshot().mentioned(query)))
+    context = "\n\n".join(c for c in sections if c)
+    if context:
+        messages = messages[:-1] + [SystemMessage(content=context)] + messages[-1:]
+    return messages
+
+def prefetched(conversation_id, query):
+    """Serve a reply precomputed by the speculative cache, None on a miss"""
+    if conversation_id not in conversation_history:
+        return None
+    response_text = speculative.lookup(conversation_id, query, len(conversation_history[conversation_id]))
+    if response_text is None:
+        return None
+    conversation_history[conversation_id].append(HumanMessage(content=query))
+    conversation_history[conversation_id].append(AIMessage(content=response_text))
+    return response_text
+
+def speculate(llm, conversation_id, character, query):
+    """Reply to a predicted next message without changing the conversation, None if the reply can't be reused"""
+    record = begin_request(conversation_id, character, llm._llm_type, llm.model)
+    try:
+        response = llm.invoke(prompt_messages(conversation_id, query))
+    finally:
+        finish_request(record, status="prefetch")
+    response_text = response.content if hasattr(response, 'content') else str(response)
+    # replies asking for an agent action have side effects, they only run on a real turn
+    if "~newcoincreaterequest" in response_text or "~simulatetrades" in response_text:
+        return None
+    return response_text
+
+def respond(llm, conversation_id, character, query):
+    """Run one chat turn for conversation_id through the LLM and return the response text"""
+    ensure_conversation(conversation_id, character)
+    messages = prompt_messages(conversation_id, query)
     conversation_history[conversation_id].append(HumanMessage(content=query))
 
     # Fix: The LLM expects a string prompt, not a list of messages
@@ -108,7 +119,7 @@ def chat():
         response = llm(query)
     else:
         # For NillionLLM, use the invoke method which properly handles message lists
-        response = llm.invoke(conversation_history[conversation_id])
+        response = llm.invoke(messages)
     
     # If response is an object with content attribute, extract the content
     if hasattr(response, 'content'):
@@ -124,17 +135,191 @@ def chat():
         print("\n\n\n\n\n\n")
         print(coin_name, coin_symbol, coin_initial_supply)
         print("\n\n\n\n\n\n")
-        out = create_coin(coin_name, coin_symbol, coin_initial_supply)
+        # a retried turn carries the same details, the key keeps it from launching a second token
+        out = create_coin(coin_name, coin_symbol, coin_initial_supply,
+                          idempotency_key=idempotency_key(conversation_id, coin_name, coin_symbol, coin_initial_supply))
         print(out)
         print("\n\n\n\n\n\n")
         response_text = llm.invoke(str(out) + "coin created successfully so ack the user about it.")
     
+    simulation = re.search(r"~simulatetrades#([\d.]+)#([\d.]+)#([\d.]+)~", response_text)
+    if simulation:
+        buyers, eth_per_buyer, sellers = simulation.groups()
+        try:
+            summary = run_simulation(int(float(buyers)), float(eth_per_buyer), int(float(sellers)))
+            response_text = llm.invoke(summary + " explain this simulation result to the user.")
+        except ValueError as e:
+            print(f"Simulation request rejected: {e}")
+            response_text = f"I couldn't run that simulation: {e}."
+    
     
     # Add AI message to conversation history
     conversation_history[conversation_id].append(AIMessage(content=response_text))
-    
+
+    return response_text
+
+
+@app.route('/chat', methods=['GET'])
+def chat():
+    query = request.args.get('query')
+    llm = request.args.get('llm')
+    if llm == "0g":
+        llm = OGLLM(
+            model="og-basic",
+            fallbackFee=0.000000000000000080000000000000005723
+        )
+    else:
+        llm = NillionLLM(
+            model="meta-llama/Llama-3.1-8B-Instruct",
+            temperature=0.2,
+            top_p=0.95,
+            max_tokens=2048
+        )
+        
+    print(query)
+    conversation_id = request.args.get('conversation_id')
+    character = request.args.get('character', 'blockchain-advisor')
+
+    if not query:
+        return Response("Error: Query parameter is required", status=400, content_type="text/plain")
+
+    if not conversation_id:
+        conversation_id = str(uuid.uuid4())
+
+    client = client_key()
+    try:
+        check_chat_limits(rate_limiter, client, conversation_id, conversation_id not in conversation_history)
+    except RateLimited as e:
+        return Response(f"Error: {e}", status=429, content_type="text/plain",
+                        headers={"Retry-After": e.retry_after_header})
+
+    record = begin_request(conversation_id, character, llm._llm_type, llm.model)
+    status = "ok"
+    try:
+        response_text = fast_path(conversation_id, character, query)
+        if response_text is None:
+            response_text = prefetched(conversation_id, query)
+            status = "ok" if response_text is None else "prefetch_hit"
+        if response_text is None:
+            with scheduler.slot(client):
+                response_text = respond(llm, conversation_id, character, query)
+    except SchedulerTimeout as e:
+        finish_request(record, status="queue_timeout")
+        return Response(f"Error: {e}", status=503, content_type="text/plain",
+                        headers={"Retry-After": str(int(e.retry_after))})
+    except Exception:
+        finish_request(record, status="error")
+        raise
+    finish_request(record, status=status)
+    conversation_history.sync(conversation_id)
+
+    if intent_router.pending(conversation_id) is None:
+        # the next message is often one of the options this reply lists, precompute those while idle
+        speculative.schedule(conversation_id, len(conversation_history[conversation_id]), response_text,
+                             lambda q: speculate(llm, conversation_id, character, q))
+
     # Return a regular response instead of streaming
     return Response(response_text, content_type="text/plain")
 
+def admin_only():
+    """Error response unless the request carries USAGE_ADMIN_TOKEN, None if it does"""
+    if not USAGE_ADMIN_TOKEN:
+        return Response("Error: usage queries are disabled", status=404, content_type="text/plain")
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not hmac.compare_digest(supplied.encode(), USAGE_ADMIN_TOKEN.encode()):
+        return Response("Error: admin token required", status=401, content_type="text/plain",
+                        headers={"WWW-Authenticate": "Bearer"})
+    return None
+
+@app.errorhandler(AccountingUnavailable)
+def accounting_unavailable(e):
+    return Response(f"Error: {e}", status=503, content_type="text/plain")
+
+@app.route('/usage', methods=['GET'])
+def usage():
+    # lists conversation ids, which are all it takes to read a conversation
+    denied = admin_only()
+    if denied:
+        return denied
+    group_by = request.args.get('group_by', 'conversation_id')
+    order_by = request.args.get('order_by', 'fee')
+    since = request.args.get('since', type=float)
+    limit = request.args.get('limit', 50, type=int)
+    try:
+        return jsonify(usage_by(group_by, order_by, since, limit))
+    except ValueError as e:
+        return Response(f"Error: {e}", status=400, content_type="text/plain")
+
+@app.route('/usage/<conversation_id>', methods=['GET'])
+def usage_for_conversation(conversation_id):
+    denied = admin_only()
+    if denied:
+        return denied
+    return jsonify(conversation_usage(conversation_id))
+
+@app.route('/prefetch/stats', methods=['GET'])
+def prefetch_stats():
+    return jsonify(speculative.stats())
+
+@app.route('/candles/<token>', methods=['GET'])
+def candles(token):
+    indexer = get_indexer()
+    if indexer.resolve(token) is None:
+        return Response(f"Error: unknown token {token}", status=404, content_type="text/plain")
+    resolution = request.args.get('resolution', 3600, type=int)
+    if resolution <= 0:
+        return Response("Error: resolution must be a positive number of seconds", status=400, content_type="text/plain")
+    source = {'curve': SOURCE_CURVE, 'dex': SOURCE_DEX}.get(request.args.get('source'))
+    return jsonify(indexer.ohlcv(
+        token,
+        resolution=resolution,
+        since=request.args.get('since', type=float),
+        until=request.args.get('until', type=float),
+        source=source,
+    ))
+
+@app.route('/tokens', methods=['GET'])
+def tokens():
+    prefix = request.args.get('q', '')
+    return jsonify(get_snapshot().search(prefix, limit=request.args.get('limit', 10, type=int)))
+
+@app.route('/tokens/<token>', methods=['GET'])
+def token(token):
+    found = get_snapshot().get(token)
+    if found is None:
+        return Response(f"Error: unknown token {token}", status=404, content_type="text/plain")
+    return jsonify(found)
+
+@app.errorhandler(SnapshotLoading)
+def snapshot_loading(e):
+    # the token snapshot loads in the background, lookups never wait for the node
+    return Response(f"Error: {e}", status=503, content_type="text/plain",
+                    headers={"Retry-After": str(e.retry_after)})
+
+def governance_token(token):
+    """Token address for an address, name or symbol in a governance route"""
+    if token.lower().startswith('0x'):
+        return token.lower()
+    found = get_snapshot().get(token)
+    return found['address'] if found else token
+
+@app.route('/governance/<token>', methods=['GET'])
+def governance_proposals(token):
+    address = governance_token(token)
+    return jsonify(get_governance().proposals_for(address))
+
+@app.route('/governance/<token>/<int:proposal_id>', methods=['GET'])
+def governance_proposal(token, proposal_id):
+    address = governance_token(token)
+    governance = get_governance()
+    proposal = governance.proposal(address, proposal_id)
+    if proposal is None:
+        return Response(f"Error: unknown proposal {token} #{proposal_id}", status=404, content_type="text/plain")
+    voter = request.args.get('voter')
+    if voter:
+        proposal['has_voted'] = governance.has_voted(address, proposal_id, voter)
+        proposal['support'] = governance.vote_of(address, proposal_id, voter)
+    return jsonify(proposal)
+
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0", port=5000)
@@ -0,0 +1,354 @@
+import os
+import json
+import itertools
+
+import requests
+
+RPC_URL = os.environ.get("RPC_URL", "https://rpc-amoy.polygon.technology/")
+RPC_TIMEOUT = 15
+LOG_BLOCK_RANGE = 5000  # blocks per eth_getLogs request
+MAX_BATCH_SIZE = 100    # requests per JSON-RPC batch
+
+DEPLOYMENTS_DIR = os.environ.get(
+    "CLAMPIFY_DEPLOYMENTS",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "deployments"),
+)
+
+# Same addresses as services/tokenCreation.ts
+FACTORY_ADDRESS = os.environ.get("CLAMPIFY_FACTORY", "0x7ECd045257107c84129BCce9DBa8feb211b4a7E7").lower()
+GOVERNANCE_ADDRESS = os.environ.get("CLAMPIFY_GOVERNANCE", "0x9f49eB31F06c9F84Dc049CCbf3aC1E89B36b6aB9").lower()
+DEX_ADDRESS = (os.environ.get("CLAMPIFY_DEX") or "").lower() or None
+
+
+# --- Keccak-256 (the pre-NIST padding Ethereum uses, hashlib.sha3_256 differs) ---
+
+_ROUND_CONSTANTS = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+]
+_ROTATIONS = [
+    [0, 36, 3, 41, 18], [1, 44, 10, 45, 2], [62, 6, 43, 15, 61], [28, 55, 25, 21, 56], [27, 20, 39, 8, 14],
+]
+_MASK = (1 << 64) - 1
+
+
+def _rol(value, shift):
+    return ((value << shift) | (value >> (64 - shift))) & _MASK if shift else value
+
+
+def _keccak_f(state):
+    for rc in _ROUND_CONSTANTS:
+        c = [state[x][0] ^ state[x][1] ^ state[x][2] ^ state[x][3] ^ state[x][4] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ _rol(c[(x + 1) % 5], 1) for x in range(5)]
+        state = [[state[x][y] ^ d[x] for y in range(5)] for x in range(5)]
+        b = [[0] * 5 for _ in range(5)]
+        for x in range(5):
+            for y in range(5):
+                b[y][(2 * x + 3 * y) % 5] = _rol(state[x][y], _ROTATIONS[x][y])
+        state = [[b[x][y] ^ (~b[(x + 1) % 5][y] & b[(x + 2) % 5][y]) for y in range(5)] for x in range(5)]
+        state[0][0] ^= rc
+    return state
+
+
+def keccak256(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    rate = 136
+    padded = bytearray(data) + bytes(rate - len(data) % rate)
+    padded[len(data)] ^= 0x01
+    padded[-1] ^= 0x80
+    state = [[0] * 5 for _ in range(5)]
+    for offset in range(0, len(padded), rate):
+        block = padded[offset:offset + rate]
+        for i in range(rate // 8):
+            state[i % 5][i // 5] ^= int.from_bytes(block[i * 8:i * 8 + 8], "little")
+        state = _keccak_f(state)
+    return b"".join(state[i % 5][i // 5].to_bytes(8, "little") for i in range(4))
+
+
+# --- ABI encoding ---
+
+def _is_dynamic(typ):
+    return typ in ("string", "bytes") or typ.endswith("[]")
+
+
+def _encode_static(typ, value):
+    if typ == "address":
+        return int(value, 16).to_bytes(32, "big")
+    if typ == "bool":
+        return (1 if value else 0).to_bytes(32, "big")
+    if typ.startswith("uint"):
+        return int(value).to_bytes(32, "big")
+    if typ.startswith("int"):
+        return int(value).to_bytes(32, "big", signed=True)
+    if typ.startswith("bytes"):
+        raw = bytes.fromhex(value[2:]) if isinstance(value, str) else bytes(value)
+        return raw.ljust(32, b"\x00")
+    raise ValueError(f"Unsupported ABI type {typ}")
+
+
+def _encode_dynamic(typ, value):
+    if typ.endswith("[]"):
+        return len(value).to_bytes(32, "big") + encode_abi([typ[:-2]] * len(value), value)
+    raw = value.encode("utf-8") if typ == "string" else bytes(value)
+    return len(raw).to_bytes(32, "big") + raw.ljust((len(raw) + 31) // 32 * 32, b"\x00")
+
+
+def encode_abi(types, values):
+    heads, tails = [], []
+    tail_offset = 32 * len(types)
+    for typ, value in zip(types, values):
+        if _is_dynamic(typ):
+            tail = _encode_dynamic(typ, value)
+            heads.append(tail_offset.to_bytes(32, "big"))
+            tails.append(tail)
+            tail_offset += len(tail)
+        else:
+            heads.append(_encode_static(typ, value))
+    return b"".join(heads) + b"".join(tails)
+
+
+def _decode_static(typ, word):
+    if typ == "address":
+        return "0x" + word[12:].hex()
+    if typ == "bool":
+        return word[-1] == 1
+    if typ.startswith("uint"):
+        return int.from_bytes(word, "big")
+    if typ.startswith("int"):
+        return int.from_bytes(word, "big", signed=True)
+    if typ.startswith("bytes"):
+        return "0x" + word.hex()
+    raise ValueError(f"Unsupported ABI type {typ}")
+
+
+def decode_abi(types, data):
+    values = []
+    for i, typ in enumerate(types):
+        word = data[32 * i:32 * i + 32]
+        if not _is_dynamic(typ):
+            values.append(_decode_static(typ, word))
+            continue
+        offset = int.from_bytes(word, "big")
+        length = int.from_bytes(data[offset:offset + 32], "big")
+        body = data[offset + 32:]
+        if typ.endswith("[]"):
+            values.append(list(decode_abi([typ[:-2]] * length, body)))
+        elif typ == "string":
+            values.append(body[:length].decode("utf-8", errors="replace"))
+        else:
+            values.append(body[:length])
+    return tuple(values)
+
+
+def to_bytes(hex_data):
+    return bytes.fromhex(hex_data[2:] if hex_data.startswith("0x") else hex_data)
+
+
+def _signature(item):
+    return f"{item['name']}({','.join(i['type'] for i in item['inputs'])})"
+
+
+def load_abi(contract_name):
+    with open(os.path.join(DEPLOYMENTS_DIR, f"{contract_name}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Contract:
+    """ABI-driven call encoding and log decoding for one of the deployed Clampify contracts"""
+
+    def __init__(self, contract_name, address=None, abi=None):
+        self.name = contract_name
+        self.address = address.lower() if address else None
+        abi = abi if abi is not None else load_abi(contract_name)
+        self.functions = {item["name"]: item for item in abi if item["type"] == "function"}
+        self.events = {item["name"]: item for item in abi if item["type"] == "event"}
+        self._topics = {"0x" + keccak256(_signature(item)).hex(): item for item in self.events.values()}
+
+    def topic(self, event_name):
+        return "0x" + keccak256(_signature(self.events[event_name])).hex()
+
+    def selector(self, function_name):
+        return "0x" + keccak256(_signature(self.functions[function_name]))[:4].hex()
+
+    def encode_call(self, function_name, *args):
+        fn = self.functions[function_name]
+        return self.selector(function_name) + encode_abi([i["type"] for i in fn["inputs"]], args).hex()
+
+    def decode_result(self, function_name, hex_data):
+        outputs = [o["type"] for o in self.functions[function_name]["outputs"]]
+        return decode_abi(outputs, to_bytes(hex_data))
+
+    def decode_log(self, log):
+        """Decode an eth_getLogs entry into {event, address, block, log_index, tx, args}, None for other events"""
+        topics = log["topics"]
+        event = self._topics.get(topics[0].lower()) if topics else None
+        if event is None:
+            return None
+
+        indexed = [i for i in event["inputs"] if i.get("indexed")]
+        plain = [i for i in event["inputs"] if not i.get("indexed")]
+        args = {}
+        for item, topic in zip(indexed, topics[1:]):
+            # indexed dynamic values are only available as their hash
+            args[item["name"]] = topic if _is_dynamic(item["type"]) else _decode_static(item["type"], to_bytes(topic))
+        for item, value in zip(plain, decode_abi([i["type"] for i in plain], to_bytes(log["data"]))):
+            args[item["name"]] = value
+
+        return {
+            "event": event["name"],
+            "address": log["address"].lower(),
+            "block": int(log["blockNumber"], 16),
+            "log_index": int(log["logIndex"], 16),
+            "tx": log.get("transactionHash"),
+            "args": args,
+        }
+
+    def encode_log(self, event_name, block_number, log_index=0, address=None, tx=None, **args):
+        """Build the eth_getLogs entry an event would produce, for LocalJsonRpc"""
+        event = self.events[event_name]
+        topics = [self.topic(event_name)]
+        plain_types, plain_values = [], []
+        for item in event["inputs"]:
+            if item.get("indexed"):
+                topics.append("0x" + _encode_static(item["type"], args[item["name"]]).hex())
+            else:
+                plain_types.append(item["type"])
+                plain_values.append(args[item["name"]])
+        return {
+            "address": (address or self.address).lower(),
+            "topics": topics,
+            "data": "0x" + encode_abi(plain_types, plain_values).hex(),
+            "blockNumber": hex(block_number),
+            "logIndex": hex(log_index),
+            "transactionHash": tx or "0x" + keccak256(f"{block_number}:{log_index}").hex(),
+        }
+
+
+class RpcError(Exception):
+    pass
+
+
+class JsonRpcClient:
+    """JSON-RPC over a pooled requests session, with batching for bulk reads"""
+
+    def __init__(self, url=RPC_URL, timeout=RPC_TIMEOUT, session=None):
+        self.url = url
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self._ids = itertools.count(1)
+
+    def _post(self, payload):
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def call(self, method, params=()):
+        return self.batch([(method, params)])[0]
+
+    def batch(self, calls):
+        """Send (method, params) pairs in as few requests as possible, results in the same order"""
+        results = []
+        for start in range(0, len(calls), MAX_BATCH_SIZE):
+            chunk = calls[start:start + MAX_BATCH_SIZE]
+            payload = [
+                {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": list(params)}
+                for method, params in chunk
+            ]
+            replies = self._post(payload)
+            if isinstance(replies, dict):
+                raise RpcError(replies.get("error", replies))
+            by_id = {reply.get("id"): reply for reply in replies}
+            for request in payload:
+                reply = by_id.get(request["id"], {})
+                if "error" in reply or "result" not in reply:
+                    raise RpcError(f"{request['method']} failed: {reply.get('error', 'no result')}")
+                results.append(reply["result"])
+        return results
+
+    def block_number(self):
+        return int(self.call("eth_blockNumber"), 16)
+
+    def eth_call(self, to, data, block="latest"):
+        return self.call("eth_call", [{"to": to, "data": data}, block])
+
+    def get_logs(self, addresses, topics, from_block, to_block, block_range=LOG_BLOCK_RANGE):
+        """All logs in [from_block, to_block], fetched as one batch of block_range sized eth_getLogs"""
+        if from_block > to_block:
+            return []
+        calls = []
+        for start in range(from_block, to_block + 1, block_range):
+            end = min(start + block_range - 1, to_block)
+            calls.append(("eth_getLogs", [{
+                "address": addresses, "topics": topics, "fromBlock": hex(start), "toBlock": hex(end),
+            }]))
+        logs = [log for chunk in self.batch(calls) for log in chunk]
+        logs.sort(key=lambda log: (int(log["blockNumber"], 16), int(log["logIndex"], 16)))
+        return logs
+
+    def block_timestamps(self, block_numbers):
+        numbers = sorted(set(block_numbers))
+        blocks = self.batch([("eth_getBlockByNumber", [hex(n), False]) for n in numbers])
+        return {n: int(block["timestamp"], 16) for n, block in zip(numbers, blocks)}
+
+
+class LocalJsonRpc(JsonRpcClient):
+    """In-process stand-in for a node: serves logs, block timestamps and eth_call handlers from memory"""
+
+    def __init__(self, block_time=2, genesis_timestamp=1_700_000_000):
+        super().__init__(url="local://", session=object())
+        self.logs = []
+        self.head = 0
+        self.block_time = block_time
+        self.genesis_timestamp = genesis_timestamp
+        self.call_handlers = {}
+        self.requests_served = 0
+
+    def add_log(self, log):
+        self.logs.append(log)
+        self.head = max(self.head, int(log["blockNumber"], 16))
+
+    def on_call(self, to, selector, handler):
+        """Answer eth_call to `to` whose data starts with selector with handler(calldata) -> hex result"""
+        self.call_handlers[(to.lower(), selector)] = handler
+
+    def _post(self, payload):
+        self.requests_served += 1
+        return [
+            {"jsonrpc": "2.0", "id": request["id"], "result": self._handle(request["method"], request["params"])}
+            for request in payload
+        ]
+
+    def _handle(self, method, params):
+        if method == "eth_blockNumber":
+            return hex(self.head)
+        if method == "eth_getBlockByNumber":
+            number = int(params[0], 16)
+            return {"number": params[0], "timestamp": hex(self.genesis_timestamp + number * self.block_time)}
+        if method == "eth_getLogs":
+            query = params[0]
+            addresses = query.get("address")
+            if isinstance(addresses, str):
+                addresses = [addresses]
+            addresses = {a.lower() for a in addresses} if addresses else None
+            first_topics = query.get("topics", [None])[0]
+            if isinstance(first_topics, str):
+                first_topics = [first_topics]
+            start, end = int(query["fromBlock"], 16), int(query["toBlock"], 16)
+            return [
+                log for log in self.logs
+                if start <= int(log["blockNumber"], 16) <= end
+                and (addresses is None or log["address"] in addresses)
+                and (not first_topics or log["topics"][0] in first_topics)
+            ]
+        if method == "eth_call":
+            data = params[0]["data"]
+            handler = self.call_handlers.get((params[0]["to"].lower(), data[:10]))
+            if handler is None:
+                raise RpcError(f"No local handler for eth_call {params[0]['to']} {data[:10]}")
+            return handler(data)
+        raise RpcError(f"Unsupported method {method}")
@@ -0,0 +1,104 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # in requirements.txt; without it only gzip is offered
+    brotli = None
+
+MIN_SIZE = 512        # bytes; smaller bodies fit in a packet anyway
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5    # fast enough to compress per request
+STREAM_BROTLI_QUALITY = 4
+GZIP_WBITS = 16 + zlib.MAX_WBITS  # gzip container, not raw zlib
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding):
+    """Best encoding the client accepts ("br" or "gzip"), None for identity"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.lower()] = q
+    choices = [(accepted.get(e, accepted.get("*", 0.0)), -i, e) for i, e in enumerate(supported_encodings())]
+    q, _, encoding = max(choices)
+    return encoding if q > 0 else None
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+        return compressor.compress(data) + compressor.flush()
+    return data
+
+
+class StreamCompressor:
+    """Incremental compression where every chunk is flushed, so a frame reaches the client whole"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=STREAM_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+
+    def compress(self, data):
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        # a sync flush ends the chunk on a byte boundary without ending the stream
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def negotiate(request, response, revalidate=False):
+    """Revalidation and Content-Encoding for a finished werkzeug response to request.
+
+    With revalidate a 200 gets a weak ETag and becomes an empty 304 when If-None-Match matches it.
+    """
+    if revalidate and request.method == 'GET' and response.status_code == 200:
+        # weak, so it matches every encoding of the body
+        response.add_etag(weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.make_conditional(request)
+
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < MIN_SIZE:
+        return response
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding:
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of str/bytes chunks, yielding one flushed piece per chunk"""
+    compressor = StreamCompressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        if chunk:
+            yield compressor.compress(chunk)
+    yield compressor.finish()
+
@@ -0,0 +1,413 @@
+import os
+import json
+import mmap
+import time
+import zlib
+import queue
+import struct
+import atexit
+import tempfile
+import threading
+from collections import Counter
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, where the log directory isn't locked
+    fcntl = None
+
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+
+LOG_DIR = os.environ.get(
+    "CONVERSATION_LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".conversation_log")
+)
+# used when LOG_DIR can't be created, e.g. on a read-only deployment; only survives as long as /tmp does
+FALLBACK_LOG_DIR = os.path.join(tempfile.gettempdir(), "conversation_log")
+FSYNC = os.environ.get("CONVERSATION_LOG_FSYNC", "1").lower() not in ("0", "false", "no")
+SEGMENT_SIZE = 16 * 1024 * 1024
+SNAPSHOT_EVERY = 16       # turn records after which a conversation is written out again as one snapshot
+COMMIT_INTERVAL = 0.05    # seconds a record may wait to be committed together with others
+CHECKPOINT_EVERY = 256    # records between index checkpoints; only records after the last one are rescanned
+
+HEADER = struct.Struct("<II")  # payload length, crc32 of the payload
+SNAPSHOT, APPEND = "s", "a"
+ROLES = {"system": SystemMessage, "human": HumanMessage, "ai": AIMessage}
+
+
+def role_of(message):
+    if isinstance(message, SystemMessage):
+        return "system"
+    if isinstance(message, HumanMessage):
+        return "human"
+    return "ai"
+
+
+class LogLocked(OSError):
+    pass
+
+
+class ConversationLog:
+    """Write-ahead log of chat turns in append-only segment files.
+
+    Each /chat turn appends one record with the conversation's new messages. Every SNAPSHOT_EVERY
+    records the whole conversation is written as a snapshot record instead, which supersedes the
+    ones before it, and segments no longer referenced by any conversation are deleted. The index
+    (conversation -> record offsets since its last snapshot) is checkpointed to index.json, so a
+    restart only rescans the records written after the checkpoint, and restore() reads a
+    conversation's few records through mmap. Writes are committed in groups by a background thread
+    with one fsync per group. When a group fails to commit, the records queued after it for the same
+    conversations are dropped and the next sync() writes each of them out as a snapshot. A log
+    directory belongs to a single process, which holds a lock on it; opening a directory another
+    process holds raises LogLocked.
+    """
+
+    def __init__(self, path=LOG_DIR, segment_size=SEGMENT_SIZE, snapshot_every=SNAPSHOT_EVERY,
+                 commit_interval=COMMIT_INTERVAL, checkpoint_every=CHECKPOINT_EVERY, fsync=FSYNC):
+        self.path = path
+        self.segment_size = segment_size
+        self.snapshot_every = snapshot_every
+        self.commit_interval = commit_interval
+        self.checkpoint_every = checkpoint_every
+        self.fsync = fsync
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = self._acquire_directory()
+        self._index_path = os.path.join(path, "index.json")
+
+        self._lock = threading.RLock()
+        self._index = {}      # conversation id -> {"records": [[segment, offset], ...], "messages": n}
+        self._queued = {}     # conversation id -> (messages logged or queued, records since snapshot)
+        self._epochs = {}     # conversation id -> commit failures so far, queued appends from before one are dropped
+        self._broken = set()  # conversations whose next sync() has to write a snapshot
+        self._refs = Counter()
+        self._dead = set()    # segments without live records, deleted after the next checkpoint
+        self._maps = {}       # segment -> read-only mmap
+        self._since_checkpoint = 0
+        self._queue = queue.Queue()
+        self._thread = None
+
+        self._recover()
+
+    # --- files ---
+
+    def _acquire_directory(self):
+        lock_file = open(os.path.join(self.path, "lock"), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                raise LogLocked(f"{self.path} is in use by another process")
+        # released when the process exits
+        return lock_file
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, f"{segment:08d}.log")
+
+    def _segments(self):
+        return sorted(int(name[:-4]) for name in os.listdir(self.path)
+                      if name.endswith(".log") and name[:-4].isdigit())
+
+    def _open_segment(self, segment):
+        self._segment = segment
+        self._file = open(self._segment_path(segment), "ab")
+        self._offset = self._file.tell()
+
+    # --- recovery ---
+
+    def _recover(self):
+        start_segment, start_offset = 1, 0
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            self._index = checkpoint["conversations"]
+            start_segment, start_offset = checkpoint["segment"], checkpoint["offset"]
+        except (OSError, ValueError, KeyError):
+            self._index = {}
+        # the checkpointed records; the scan below counts the ones it replays itself
+        for entry in self._index.values():
+            self._refs.update(segment for segment, _ in entry["records"])
+
+        segments = [s for s in self._segments() if s >= start_segment]
+        for segment in segments:
+            offset = start_offset if segment == start_segment else 0
+            self._scan(segment, offset)
+
+        self._queued = {cid: (entry["messages"], len(entry["records"])) for cid, entry in self._index.items()}
+        self._open_segment(max(segments + [start_segment]))
+        # left behind by a crash between a checkpoint and the deletes that follow it
+        self._dead.update(s for s in self._segments() if s not in self._refs and s != self._segment)
+
+    def _scan(self, segment, offset):
+        """Apply the records of segment from offset on, cutting off a torn write at the end"""
+        path = self._segment_path(segment)
+        with open(path, "rb") as f:
+            data = f.read()
+        while offset + HEADER.size <= len(data):
+            length, crc = HEADER.unpack_from(data, offset)
+            payload = data[offset + HEADER.size:offset + HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            record = json.loads(payload)
+            self._apply(record["c"], record["k"], len(record["m"]), segment, offset)
+            offset += HEADER.size + length
+        if offset < len(data):
+            print(f"Conversation log {path}: dropping {len(data) - offset} bytes of an incomplete record")
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+
+    def _apply(self, conversation_id, kind, count, segment, offset):
+        entry = self._index.get(conversation_id)
+        if entry is None or kind == SNAPSHOT:
+            if entry is not None:
+                for old_segment, _ in entry["records"]:
+                    self._release(old_segment)
+            entry = self._index[conversation_id] = {"records": [], "messages": 0}
+        entry["records"].append([segment, offset])
+        entry["messages"] += count
+        self._refs[segment] += 1
+
+    def _release(self, segment):
+        self._refs[segment] -= 1
+        if self._refs[segment] <= 0:
+            del self._refs[segment]
+            self._dead.add(segment)
+
+    # --- writing ---
+
+    def sync(self, conversation_id, messages):
+        """Queue the messages of conversation_id that are not logged yet, returns whether anything was queued"""
+        with self._lock:
+            logged, since_snapshot = self._queued.get(conversation_id, (0, 0))
+            if conversation_id in self._broken:
+                # a record of this conversation was lost, the snapshot replaces whatever did get written
+                self._broken.discard(conversation_id)
+                kind, batch, since_snapshot = SNAPSHOT, messages, 1
+            elif len(messages) <= logged:
+                return False
+            elif since_snapshot >= self.snapshot_every:
+                kind, batch, since_snapshot = SNAPSHOT, messages, 1
+            else:
+                kind, batch, since_snapshot = APPEND, messages[logged:], since_snapshot + 1
+            self._queued[conversation_id] = (len(messages), since_snapshot)
+            payload = json.dumps(
+                {"c": conversation_id, "k": kind, "m": [[role_of(m), m.content] for m in batch]},
+                ensure_ascii=False,
+            ).encode("utf-8")
+            self._ensure_started()
+            self._queue.put((conversation_id, kind, len(batch), payload, self._epochs.get(conversation_id, 0)))
+            return True
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="conversation-log", daemon=True)
+            self._thread.start()
+
+    def flush(self):
+        """Block until every queued record is committed"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.commit_interval
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._commit(batch)
+            except Exception as e:
+                print(f"Failed to write {len(batch)} conversation log records: {e}")
+                self._fail(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _fail(self, batch):
+        with self._lock:
+            for conversation_id in {item[0] for item in batch}:
+                self._epochs[conversation_id] = self._epochs.get(conversation_id, 0) + 1
+                self._broken.add(conversation_id)
+            try:
+                # cut off what part of the group reached the file, the next record starts clean
+                self._file.truncate(self._offset)
+                self._file.seek(self._offset)
+            except (OSError, ValueError) as e:
+                print(f"Failed to truncate conversation log segment {self._segment}: {e}")
+
+    def _commit(self, batch):
+        written, buffer, rolled = [], bytearray(), False
+        with self._lock:
+            # appends queued before a failed commit of their conversation would leave a gap
+            batch = [item for item in batch if item[1] == SNAPSHOT or item[4] == self._epochs.get(item[0], 0)]
+        for conversation_id, kind, count, payload, _ in batch:
+            if self._offset + len(buffer) > 0 and self._offset + len(buffer) + HEADER.size + len(payload) > self.segment_size:
+                self._write(buffer)
+                buffer = bytearray()
+                self._file.close()
+                self._open_segment(self._segment + 1)
+                rolled = True
+            written.append((conversation_id, kind, count, self._segment, self._offset + len(buffer)))
+            buffer += HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        self._write(buffer)
+
+        with self._lock:
+            for conversation_id, kind, count, segment, offset in written:
+                self._apply(conversation_id, kind, count, segment, offset)
+            self._since_checkpoint += len(written)
+            if rolled or self._since_checkpoint >= self.checkpoint_every:
+                self.checkpoint()
+
+    def _write(self, buffer):
+        if not buffer:
+            return
+        self._file.write(buffer)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._offset += len(buffer)
+
+    def checkpoint(self):
+        """Write the index, then delete the segments it no longer needs"""
+        with self._lock:
+            tmp = self._index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"segment": self._segment, "offset": self._offset, "conversations": self._index}, f)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp, self._index_path)
+            self._since_checkpoint = 0
+
+            for segment in sorted(self._dead):
+                if segment == self._segment or self._refs.get(segment):
+                    continue
+                mapped = self._maps.pop(segment, None)
+                if mapped is not None:
+                    mapped.close()
+                try:
+                    os.remove(self._segment_path(segment))
+                except OSError:
+                    pass
+            self._dead = {s for s in self._dead if s == self._segment}
+
+    def close(self):
+        self.flush()
+        self.checkpoint()
+        self._lock_file.close()
+
+    # --- reading ---
+
+    def _read(self, segment, offset):
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < offset + HEADER.size:
+            mapped = self._remap(segment)
+        length, crc = HEADER.unpack_from(mapped, offset)
+        end = offset + HEADER.size + length
+        if len(mapped) < end:
+            mapped = self._remap(segment)
+        payload = mapped[offset + HEADER.size:end]
+        if zlib.crc32(payload) != crc:
+            raise ValueError(f"Corrupt conversation log record at {segment}:{offset}")
+        return json.loads(payload)
+
+    def _remap(self, segment):
+        # the active segment grows, its map is replaced when a record lies past its end
+        old = self._maps.pop(segment, None)
+        if old is not None:
+            old.close()
+        with open(self._segment_path(segment), "rb") as f:
+            self._maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[segment]
+
+    def restore(self, conversation_id):
+        """The logged messages of conversation_id, None if it was never logged"""
+        with self._lock:
+            entry = self._index.get(conversation_id)
+            if entry is None:
+                return None
+            messages = []
+            for segment, offset in entry["records"]:
+                record = self._read(segment, offset)
+                if record["k"] == SNAPSHOT:
+                    messages = []
+                messages.extend(ROLES[role](content=content) for role, content in record["m"])
+            return messages
+
+
+class PersistentHistory(dict):
+    """conversation_history that restores conversations this process has not seen from the log on first use.
+
+    The log is opened on first use through get_log(); without one (no writable directory) this is a plain dict.
+    """
+
+    def __init__(self, log=None):
+        super().__init__()
+        self._log = log
+
+    @property
+    def log(self):
+        if self._log is None:
+            self._log = get_log()
+        return self._log
+
+    def __contains__(self, conversation_id):
+        if dict.__contains__(self, conversation_id):
+            return True
+        if self.log is None:
+            return False
+        try:
+            messages = self.log.restore(conversation_id)
+        except (OSError, ValueError) as e:
+            print(f"Failed to restore conversation {conversation_id}: {e}")
+            return False
+        if messages is None:
+            return False
+        self.setdefault(conversation_id, messages)
+        return True
+
+    def __missing__(self, conversation_id):
+        if self.__contains__(conversation_id):
+            return dict.__getitem__(self, conversation_id)
+        raise KeyError(conversation_id)
+
+    def sync(self, conversation_id):
+        """Queue the new messages of conversation_id for the log, returns whether anything was queued"""
+        if self.log is None or not dict.__contains__(self, conversation_id):
+            return False
+        return self.log.sync(conversation_id, dict.__getitem__(self, conversation_id))
+
+
+_log = None
+_log_unavailable = False
+_log_lock = threading.Lock()
+
+
+def get_log():
+    """The process's ConversationLog in LOG_DIR or FALLBACK_LOG_DIR, None if neither can be used.
+
+    Only the first worker to open the log gets it; the others keep their history in memory.
+    """
+    global _log, _log_unavailable
+    with _log_lock:
+        if _log is None and not _log_unavailable:
+            for path in dict.fromkeys((LOG_DIR, FALLBACK_LOG_DIR)):
+                try:
+                    _log = ConversationLog(path)
+                    break
+                except LogLocked as e:
+                    # another worker logs there; a second directory would split conversations anyway
+                    print(f"Can't use {path} for the conversation log: {e}")
+                    break
+                except OSError as e:
+                    print(f"Can't use {path} for the conversation log: {e}")
+            if _log is None:
+                print("Conversation history is kept in memory only")
+                _log_unavailable = True
+            else:
+                atexit.register(_log.close)
+        return _log
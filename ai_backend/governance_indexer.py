@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import threading
+
+from chain import Contract, JsonRpcClient, GOVERNANCE_ADDRESS
+
+INDEX_DIR = os.environ.get(
+    "GOVERNANCE_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".governance_index")
+)
+START_BLOCK = int(os.environ.get("CLAMPIFY_START_BLOCK", 0))
+CONFIRMATIONS = 3    # blocks behind head that are indexed
+SYNC_INTERVAL = 15   # seconds between background syncs
+MAX_SYNC_BLOCKS = 50_000
+MAX_CONTEXT_PROPOSALS = 5
+
+WEI = 10**18
+EVENTS = ("GovernanceActivated", "ProposalCreated", "VoteCast", "ProposalExecuted")
+
+
+class GovernanceIndexer:
+    """Running tallies of ClampifyGovernance proposals, built incrementally from its events.
+
+    Each proposal keeps weighted for/against totals and two bitmaps over a shared voter numbering
+    (who voted, who voted for), so has_voted() and quorum_met() are a dict lookup and a bit test
+    instead of getProposalDetails/hasVoted calls per proposal and voter.
+    """
+
+    def __init__(self, rpc=None, index_dir=INDEX_DIR, governance_address=GOVERNANCE_ADDRESS,
+                 start_block=START_BLOCK):
+        self.rpc = rpc or JsonRpcClient()
+        self.governance = Contract("ClampifyGovernance", governance_address)
+        self.token_abi = Contract("ClampifyToken")
+        self._lock = threading.RLock()
+        self._thread = None
+
+        os.makedirs(index_dir, exist_ok=True)
+        self._state_path = os.path.join(index_dir, "state.json")
+        self.last_block = start_block - 1
+        self.tokens = {}      # token address -> {proposal_threshold, quorum, voting_period, total_supply}
+        self.proposals = {}   # (token address, proposal id) -> proposal dict
+        self.voters = []      # bit number -> voter address
+        self._voter_bits = {}
+        self._load_state()
+
+    # --- persistence ---
+
+    def _load_state(self):
+        try:
+            with open(self._state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.last_block = state["last_block"]
+        self.tokens = state["tokens"]
+        self.voters = state["voters"]
+        self._voter_bits = {voter: bit for bit, voter in enumerate(self.voters)}
+        for p in state["proposals"]:
+            p["voted"], p["supported"] = int(p["voted"], 16), int(p["supported"], 16)
+            self.proposals[(p["token"], p["id"])] = p
+
+    def _save_state(self):
+        proposals = [dict(p, voted=hex(p["voted"]), supported=hex(p["supported"])) for p in self.proposals.values()]
+        tmp = self._state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"last_block": self.last_block, "tokens": self.tokens,
+                       "voters": self.voters, "proposals": proposals}, f)
+        os.replace(tmp, self._state_path)
+
+    # --- indexing ---
+
+    def sync(self, to_block=None):
+        """Apply all governance events up to to_block (default: head minus CONFIRMATIONS), returns the number applied"""
+        with self._lock:
+            from_block = self.last_block + 1
+            head = self.rpc.block_number() - CONFIRMATIONS
+            to_block = head if to_block is None else min(to_block, head)
+            to_block = min(to_block, from_block + MAX_SYNC_BLOCKS - 1)
+            if to_block < from_block:
+                return 0
+
+            topics = [[self.governance.topic(name) for name in EVENTS]]
+            events = [self.governance.decode_log(log)
+                      for log in self.rpc.get_logs([self.governance.address], topics, from_block, to_block)]
+            events = [e for e in events if e is not None]
+            created = [e["block"] for e in events if e["event"] == "ProposalCreated"]
+            timestamps = self.rpc.block_timestamps(created) if created else {}
+
+            for e in events:
+                self._apply(e, timestamps)
+            # quorum is a share of the current supply, which moves with every curve buy and sell
+            self._refresh_supplies()
+            self.last_block = to_block
+            self._save_state()
+            return len(events)
+
+    def _apply(self, e, timestamps):
+        args = e["args"]
+        token = args["tokenAddress"]
+        if e["event"] == "GovernanceActivated":
+            # also emitted by updateGovernanceParameters
+            gov = self.tokens.setdefault(token, {"total_supply": 0})
+            gov.update(proposal_threshold=args["proposalThreshold"], quorum=args["quorum"],
+                       voting_period=args["votingPeriod"])
+            return
+
+        key = (token, args["proposalId"])
+        if e["event"] == "ProposalCreated":
+            created_at = timestamps[e["block"]]
+            self.proposals[key] = {
+                "token": token,
+                "id": args["proposalId"],
+                "title": args["title"],
+                "proposer": args["proposer"],
+                "created_at": created_at,
+                "voting_ends_at": created_at + self.tokens.get(token, {}).get("voting_period", 0),
+                "yes_votes": 0,
+                "no_votes": 0,
+                "voters": 0,
+                "executed": False,
+                "execution_success": None,
+                "voted": 0,
+                "supported": 0,
+            }
+            return
+
+        proposal = self.proposals.get(key)
+        if proposal is None:
+            # created before start_block
+            return
+        if e["event"] == "VoteCast":
+            bit = 1 << self._voter_bit(args["voter"])
+            if proposal["voted"] & bit:
+                return
+            proposal["voted"] |= bit
+            proposal["voters"] += 1
+            if args["support"]:
+                proposal["supported"] |= bit
+                proposal["yes_votes"] += args["weight"]
+            else:
+                proposal["no_votes"] += args["weight"]
+        else:
+            proposal["executed"] = True
+            proposal["execution_success"] = args["success"]
+
+    def _voter_bit(self, voter):
+        bit = self._voter_bits.get(voter)
+        if bit is None:
+            bit = self._voter_bits[voter] = len(self.voters)
+            self.voters.append(voter)
+        return bit
+
+    def _refresh_supplies(self):
+        addresses = sorted(self.tokens)
+        if not addresses:
+            return
+        results = self.rpc.batch([
+            ("eth_call", [{"to": address, "data": self.token_abi.encode_call("totalSupply")}, "latest"])
+            for address in addresses
+        ])
+        for address, result in zip(addresses, results):
+            self.tokens[address]["total_supply"] = self.token_abi.decode_result("totalSupply", result)[0]
+
+    # --- queries, all from memory ---
+
+    def has_voted(self, token, proposal_id, voter):
+        """ClampifyGovernance.hasVoted, None for a proposal that is not indexed"""
+        proposal = self.proposals.get((token.lower(), proposal_id))
+        if proposal is None:
+            return None
+        bit = self._voter_bits.get(voter.lower())
+        return bit is not None and bool(proposal["voted"] >> bit & 1)
+
+    def vote_of(self, token, proposal_id, voter):
+        """True/False for how voter voted, None if they have not"""
+        if not self.has_voted(token, proposal_id, voter):
+            return None
+        proposal = self.proposals[(token.lower(), proposal_id)]
+        return bool(proposal["supported"] >> self._voter_bits[voter.lower()] & 1)
+
+    def quorum_threshold(self, token):
+        """Votes needed for quorum, the same integer math as executeProposal"""
+        gov = self.tokens.get(token.lower())
+        if gov is None:
+            return None
+        return gov["total_supply"] * gov["quorum"] // 100
+
+    def quorum_met(self, token, proposal_id):
+        proposal = self.proposals.get((token.lower(), proposal_id))
+        threshold = self.quorum_threshold(token)
+        if proposal is None or threshold is None:
+            return None
+        return proposal["yes_votes"] + proposal["no_votes"] >= threshold
+
+    def proposal(self, token, proposal_id, now=None):
+        """Proposal with its tally and status in token units, None if unknown"""
+        with self._lock:
+            proposal = self.proposals.get((token.lower(), proposal_id))
+            if proposal is None:
+                return None
+            threshold = self.quorum_threshold(token) or 0
+            now = time.time() if now is None else now
+            total = proposal["yes_votes"] + proposal["no_votes"]
+            if proposal["executed"]:
+                status = "executed" if proposal["execution_success"] else "execution failed"
+            elif now < proposal["voting_ends_at"]:
+                status = "active"
+            elif total >= threshold and proposal["yes_votes"] > proposal["no_votes"]:
+                status = "passed"
+            else:
+                status = "defeated"
+            return {
+                "token": proposal["token"],
+                "id": proposal["id"],
+                "title": proposal["title"],
+                "proposer": proposal["proposer"],
+                "created_at": proposal["created_at"],
+                "voting_ends_at": proposal["voting_ends_at"],
+                "yes_votes": proposal["yes_votes"] / WEI,
+                "no_votes": proposal["no_votes"] / WEI,
+                "voters": proposal["voters"],
+                "quorum_votes": threshold / WEI,
+                "quorum_met": total >= threshold,
+                "status": status,
+                "executed": proposal["executed"],
+                "execution_success": proposal["execution_success"],
+            }
+
+    def proposals_for(self, token, now=None):
+        token = token.lower()
+        with self._lock:
+            ids = sorted(pid for t, pid in self.proposals if t == token)
+            return [self.proposal(token, pid, now) for pid in ids]
+
+    def context_for(self, tokens, now=None):
+        """Prompt section on the latest proposals of the given token addresses, "" if they have none"""
+        lines = []
+        for token in tokens:
+            for p in self.proposals_for(token, now)[-MAX_CONTEXT_PROPOSALS:]:
+                lines.append(
+                    f"- Proposal #{p['id']} of token {p['token']} \"{p['title']}\": {p['status']}, "
+                    f"{p['yes_votes']:,.0f} for / {p['no_votes']:,.0f} against from {p['voters']} voters, "
+                    f"quorum {p['quorum_votes']:,.0f} votes ({'met' if p['quorum_met'] else 'not met'})"
+                )
+        if not lines:
+            return ""
+        return "Live Clampify governance proposals:\n" + "\n".join(lines)
+
+    def start(self, interval=SYNC_INTERVAL):
+        """Keep syncing in a background thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="governance-indexer", daemon=True)
+        self._thread.start()
+
+    def _run(self, interval):
+        while True:
+            try:
+                previous = None
+                while self.last_block != previous:
+                    previous = self.last_block
+                    self.sync()
+            except Exception as e:
+                print(f"Governance indexer sync failed: {e}")
+            time.sleep(interval)
+
+
+_indexer = None
+_indexer_lock = threading.Lock()
+
+
+def get_governance():
+    global _indexer
+    with _indexer_lock:
+        if _indexer is None:
+            _indexer = GovernanceIndexer()
+            _indexer.start()
+        return _indexer
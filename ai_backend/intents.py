@@ -0,0 +1,302 @@
+import re
+import time
+from decimal import Decimal, InvalidOperation
+import threading
+from html import escape
+
+from api_handler import create_coin, buy_coin, idempotency_key
+from retrieval import load_token_catalog
+
+STATE_TTL = 600  # seconds a half-filled flow is kept before the conversation goes back to the LLM
+
+BUY, SELL, CREATE = "buy", "sell", "create"
+
+# an action only counts when the message opens with it, optionally asked of the bot ("please", "can you", "I want to")
+DIRECTED = (
+    r"^\s*(?:(?:hey|hi|ok(?:ay)?|so|now)\b[,!]?\s*)?(?:please\s+)?"
+    r"(?:(?:can|could|would|will) you\s+(?:please\s+)?|(?:i'?d like|i would like|i want|i need) to\s+|"
+    r"i wanna\s+|(?:let me|let's|lets|help me)\s+)?"
+)
+# "create a coin" / "launch my own token", not "make my token stand out"
+CREATE_PATTERN = re.compile(
+    DIRECTED + r"(?:create|launch|make|mint|deploy|start)\s+(?:me\s+|us\s+)?(?:a|an|one|my own|our own|new)\s+"
+    r"(?:new\s+)?(?:[\w$-]+\s+){0,2}?(?:coin|token|memecoin)s?\b", re.I
+)
+BUY_PATTERN = re.compile(DIRECTED + r"(?:buy|purchase|ape into|get some)\b", re.I)
+SELL_PATTERN = re.compile(DIRECTED + r"(?:sell|dump|cash out)\b", re.I)
+# a buy or sell is only about coins when it says so or names one ("buy a house" is not)
+COIN_NOUN = re.compile(r"\b(?:coins?|tokens?|memecoins?|meme ?coins?|crypto)\b", re.I)
+CANCEL_PATTERN = re.compile(r"^\s*(cancel|stop|never ?mind|nvm|forget it|no thanks?)\b", re.I)
+CONFIRM_PATTERN = re.compile(r"^\s*(yes|yep|yeah|y|sure|confirm(?:ed)?|ok(?:ay)?|go ahead|do it)(?:[\s,]+please)?[\s.!]*$", re.I)
+DECLINE_PATTERN = re.compile(r"^\s*(no|nope|nah|don'?t)\b", re.I)
+# questions about buying/selling/creating are free-form and go to the LLM, with or without a "?"
+QUESTION_PATTERN = re.compile(
+    r"^\s*(how|what|why|when|where|which|who|whom|whose|should|shall|is|are|am|was|were|does|do|did|"
+    r"explain|tell me about|any tips)\b", re.I
+)
+
+NAME_PATTERN = re.compile(r"\b(?:name(?:d)?(?:\s+is|\s*[:=])?|called)\s+[\"']?([A-Za-z0-9][A-Za-z0-9 ]*?)[\"']?\s*(?:[,;.]|$|\s+(?:and|with|symbol|ticker|supply|initial))", re.I)
+SYMBOL_PATTERN = re.compile(r"(?:\b(?:symbol|ticker)(?:\s+is|\s*[:=])?\s+\$?|\$)([A-Za-z0-9]{2,10})\b", re.I)
+SUPPLY_PATTERN = re.compile(r"\bsupply(?:\s+of|\s+is|\s*[:=])?\s+([\d][\d,_.]*\s*(?:k|m|b|thousand|million|billion)?)\b", re.I)
+AMOUNT_PATTERN = re.compile(r"(?<![\w.])(\d[\d,_]*(?:\.\d+)?\s*(?:k|m|b|thousand|million|billion)?)(?![\w.])", re.I)
+
+MULTIPLIERS = {"k": 10**3, "thousand": 10**3, "m": 10**6, "million": 10**6, "b": 10**9, "billion": 10**9}
+
+
+def parse_amount(text, whole=False):
+    """'1,000' / '2.5k' / '3 million' -> '1000' / '2500' / '3000000', None if there is no number.
+
+    Exact at any size (supplies are often above 2^53). With whole, amounts with a fraction are None.
+    """
+    match = AMOUNT_PATTERN.search(text)
+    if not match:
+        return None
+    raw = match.group(1).lower().replace(",", "").replace("_", "").strip()
+    number = re.match(r"[\d.]+", raw).group(0)
+    suffix = raw[len(number):].strip()
+    try:
+        value = Decimal(number) * MULTIPLIERS.get(suffix, 1)
+    except InvalidOperation:
+        return None
+    if value == value.to_integral_value():
+        return str(int(value))
+    return None if whole else format(value.normalize(), "f")
+
+
+def parse_supply(text):
+    return parse_amount(text, whole=True)
+
+
+def bubble(*lines):
+    body = "".join(f"<p class=\"m-0\">{line}</p>" for line in lines)
+    return f"<div class=\"bg-[#ffae5c] text-black rounded-2xl px-4 py-2 max-w-full\">{body}</div>"
+
+
+def coin_list(tokens):
+    items = "".join(
+        f"<li>🪙 <b>{escape(t['name'])}</b> ({escape(t['symbol'])})</li>" for t in tokens
+    )
+    return f"<ol class=\"list-decimal list-inside m-0\">{items}</ol>"
+
+
+def classify(text, find_coin=None):
+    """Return BUY, SELL or CREATE for a transactional request, None for anything else.
+
+    Buys and sells need a coin noun or a coin find_coin(text) recognizes.
+    """
+    if QUESTION_PATTERN.match(text):
+        return None
+    if CREATE_PATTERN.match(text):
+        return CREATE
+    for intent, pattern in ((SELL, SELL_PATTERN), (BUY, BUY_PATTERN)):
+        if pattern.match(text):
+            if COIN_NOUN.search(text) or (find_coin is not None and find_coin(text) is not None):
+                return intent
+            return None
+    return None
+
+
+class IntentRouter:
+    """Per-conversation slot filling for the scripted buy/sell/create-coin flows.
+
+    handle() returns the reply for turns it can answer from templates and None for
+    everything else, which then goes to the LLM. Once every slot is filled the flow asks
+    for a yes before it buys, sells or launches anything. Trades the backend can't make yet
+    are answered as such, never as done.
+    """
+
+    def __init__(self, catalog=None, ttl=STATE_TTL):
+        self._catalog = catalog
+        self.ttl = ttl
+        self._states = {}
+        self._lock = threading.Lock()
+
+    @property
+    def catalog(self):
+        if self._catalog is None:
+            self._catalog = load_token_catalog()
+        return self._catalog
+
+    def find_coin(self, text, allow_index=False):
+        stripped = text.strip().rstrip(".!")
+        if allow_index and stripped.isdigit() and 1 <= int(stripped) <= len(self.catalog):
+            return self.catalog[int(stripped) - 1]
+        lowered = text.lower()
+        for token in self.catalog:
+            if re.search(rf"\b({re.escape(token['name'].lower())}|{re.escape(token['symbol'].lower())})\b", lowered):
+                return token
+        return None
+
+    def pending(self, conversation_id):
+        """The flow waiting for input in this conversation, if any"""
+        with self._lock:
+            state = self._states.get(conversation_id)
+            if state and time.time() - state["updated"] > self.ttl:
+                del self._states[conversation_id]
+                state = None
+            return state
+
+    def _save(self, conversation_id, intent, **slots):
+        with self._lock:
+            self._states[conversation_id] = {"intent": intent, "slots": slots, "updated": time.time()}
+
+    def _clear(self, conversation_id):
+        with self._lock:
+            self._states.pop(conversation_id, None)
+
+    def handle(self, conversation_id, text):
+        state = self.pending(conversation_id)
+
+        if state and CANCEL_PATTERN.match(text):
+            self._clear(conversation_id)
+            return bubble("👍 No problem, I cancelled that. Anything else I can help you with?")
+
+        if state and state["slots"].get("confirm"):
+            if CONFIRM_PATTERN.match(text):
+                return self._execute(conversation_id, state)
+            self._clear(conversation_id)
+            if DECLINE_PATTERN.match(text):
+                return bubble("👍 No problem, I cancelled that. Anything else I can help you with?")
+            # neither yes nor no, the pending action is dropped and the turn handled afresh
+            state = None
+
+        intent = classify(text, self.find_coin)
+        if intent is not None and (state is None or intent != state["intent"]):
+            # a new request replaces any half-filled flow
+            return self._start(conversation_id, intent, text)
+        if state is not None:
+            return self._continue(conversation_id, state, text)
+        return None
+
+    def _start(self, conversation_id, intent, text):
+        if intent == CREATE:
+            return self._create(conversation_id, {}, text)
+        return self._trade(conversation_id, intent, {}, text)
+
+    def _continue(self, conversation_id, state, text):
+        if state["intent"] == CREATE:
+            return self._create(conversation_id, dict(state["slots"]), text, awaiting=state["slots"].get("awaiting"))
+        return self._trade(conversation_id, state["intent"], dict(state["slots"]), text, continuing=True)
+
+    def _trade(self, conversation_id, intent, slots, text, continuing=False):
+        coin = slots.get("coin")
+        if coin is None:
+            coin = self.find_coin(text, allow_index=continuing)
+            if coin is None:
+                if continuing:
+                    # not an answer to our question, let the LLM take the turn
+                    self._clear(conversation_id)
+                    return None
+                self._save(conversation_id, intent)
+                verb = "buy" if intent == BUY else "sell"
+                return bubble(
+                    f"Here are the meme coins you can {verb} 🚀",
+                    coin_list(self.catalog),
+                    f"Which one would you like to {verb}? Reply with its name or number.",
+                )
+            if intent == SELL:
+                self._save(conversation_id, SELL, coin=coin, confirm=True)
+                return bubble(f"Sell your <b>{escape(coin['name'])}</b>? Reply <b>yes</b> to confirm or <b>no</b> to cancel.")
+            # "buy 100 pepe" carries the amount too, a bare number picked the coin from the list
+            amount = None if text.strip().isdigit() and continuing else parse_amount(text)
+        else:
+            amount = parse_amount(text)
+            if amount is None:
+                self._clear(conversation_id)
+                return None
+
+        if amount is None:
+            self._save(conversation_id, BUY, coin=coin)
+            return bubble(f"Great choice! 🐸 How many <b>{escape(coin['name'])}</b> would you like to buy?")
+
+        self._save(conversation_id, BUY, coin=coin, amount=amount, confirm=True)
+        return bubble(f"Buy {escape(amount)} <b>{escape(coin['name'])}</b>? "
+                      "Reply <b>yes</b> to confirm or <b>no</b> to cancel.")
+
+    def _execute(self, conversation_id, state):
+        """Run the confirmed action of state"""
+        self._clear(conversation_id)
+        slots = state["slots"]
+        if state["intent"] == SELL:
+            # there is no sell endpoint to send it to
+            return bubble(f"⚠️ Selling <b>{escape(slots['coin']['name'])}</b> from chat isn't supported yet, "
+                          "nothing was sold.")
+        if state["intent"] == BUY:
+            coin, amount = slots["coin"], slots["amount"]
+            result = buy_coin(coin["name"], amount)
+            if result is None:
+                return bubble(f"⚠️ Buying <b>{escape(coin['name'])}</b> from chat isn't supported yet, "
+                              "nothing was bought.")
+            if isinstance(result, dict) and result.get("success") is False:
+                return bubble(f"⚠️ Buying <b>{escape(coin['name'])}</b> failed: "
+                              f"{escape(str(result.get('message', 'unknown error')))}")
+            return bubble(f"🎉 {escape(amount)} <b>{escape(coin['name'])}</b> added to your account successfully.")
+
+        result = create_coin(slots["name"], slots["symbol"], slots["initialSupply"],
+                             idempotency_key=idempotency_key(conversation_id, slots["name"], slots["symbol"],
+                                                             slots["initialSupply"]))
+        name, symbol = escape(slots["name"]), escape(slots["symbol"])
+        if isinstance(result, dict) and result.get("success") is False:
+            return bubble(f"⚠️ Creating <b>{name}</b> ({symbol}) failed: {escape(str(result.get('message', 'unknown error')))}")
+        return bubble(
+            f"🎉 Your coin <b>{name}</b> ({symbol}) with an initial supply of "
+            f"{escape(slots['initialSupply'])} has been created successfully!"
+        )
+
+    def _create(self, conversation_id, slots, text, awaiting=None):
+        awaiting = slots.pop("awaiting", awaiting)
+        found = self.extract_coin_details(text, awaiting)
+        if awaiting and not any(found.values()):
+            self._clear(conversation_id)
+            return None
+        for key, value in found.items():
+            if value:
+                slots[key] = value
+
+        missing = [key for key in ("name", "symbol", "initialSupply") if not slots.get(key)]
+        if missing:
+            self._save(conversation_id, CREATE, awaiting=missing[0], **slots)
+            labels = {"name": "name", "symbol": "symbol", "initialSupply": "initial supply (a whole number)"}
+            if len(missing) == 3:
+                return bubble(
+                    "🚀 Let's launch your meme coin!",
+                    "Please tell me the <b>name</b>, <b>symbol</b> and <b>initial supply</b> of the coin, "
+                    "e.g. <i>Moon Dog, MDOG, 1000000</i>.",
+                )
+            return bubble(f"Almost there! What should the <b>{labels[missing[0]]}</b> of your coin be?")
+
+        self._save(conversation_id, CREATE, confirm=True, **slots)
+        return bubble(
+            f"Launch <b>{escape(slots['name'])}</b> ({escape(slots['symbol'])}) with an initial supply of "
+            f"{escape(slots['initialSupply'])}? Reply <b>yes</b> to confirm or <b>no</b> to cancel."
+        )
+
+    def extract_coin_details(self, text, awaiting=None):
+        details = {"name": None, "symbol": None, "initialSupply": None}
+
+        parts = [p.strip() for p in re.split(r"[,;\n]", text) if p.strip()]
+        if (len(parts) == 3 and not CREATE_PATTERN.match(text) and not parse_amount(parts[0])
+                and re.fullmatch(r"\$?[A-Za-z0-9]{2,10}", parts[1]) and parse_supply(parts[2])):
+            # "Moon Dog, MDOG, 1000000"
+            return {"name": parts[0], "symbol": parts[1].lstrip("$").upper(), "initialSupply": parse_supply(parts[2])}
+
+        match = NAME_PATTERN.search(text)
+        if match:
+            details["name"] = match.group(1).strip()
+        match = SYMBOL_PATTERN.search(text)
+        if match:
+            details["symbol"] = match.group(1).upper()
+        match = SUPPLY_PATTERN.search(text)
+        if match:
+            details["initialSupply"] = parse_supply(match.group(1))
+
+        # a bare answer to the question we asked
+        if awaiting and not any(details.values()) and not QUESTION_PATTERN.match(text):
+            answer = text.strip().strip("\"'.!")
+            if awaiting == "initialSupply":
+                details["initialSupply"] = parse_supply(answer)
+            elif awaiting == "symbol" and re.fullmatch(r"\$?[A-Za-z0-9]{2,10}", answer):
+                details["symbol"] = answer.lstrip("$").upper()
+            elif awaiting == "name" and 0 < len(answer) <= 40:
+                details["name"] = answer
+        return details
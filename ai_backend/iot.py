@@ -1,32 +1,75 @@
-from django.http import StreamingHttpResponse
+from django.http import StreamingHttpResponse, JsonResponse
 from django.template.loader import render_to_string
 import serial
 from django.shortcuts import render
+import math
+import time
+import threading
+from collections import namedtuple
+
+from sensor_store import SensorStore
+from compression import choose_encoding, compress_stream
 
 CFG_comport = 'COM5'
 CFG_baudrate = 115200
 CFG_serial_timeout = 1
 CFG_no_arduino = False
+CFG_simulated_interval = 0.1  # seconds between simulated readings
+CFG_ring_size = 4096          # readings kept in memory for subscribers
+CFG_frame_interval = 0.25     # seconds of readings batched into one streamed frame
+CFG_frame_max_samples = 256
+CFG_min_frame_interval = 0.05 # bounds for the ?interval= a stream client may ask for
+CFG_max_frame_interval = 5.0
+CFG_default_resolution = 60   # seconds per window returned by get_aggregates
+CFG_default_window = 3600     # seconds of history returned by get_aggregates
+CFG_autostart_reader = True   # read the sensor from startup on, not only while a stream is open
+
+# Record prefixes sent by the Arduino sketch
+CHANNELS = ('S', 'B', 'Q')
+
+Sample = namedtuple('Sample', ['seq', 'timestamp', 'channel', 'value'])
+
+
+def parse_record(line):
+    """Parse an 'S123' style record into (channel, value), None for noise or partial lines"""
+    line = line.strip()
+    if len(line) < 2 or line[0] not in CHANNELS:
+        return None
+    try:
+        return line[0], float(line[1:])
+    except ValueError:
+        return None
+
+
+def format_sample(sample):
+    return f"{sample.channel}{sample.value:g}"
 
-def read_sensor_data():
+
+def read_sensor_data(stop_event=None):
+    """Yield raw record lines from the serial port (or simulated data), reading whatever is buffered at once"""
     ser = None  # Initialize ser outside of the conditional block
     try:
-        if not CFG_no_arduino:
-            print('Reading from serial port %s...' % CFG_comport)
-            print("Opening serial port...")
-            ser = serial.Serial(CFG_comport, CFG_baudrate, timeout=CFG_serial_timeout)
-            print("Serial port opened successfully.")
-        while True:
-            if CFG_no_arduino:
-                print("Reading from sensor (simulated data)...")
-                data = "S123\nB456\nQ789\n"
-                print("Received data:", data.strip())
-                yield data.strip()  # Yield the data instead of returning it
-            else:
-                if ser and ser.is_open:  # Check if ser is not None and is open
-                    data = ser.readline().decode('ascii').strip()
-                    print("Received data:", data)
-                    yield data.strip()  # Yield the data instead of returning it
+        if CFG_no_arduino:
+            while not (stop_event and stop_event.is_set()):
+                for line in ("S123", "B456", "Q789"):
+                    yield line
+                time.sleep(CFG_simulated_interval)
+            return
+
+        print('Reading from serial port %s...' % CFG_comport)
+        ser = serial.Serial(CFG_comport, CFG_baudrate, timeout=CFG_serial_timeout)
+        print("Serial port opened successfully.")
+        buffer = bytearray()
+        while ser.is_open and not (stop_event and stop_event.is_set()):
+            # blocks up to CFG_serial_timeout for the first byte, then drains the OS buffer
+            chunk = ser.read(ser.in_waiting or 1)
+            if not chunk:
+                continue
+            buffer.extend(chunk)
+            *lines, rest = buffer.split(b'\n')
+            buffer = bytearray(rest)
+            for line in lines:
+                yield line.decode('ascii', errors='ignore').strip()
     except Exception as e:
         print("An error occurred:", str(e))
     finally:
@@ -34,15 +77,139 @@ def read_sensor_data():
             ser.close()
 
 
+class SensorHub:
+    """Reads the sensor in a background thread into a ring buffer that any number of subscribers follow"""
+
+    def __init__(self, size=CFG_ring_size, store=None):
+        self.size = size
+        self.store = store
+        self._ring = [None] * size
+        self._next_seq = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._cond:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sensor-reader", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
 
-def sensor_data_stream():
-    for sensor_data in read_sensor_data():
-        if sensor_data:
-            yield f"{sensor_data}\n</br>"
+    def _run(self):
+        for line in read_sensor_data(self._stop):
+            record = parse_record(line)
+            if record is not None:
+                self.publish(*record)
+        with self._cond:
+            self._cond.notify_all()
+
+    def publish(self, channel, value, timestamp=None):
+        with self._cond:
+            sample = Sample(self._next_seq, timestamp or time.time(), channel, value)
+            self._ring[sample.seq % self.size] = sample
+            self._next_seq += 1
+            self._cond.notify_all()
+        if self.store is not None:
+            self.store.add(channel, sample.timestamp, value)
+
+    def read_since(self, cursor, max_samples=CFG_frame_max_samples):
+        """Return (samples with seq >= cursor, next cursor); readers that fell behind skip to the oldest kept"""
+        with self._cond:
+            cursor = max(cursor, self._next_seq - self.size)
+            end = min(self._next_seq, cursor + max_samples)
+            return [self._ring[seq % self.size] for seq in range(cursor, end)], end
+
+    def wait_for(self, cursor, timeout):
+        with self._cond:
+            if self._next_seq <= cursor and self.running:
+                self._cond.wait(timeout)
+            return self._next_seq > cursor
+
+    def subscribe(self, frame_interval=CFG_frame_interval, max_samples=CFG_frame_max_samples):
+        """Yield batches of new samples, at most one batch per frame_interval"""
+        self.start()
+        cursor = self._next_seq
+        while True:
+            if not self.wait_for(cursor, frame_interval):
+                if not self.running:
+                    return
+                continue
+            # let readings accumulate so one frame carries the whole interval
+            time.sleep(frame_interval)
+            while True:
+                samples, cursor = self.read_since(cursor, max_samples)
+                if not samples:
+                    break
+                yield samples
+
+
+sensor_store = SensorStore(CHANNELS)
+sensor_hub = SensorHub(store=sensor_store)
+if CFG_autostart_reader:
+    # Django imports the views once at startup; requests never start the reader as a side effect
+    sensor_hub.start()
+
+
+def sensor_data_stream(frame_interval=CFG_frame_interval):
+    for samples in sensor_hub.subscribe(frame_interval=frame_interval):
+        yield "".join(f"{format_sample(sample)}\n</br>" for sample in samples)
 
 def get_rate(request):
-    response = StreamingHttpResponse(sensor_data_stream(), content_type='text/html')
+    """Live readings, one coalesced frame per ?interval= seconds, gzip/br compressed when accepted"""
+    try:
+        interval = float(request.GET.get('interval', CFG_frame_interval))
+    except ValueError:
+        interval = CFG_frame_interval
+    if not math.isfinite(interval):
+        return JsonResponse({"error": "interval must be a finite number"}, status=400)
+    interval = min(max(interval, CFG_min_frame_interval), CFG_max_frame_interval)
+
+    stream = sensor_data_stream(interval)
+    encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'))
+    if encoding:
+        # every frame is flushed through the compressor, so it still arrives as soon as it is ready
+        stream = compress_stream(stream, encoding)
+    response = StreamingHttpResponse(stream, content_type='text/html')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # keep reverse proxies from holding frames back
     return response
 
+def get_aggregates(request):
+    """Windowed min/max/mean of the recent readings, e.g. ?channel=S&resolution=60&window=3600"""
+    try:
+        resolution = float(request.GET.get('resolution', CFG_default_resolution))
+        window = float(request.GET.get('window', CFG_default_window))
+    except ValueError:
+        return JsonResponse({"error": "resolution and window must be numbers"}, status=400)
+    if not (math.isfinite(resolution) and math.isfinite(window)) or resolution <= 0 or window <= 0:
+        return JsonResponse({"error": "resolution and window must be positive finite numbers"}, status=400)
+
+    channels = request.GET.get('channel')
+    channels = channels.split(',') if channels else list(CHANNELS)
+    unknown = [c for c in channels if c not in CHANNELS]
+    if unknown:
+        return JsonResponse({"error": f"unknown channel(s): {', '.join(unknown)}"}, status=400)
+
+    # aggregates are only collected while the reader runs, see CFG_autostart_reader
+    until = time.time()
+    return JsonResponse({
+        "resolution": resolution,
+        "since": until - window,
+        "until": until,
+        "channels": {c: sensor_store.aggregate(c, resolution, until - window, until) for c in channels},
+    })
+
 def show_data(request):
-    return render(request, 'doctor/your_template.html')
\ No newline at end of file
+    return render(request, 'doctor/your_template.html')
@@ -0,0 +1,205 @@
+import os
+import re
+import time
+import threading
+from html import unescape
+from concurrent.futures import ThreadPoolExecutor
+
+from ratelimit import InMemoryRateLimiter, RateLimited
+
+PREFETCH_ENABLED = os.environ.get("SPECULATIVE_PREFETCH", "").lower() in ("1", "true", "yes")
+PREFETCH_TTL = 120         # seconds a precomputed reply stays valid
+MAX_PREDICTIONS = 2        # follow-ups precomputed per reply
+MAX_WORKERS = 1            # speculative LLM calls running at once
+PREFETCH_BUDGET = (30, 30 / 3600)  # speculative LLM calls: 30 burst, 30 per hour
+SCHEDULER_CLIENT = "prefetch"      # the scheduler client speculative calls are accounted to
+
+LIST_ITEM = re.compile(r"<li\b[^>]*>(.*?)</li>", re.I | re.S)
+NUMBERED_LINE = re.compile(r"^\s*\d+[.)]\s+(.+)$", re.M)
+TAG = re.compile(r"<[^>]+>")
+# "tell me more about staking" and "staking" ask the same thing
+FOLLOWUP_PREFIX = re.compile(
+    r"^(please\s+)?(tell me (more )?about|more (info |details )?(on|about)|what (is|are|about)|explain|"
+    r"let'?s talk about|i want to (know|learn) about|go with|option)\s+", re.I
+)
+
+
+def normalize(text):
+    text = unescape(TAG.sub(" ", text)).lower()
+    text = re.sub(r"[^\w\s$'-]", " ", text)
+    text = " ".join(text.split())
+    return FOLLOWUP_PREFIX.sub("", text).strip()
+
+
+def list_topics(reply):
+    """Items of the list a reply offers, as short topic names, in order"""
+    items = LIST_ITEM.findall(reply) or NUMBERED_LINE.findall(TAG.sub("", reply))
+    topics = []
+    for item in items:
+        text = unescape(TAG.sub("", item)).strip()
+        # "DeFi: lending and DEXes" / "DeFi - lending and DEXes" -> "DeFi"
+        text = re.split(r"\s*(?::|\s-\s|\s–\s|\()", text, maxsplit=1)[0]
+        text = re.sub(r"^[^\w$]+|[^\w)]+$", "", text).strip()
+        if 0 < len(text) <= 60:
+            topics.append(text)
+    return topics
+
+
+def predict_followups(reply, limit=MAX_PREDICTIONS):
+    """Likely next user messages after reply: [(query to precompute, normalized ways of asking it)]"""
+    predictions = []
+    for number, topic in enumerate(list_topics(reply), start=1):
+        if len(predictions) >= limit:
+            break
+        predictions.append((f"Tell me more about {topic}", {normalize(topic), str(number)}))
+    return predictions
+
+
+class SpeculativeCache:
+    """Precomputes replies to the predicted next message of a conversation while the service is idle.
+
+    schedule() is called after a reply with a run(query) callable that produces a reply without
+    touching the conversation; results are kept per conversation for ttl seconds and only while the
+    history is still at the version they were computed for. Each call holds an upstream slot of the
+    scheduler while it runs, taken without waiting; work is dropped rather than queued when a worker
+    is busy, live requests are using or waiting for the upstream, or the call budget is spent.
+    """
+
+    def __init__(self, scheduler=None, enabled=PREFETCH_ENABLED, ttl=PREFETCH_TTL,
+                 max_predictions=MAX_PREDICTIONS, workers=MAX_WORKERS, budget=PREFETCH_BUDGET):
+        self.scheduler = scheduler
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_predictions = max_predictions
+        self.workers = workers
+        self.budget = budget
+        self._budget = InMemoryRateLimiter()
+        self._executor = None
+        self._pending = 0
+        self._entries = {}  # conversation id -> {"version", "expires", "aliases", "responses"}
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(
+            ("scheduled", "computed", "discarded", "hits", "misses", "late", "wasted",
+             "skipped_busy", "skipped_budget"), 0)
+
+    def _count(self, name, n=1):
+        self.counters[name] += n
+
+    def _drop(self, conversation_id):
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self._count("wasted", len(entry["responses"]))
+
+    def _take_slot(self):
+        """An upstream slot for the whole speculative call, only if the service is idle; returns whether one was taken"""
+        if self.scheduler is None:
+            return True
+        stats = self.scheduler.stats()
+        if stats["active"] or stats["waiting"]:
+            return False
+        return self.scheduler.try_acquire(SCHEDULER_CLIENT)
+
+    def _release_slot(self):
+        if self.scheduler is not None:
+            self.scheduler.release()
+
+    def schedule(self, conversation_id, version, reply, run):
+        """Precompute the likely follow-ups to reply, returns how many were scheduled"""
+        if not self.enabled:
+            return 0
+        predictions = predict_followups(reply, self.max_predictions)
+        with self._lock:
+            self._drop(conversation_id)
+            if not predictions:
+                return 0
+            entry = {"version": version, "expires": time.time() + self.ttl, "aliases": {}, "responses": {}}
+            self._entries[conversation_id] = entry
+            scheduled = 0
+            for query, aliases in predictions:
+                if self._pending >= self.workers * self.max_predictions:
+                    self._count("skipped_busy")
+                    continue
+                for alias in aliases:
+                    entry["aliases"].setdefault(alias, query)
+                self._pending += 1
+                scheduled += 1
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch")
+                self._executor.submit(self._compute, conversation_id, entry, query, run)
+            self._count("scheduled", scheduled)
+            return scheduled
+
+    def _compute(self, conversation_id, entry, query, run):
+        try:
+            with self._lock:
+                if self._entries.get(conversation_id) is not entry or time.time() > entry["expires"]:
+                    return
+            if not self._take_slot():
+                # a live request is using the upstream, it keeps it
+                with self._lock:
+                    self._count("skipped_busy")
+                return
+            try:
+                self._budget.take("prefetch", *self.budget)
+            except RateLimited:
+                self._release_slot()
+                with self._lock:
+                    self._count("skipped_budget")
+                return
+            try:
+                response = run(query)
+            except Exception as e:
+                print(f"Prefetch of {query!r} failed: {e}")
+                response = None
+            finally:
+                self._release_slot()
+            with self._lock:
+                if response is None:
+                    self._count("discarded")
+                elif self._entries.get(conversation_id) is entry:
+                    entry["responses"][query] = response
+                    self._count("computed")
+                else:
+                    # the conversation moved on while this was running
+                    self._count("wasted")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def lookup(self, conversation_id, query, version):
+        """Precomputed reply to query if the conversation is still where it was, None otherwise"""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return None
+            if entry["version"] != version or time.time() > entry["expires"]:
+                self._drop(conversation_id)
+                return None
+            predicted = entry["aliases"].get(normalize(query))
+            if predicted is None:
+                self._count("misses")
+                self._drop(conversation_id)
+                return None
+            response = entry["responses"].pop(predicted, None)
+            if response is None:
+                self._count("late")
+                self._count("misses")
+                self._drop(conversation_id)
+                return None
+            self._count("hits")
+            self._drop(conversation_id)
+            return response
+
+    def invalidate(self, conversation_id):
+        with self._lock:
+            self._drop(conversation_id)
+
+    def stats(self):
+        with self._lock:
+            now = time.time()
+            for conversation_id in [c for c, e in self._entries.items() if now > e["expires"]]:
+                self._drop(conversation_id)
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return dict(self.counters, enabled=self.enabled, pending=self._pending,
+                        conversations=len(self._entries),
+                        hit_rate=self.counters["hits"] / lookups if lookups else None)
@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import threading
+
+import numpy as np
+
+from chain import Contract, JsonRpcClient, FACTORY_ADDRESS, DEX_ADDRESS
+
+INDEX_DIR = os.environ.get(
+    "PRICE_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".price_index")
+)
+START_BLOCK = int(os.environ.get("CLAMPIFY_START_BLOCK", 0))
+CONFIRMATIONS = 3    # blocks behind head that are indexed, the store is append-only and never rewound
+SYNC_INTERVAL = 15   # seconds between background syncs
+MAX_SYNC_BLOCKS = 50_000
+
+WEI = 10**18
+SOURCE_CURVE, SOURCE_DEX = 0, 1
+
+TRADE_COLUMNS = {"ts": "<f8", "price": "<f8", "volume": "<f8", "eth": "<f8", "side": "<i1", "source": "<i1", "block": "<u8"}
+CANDLE_COLUMNS = {"ts": "<f8", "open": "<f8", "high": "<f8", "low": "<f8", "close": "<f8", "volume": "<f8"}
+
+
+class ColumnStore:
+    """Append-only columns, one raw little-endian file per column, mirrored in memory as numpy arrays.
+
+    rows is the number of rows known to be committed; anything past it, or past the shortest
+    column, was written by an append that did not complete and is cut off the files on load.
+    """
+
+    def __init__(self, path, columns, rows=None):
+        self.path = path
+        self.columns = columns
+        os.makedirs(path, exist_ok=True)
+        self._data = {}
+        for name, dtype in columns.items():
+            file = self._file(name)
+            self._data[name] = np.fromfile(file, dtype=dtype) if os.path.exists(file) else np.empty(0, dtype=dtype)
+        # a crash between column writes leaves columns of different length, keep the complete rows
+        complete = min(len(col) for col in self._data.values())
+        rows = complete if rows is None else min(rows, complete)
+        for name, dtype in columns.items():
+            self._data[name] = self._data[name][:rows]
+            # also drops a partial value at the end of a file, which fromfile skips
+            size = rows * np.dtype(dtype).itemsize
+            if os.path.exists(self._file(name)) and os.path.getsize(self._file(name)) > size:
+                with open(self._file(name), "r+b") as f:
+                    f.truncate(size)
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def __len__(self):
+        return len(self._data["ts"])
+
+    def append(self, rows):
+        """rows: {column: sequence}, all of the same length"""
+        batch = {name: np.asarray(rows[name], dtype=dtype) for name, dtype in self.columns.items()}
+        for name, values in batch.items():
+            with open(self._file(name), "ab") as f:
+                values.tofile(f)
+            self._data[name] = np.concatenate([self._data[name], values])
+
+    def __getitem__(self, name):
+        return self._data[name]
+
+
+def resample(ts, price, volume, resolution, since=None, until=None):
+    """OHLCV per `resolution` seconds from time-ordered trades, as parallel numpy arrays"""
+    mask = np.ones(len(ts), dtype=bool)
+    if since is not None:
+        mask &= ts >= since
+    if until is not None:
+        mask &= ts < until
+    ts, price, volume = ts[mask], price[mask], volume[mask]
+    if not len(ts):
+        empty = np.empty(0)
+        return {"t": empty, "open": empty, "high": empty, "low": empty, "close": empty, "volume": empty}
+
+    buckets = np.floor_divide(ts, resolution).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    return {
+        "t": buckets[starts] * resolution,
+        "open": price[starts],
+        "high": np.maximum.reduceat(price, starts),
+        "low": np.minimum.reduceat(price, starts),
+        "close": price[ends],
+        "volume": np.add.reduceat(volume, starts),
+    }
+
+
+class PriceIndexer:
+    """Indexes Clampify trade events into per-token trade columns and serves OHLCV at any resolution"""
+
+    def __init__(self, rpc=None, index_dir=INDEX_DIR, factory_address=FACTORY_ADDRESS,
+                 dex_address=DEX_ADDRESS, start_block=START_BLOCK):
+        self.rpc = rpc or JsonRpcClient()
+        self.index_dir = index_dir
+        self.factory = Contract("ClampifyFactory", factory_address)
+        self.token_abi = Contract("ClampifyToken")
+        self.dex = Contract("ClampifyDEX", dex_address) if dex_address else None
+        self._lock = threading.RLock()
+        self._stores = {}
+        self._thread = None
+
+        os.makedirs(index_dir, exist_ok=True)
+        self._state_path = os.path.join(index_dir, "state.json")
+        try:
+            with open(self._state_path, encoding="utf-8") as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {"last_block": start_block - 1, "tokens": {}, "rows": {}}
+        if "rows" not in self.state:
+            # written before row counts were kept, the files are all there is to go by
+            rows = {}
+            for token in self.tokens:
+                for kind in ("trades", "candles"):
+                    if os.path.isdir(os.path.join(index_dir, token, kind)):
+                        rows[f"{token}/{kind}"] = len(self._store(token, kind))
+            self.state["rows"] = rows
+
+    @property
+    def tokens(self):
+        return self.state["tokens"]
+
+    def _store(self, token, kind):
+        key = (token, kind)
+        if key not in self._stores:
+            columns = TRADE_COLUMNS if kind == "trades" else CANDLE_COLUMNS
+            # rows past the count saved with last_block belong to a sync that never finished
+            rows = self.state["rows"].get(f"{token}/{kind}", 0) if "rows" in self.state else None
+            self._stores[key] = ColumnStore(os.path.join(self.index_dir, token, kind), columns, rows)
+        return self._stores[key]
+
+    def _save_state(self):
+        tmp = self._state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self._state_path)
+
+    def sync(self, to_block=None):
+        """Index all events up to to_block (default: head minus CONFIRMATIONS), returns the number of trades added"""
+        with self._lock:
+            from_block = self.state["last_block"] + 1
+            head = self.rpc.block_number() - CONFIRMATIONS
+            to_block = head if to_block is None else min(to_block, head)
+            to_block = min(to_block, from_block + MAX_SYNC_BLOCKS - 1)
+            if to_block < from_block:
+                return 0
+
+            for log in self.rpc.get_logs(
+                    [self.factory.address], [[self.factory.topic("TokenCreated")]], from_block, to_block):
+                event = self.factory.decode_log(log)
+                self.tokens[event["args"]["tokenAddress"]] = {
+                    "name": event["args"]["name"], "symbol": event["args"]["symbol"], "created_block": event["block"],
+                }
+
+            events = []
+            if self.tokens:
+                topics = [[self.token_abi.topic(name) for name in ("TokensPurchased", "TokensSold", "CandleUpdated")]]
+                events += [self.token_abi.decode_log(log)
+                           for log in self.rpc.get_logs(list(self.tokens), topics, from_block, to_block)]
+            if self.dex is not None:
+                events += [self.dex.decode_log(log)
+                           for log in self.rpc.get_logs([self.dex.address], [[self.dex.topic("TokenSwap")]],
+                                                        from_block, to_block)]
+            events = [e for e in events if e is not None]
+            events.sort(key=lambda e: (e["block"], e["log_index"]))
+
+            try:
+                added = self._ingest(events)
+            except Exception:
+                # reopen from disk, cutting back to the rows of the last saved state
+                self._stores.clear()
+                raise
+            self.state["last_block"] = to_block
+            self.state["rows"].update({f"{token}/{kind}": len(store) for (token, kind), store in self._stores.items()})
+            self._save_state()
+            return added
+
+    def _ingest(self, events):
+        trade_blocks = [e["block"] for e in events if e["event"] != "CandleUpdated"]
+        timestamps = self.rpc.block_timestamps(trade_blocks) if trade_blocks else {}
+
+        trades, candles = {}, {}
+        for e in events:
+            args = e["args"]
+            if e["event"] == "CandleUpdated":
+                rows = candles.setdefault(e["address"], {name: [] for name in CANDLE_COLUMNS})
+                rows["ts"].append(args["timestamp"])
+                for name in ("open", "high", "low", "close"):
+                    rows[name].append(args[name] / WEI)
+                rows["volume"].append(args["volume"] / WEI)
+                continue
+
+            if e["event"] == "TokenSwap":
+                token = args["tokenAddress"]
+                tokens, eth = args["tokenAmount"], args["ethAmount"]
+                price = eth / tokens if tokens else 0.0
+                side, source = (1 if args["isBuy"] else -1), SOURCE_DEX
+            elif e["event"] == "TokensPurchased":
+                token, tokens, eth = e["address"], args["tokensMinted"], args["amountPaid"]
+                price, side, source = args["price"] / WEI, 1, SOURCE_CURVE
+            else:
+                token, tokens, eth = e["address"], args["tokensBurned"], args["amountReceived"]
+                price, side, source = args["price"] / WEI, -1, SOURCE_CURVE
+
+            rows = trades.setdefault(token, {name: [] for name in TRADE_COLUMNS})
+            rows["ts"].append(timestamps[e["block"]])
+            rows["price"].append(price)
+            rows["volume"].append(tokens / WEI)
+            rows["eth"].append(eth / WEI)
+            rows["side"].append(side)
+            rows["source"].append(source)
+            rows["block"].append(e["block"])
+
+        for token, rows in trades.items():
+            self._store(token, "trades").append(rows)
+        for token, rows in candles.items():
+            self._store(token, "candles").append(rows)
+        return sum(len(rows["ts"]) for rows in trades.values())
+
+    def resolve(self, token):
+        """Token address for an address, name or symbol, None if unknown"""
+        token = token.strip().lower()
+        if token in self.tokens:
+            return token
+        for address, info in self.tokens.items():
+            if token in (info["name"].lower(), info["symbol"].lower()):
+                return address
+        return None
+
+    def ohlcv(self, token, resolution=3600, since=None, until=None, source=None):
+        """Candles of one token (address, name or symbol) as a list of {t, open, high, low, close, volume}"""
+        address = self.resolve(token)
+        if address is None:
+            return []
+        with self._lock:
+            store = self._store(address, "trades")
+            ts, price, volume = store["ts"], store["price"], store["volume"]
+            if source is not None:
+                mask = store["source"] == source
+                ts, price, volume = ts[mask], price[mask], volume[mask]
+        candles = resample(ts, price, volume, resolution, since, until)
+        return [
+            {"t": int(t), "open": float(o), "high": float(h), "low": float(l), "close": float(c), "volume": float(v)}
+            for t, o, h, l, c, v in zip(candles["t"], candles["open"], candles["high"],
+                                        candles["low"], candles["close"], candles["volume"])
+        ]
+
+    def onchain_candles(self, token):
+        """Latest state of each on-chain hourly candle reported by CandleUpdated"""
+        address = self.resolve(token)
+        if address is None:
+            return []
+        with self._lock:
+            store = self._store(address, "candles")
+            if not len(store):
+                return []
+            # every trade re-emits its hour's candle, keep the last row per timestamp
+            ts = store["ts"][::-1]
+            _, first = np.unique(ts, return_index=True)
+            last = len(ts) - 1 - first
+            return [
+                {name: float(store[name][i]) for name in CANDLE_COLUMNS}
+                for i in sorted(last, key=lambda i: store["ts"][i])
+            ]
+
+    def start(self, interval=SYNC_INTERVAL):
+        """Keep syncing in a background thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="price-indexer", daemon=True)
+        self._thread.start()
+
+    def _run(self, interval):
+        while True:
+            try:
+                # sync covers at most MAX_SYNC_BLOCKS, keep going until caught up with the head
+                previous = None
+                while self.state["last_block"] != previous:
+                    previous = self.state["last_block"]
+                    self.sync()
+            except Exception as e:
+                print(f"Price indexer sync failed: {e}")
+            time.sleep(interval)
+
+
+_indexer = None
+_indexer_lock = threading.Lock()
+
+
+def get_indexer():
+    global _indexer
+    with _indexer_lock:
+        if _indexer is None:
+            _indexer = PriceIndexer()
+            _indexer.start()
+        return _indexer
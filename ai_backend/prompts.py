@@ -0,0 +1,223 @@
+import os
+import re
+import sys
+import hashlib
+from html import unescape
+
+from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
+
+from helpers import get_web3_prompt
+
+PROMPT_COMPRESSION = os.environ.get("PROMPT_COMPRESSION", "1").lower() not in ("0", "false", "no")
+COMPRESS_HISTORY = os.environ.get("COMPRESS_HISTORY", "").lower() in ("1", "true", "yes")
+HISTORY_KEEP_RECENT = 4  # latest messages always sent verbatim, so the model keeps seeing the HTML format
+
+CHARACTERS = (
+    "blockchain-advisor", "defi-specialist", "nft-guru", "crypto-trader", "smart-contract-dev",
+    "dao-strategist", "web3-architect", "metaverse-guide", "token-economist", "blockchain-security",
+)
+
+UI_INSTRUCTIONS = '''
+        Important UI formatting instructions:
+             - Don't use white color for the text. Use black color for the text.
+             - Generate clean, visually appealing HTML for a chat bubble UI response using Tailwind CSS.
+             - The response should resemble a chat bubble with no unnecessary buttons or extra spaces.
+             - Ensure the text is easy to read and visually engaging.
+             - Include appropriate blockchain/crypto-related emojis to enhance the chat experience.
+             - If any URLs are present, make them clickable and styled properly (without showing the raw URL).
+             - Use blockchain-appropriate styling #ffae5c for bg of bubble of the chat.
+             - The UI should be responsive and look good on both desktop and mobile devices.
+             - Avoid adding any unnecessary line spaces or elements outside of the chat bubble format.
+             - Don't add any line spaces in the first line of the response and all of the lines.
+             - Don't add padding in the text. Don't use unwanted padding for the tags.
+             - If you are using the link emoji, make sure the link is clickable and the link is not the raw URL.
+             - Add a 🔗 emoji before links in lists, and style links in a contrasting color.
+             - Format code examples with appropriate syntax highlighting when relevant.
+        '''
+
+AGENT_ACTIONS = """
+        Very important agent actions:
+
+        Tocken creation or coin creation or token launch:
+         - if the user ask to create a meme coin, then ask for the name of the coin and the symbol of the coin and initialSupply of the coin.
+         - if the user also given the details of the coins. then add the keyword in your response. of
+         ~newcoincreaterequest#value1#value2#value3~ the following of that user selected that three thing respectively and send the response to the user.
+
+
+        if user ask for meme coin, to buy then list out the meme coins given in the relevant knowledge section to the user and ask select anything.
+
+        once user selected showw message the coin added your account successfully.
+
+        if the user ask to sell the coin then list out the meme coins given in the relevant knowledge section to the user and ask select anything.
+
+        once the user select any of the coin then show message the coin sell request sent successfully.
+
+        once the user select any of the coin then ask for the amount of coin to buy.
+
+        Trading what-if simulation:
+         - if the user ask what happens to the price if some number of buyers or sellers come in, then add the keyword in your response of
+         ~simulatetrades#buyers#eth_per_buyer#sellers~ with the numbers from the question (use 0.05 for eth_per_buyer and 0 for sellers if not given).
+
+
+        """
+
+# Hand-compressed versions of the two blocks above, merging the rules that say the same thing.
+# They are keyed by a hash of the block they were written for and are only used while it matches.
+COMPACT_BLOCKS = {
+    "UI": ("0235a2d9c68f7147", """UI format:
+- Reply with clean HTML for a single chat bubble using Tailwind CSS, bubble background #ffae5c, black text (never white).
+- Easy to read, engaging, responsive on desktop and mobile, with fitting blockchain/crypto emojis.
+- No buttons, no padding on text or tags, no blank lines (including the first line), nothing outside the bubble.
+- Links: clickable, contrasting color, never show the raw URL; put 🔗 before links in lists.
+- Syntax-highlight code examples when relevant."""),
+    "ACTIONS": ("7be19d4884b51c4d", """Very important agent actions:
+Token/coin creation or launch:
+- If the user asks to create a meme coin, ask for its name, symbol and initialSupply.
+- Once the user has given all three, add the keyword ~newcoincreaterequest#value1#value2#value3~ (name, symbol, initialSupply in that order) to your response.
+Buying: list the meme coins given in the relevant knowledge section and ask which one; once one is selected ask for the amount to buy, then say the coin was added to their account successfully.
+Selling: list the same meme coins and ask which one; once one is selected say the sell request was sent successfully.
+Trading what-if simulation:
+- If the user asks what happens to the price when some number of buyers or sellers come in, add the keyword ~simulatetrades#buyers#eth_per_buyer#sellers~ with the numbers from the question (use 0.05 for eth_per_buyer and 0 for sellers if not given)."""),
+}
+
+MARKER = re.compile(r"~[a-z]+(?:#[\w.]+)+~")
+HEX_COLOR = re.compile(r"#[0-9a-fA-F]{6}\b")
+TAG = re.compile(r"<[^>]+>")
+
+
+def fingerprint(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def full_prompt(character):
+    """The system prompt as written: base, character block, UI rules and agent actions"""
+    return get_web3_prompt(character) + UI_INSTRUCTIONS + AGENT_ACTIONS
+
+
+def minify(text):
+    """Drop indentation, blank lines, repeated spaces and lines that repeat an earlier one"""
+    lines, seen = [], set()
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        key = re.sub(r"[^a-z0-9]+", " ", line.lower()).strip()
+        if not line or key in seen:
+            continue
+        if key:
+            seen.add(key)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _block(name, verbose):
+    expected, compact = COMPACT_BLOCKS[name]
+    if fingerprint(verbose) == expected:
+        return compact
+    # the verbose block was edited after the compact one was written
+    return minify(verbose)
+
+
+def compress_prompt(character):
+    return "\n".join([
+        minify(get_web3_prompt(character)),
+        _block("UI", UI_INSTRUCTIONS),
+        _block("ACTIONS", AGENT_ACTIONS),
+    ])
+
+
+def required_phrases(prompt):
+    """What a compressed prompt has to keep verbatim: action markers, colors and every bullet of the persona"""
+    phrases = set(MARKER.findall(prompt)) | set(HEX_COLOR.findall(prompt))
+    for line in prompt.split("Important UI formatting instructions:")[0].splitlines():
+        line = " ".join(line.split())
+        if line.startswith("- "):
+            phrases.add(line[2:])
+    return phrases
+
+
+def check_prompt(original, compressed):
+    """Phrases of original lost in compressed, empty if it is safe to use"""
+    return sorted(p for p in required_phrases(original) if p not in compressed)
+
+
+def _build():
+    prompts = {}
+    for character in CHARACTERS:
+        original = full_prompt(character)
+        compressed = compress_prompt(character)
+        missing = check_prompt(original, compressed)
+        if missing:
+            print(f"Compressed prompt for {character} dropped {missing}, using the full prompt")
+            compressed = original
+        prompts[character] = compressed
+    return prompts
+
+
+COMPRESSED_PROMPTS = _build() if PROMPT_COMPRESSION else {}
+
+
+def system_prompt(character):
+    """System prompt for a new conversation, the precomputed compressed one when enabled"""
+    if character not in CHARACTERS:
+        # get_web3_prompt falls back to the advisor as well
+        character = "blockchain-advisor"
+    return COMPRESSED_PROMPTS.get(character) or full_prompt(character)
+
+
+def plain_text(html):
+    return " ".join(unescape(TAG.sub(" ", html)).split())
+
+
+def compress_history(messages, keep_recent=HISTORY_KEEP_RECENT):
+    """Messages with older assistant replies reduced to their text; Tailwind markup is most of their tokens"""
+    if not COMPRESS_HISTORY:
+        return messages
+    cutoff = len(messages) - keep_recent
+    return [
+        AIMessage(content=plain_text(m.content)) if i < cutoff and isinstance(m, AIMessage) and "<" in m.content else m
+        for i, m in enumerate(messages)
+    ]
+
+
+# Turns the compressed prompt has to handle like the full one; each check is a regex the reply must match
+REGRESSION_SET = [
+    ("blockchain-advisor", "What is a blockchain node?", r"(?i)<div[^>]*#ffae5c"),
+    ("defi-specialist", "Explain impermanent loss in one paragraph", r"(?i)<div[^>]*#ffae5c"),
+    ("blockchain-advisor", "Create a meme coin named Moon Dog with symbol MDOG and initial supply 1000000",
+     r"~newcoincreaterequest#[^#~]+#[^#~]+#[^#~]+~"),
+    ("blockchain-advisor", "I want to create a meme coin", r"(?i)symbol"),
+    ("crypto-trader", "What happens to the price if 20 buyers come in with 0.1 ETH each?",
+     r"~simulatetrades#20#0\.1#0~"),
+    ("blockchain-advisor", "I want to buy a meme coin", r"(?i)<(ol|ul|li)\b"),
+    ("dao-strategist", "What is a governance quorum?", r"(?i)quorum"),
+]
+
+
+def regression(llm, cases=REGRESSION_SET):
+    """Run every case with the full and the compressed prompt, returns the cases where they disagree"""
+    disagreements = []
+    for character, query, expected in cases:
+        results = {}
+        for label, prompt in (("full", full_prompt(character)), ("compressed", compress_prompt(character))):
+            response = llm.invoke([SystemMessage(content=prompt), HumanMessage(content=query)])
+            text = response.content if hasattr(response, "content") else str(response)
+            results[label] = bool(re.search(expected, text))
+        if results["full"] != results["compressed"]:
+            disagreements.append({"character": character, "query": query, **results})
+    return disagreements
+
+
+if __name__ == "__main__":
+    # python prompts.py [--live]: sizes and phrase checks, --live also runs REGRESSION_SET through the LLM
+    for character in CHARACTERS:
+        original, compressed = full_prompt(character), compress_prompt(character)
+        missing = check_prompt(original, compressed)
+        print(f"{character}: {len(original)} -> {len(compressed)} chars "
+              f"({100 - 100 * len(compressed) / len(original):.0f}% smaller){' MISSING ' + str(missing) if missing else ''}")
+    for name, verbose in (("UI", UI_INSTRUCTIONS), ("ACTIONS", AGENT_ACTIONS)):
+        if fingerprint(verbose) != COMPACT_BLOCKS[name][0]:
+            print(f"{name} block changed since its compact version was written ({fingerprint(verbose)})")
+    if "--live" in sys.argv:
+        from LLM.Nilai import NillionLLM
+        llm = NillionLLM(model="meta-llama/Llama-3.1-8B-Instruct", temperature=0.0, max_tokens=512)
+        failures = regression(llm)
+        print(failures or "compressed prompts pass the regression set")
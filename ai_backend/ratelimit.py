@@ -0,0 +1,231 @@
+import os
+import math
+import time
+import heapq
+import sqlite3
+import itertools
+import threading
+from contextlib import contextmanager
+
+# (capacity, refill per second) of the token buckets checked on every /chat request
+CLIENT_LIMIT = (20, 20 / 60)            # 20 request burst, 20 requests per minute per client
+CONVERSATION_LIMIT = (10, 10 / 60)      # 10 request burst, 10 requests per minute per conversation
+NEW_CONVERSATION_LIMIT = (5, 5 / 300)   # 5 new conversations, then one per minute per client
+
+RATE_LIMIT_STORE = os.environ.get("RATE_LIMIT_STORE", "memory")
+RATE_LIMIT_DB = os.environ.get(
+    "RATE_LIMIT_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ratelimit.db")
+)
+
+# proxies in front of the app whose X-Forwarded-For is trusted; 0 means clients are keyed by the socket address
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", 0))
+SWEEP_INTERVAL = 60  # seconds between sweeps of full buckets, which are the same as no bucket
+
+MAX_UPSTREAM_CONCURRENCY = int(os.environ.get("MAX_UPSTREAM_CONCURRENCY", 4))
+MAX_QUEUE_WAIT = 30  # seconds a request may wait for an upstream slot
+CLIENT_WEIGHTS = {}  # client key -> scheduling weight, clients not listed get 1
+
+
+class RateLimited(Exception):
+    def __init__(self, key, retry_after):
+        super().__init__(f"Rate limit exceeded for {key}, retry after {retry_after:.1f}s")
+        self.key = key
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def _refill(tokens, updated, now, capacity, rate, cost):
+    """Token bucket step: returns (tokens left, seconds to wait or 0 if the request is allowed)"""
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class InMemoryRateLimiter:
+    """Token buckets kept in this process, for a single worker"""
+
+    def __init__(self, sweep_interval=SWEEP_INTERVAL):
+        self.sweep_interval = sweep_interval
+        self._buckets = {}  # key -> (tokens, updated, capacity, rate)
+        self._lock = threading.Lock()
+        self._swept = time.monotonic()
+
+    def take(self, key, capacity, rate, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _, _ = self._buckets.get(key, (capacity, now, capacity, rate))
+            tokens, wait = _refill(tokens, updated, now, capacity, rate, cost)
+            self._buckets[key] = (tokens, now, capacity, rate)
+            if now - self._swept >= self.sweep_interval:
+                self._sweep(now)
+        if wait:
+            raise RateLimited(key, wait)
+
+    def _sweep(self, now):
+        self._swept = now
+        self._buckets = {key: bucket for key, bucket in self._buckets.items()
+                         if bucket[0] + (now - bucket[1]) * bucket[3] < bucket[2]}
+
+
+class SQLiteRateLimiter:
+    """Token buckets in a SQLite file, shared by every worker process on the host"""
+
+    def __init__(self, path=RATE_LIMIT_DB, sweep_interval=SWEEP_INTERVAL):
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._swept = time.time()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, "
+                "capacity REAL NOT NULL DEFAULT 0, rate REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(buckets)")}
+            for column in ("capacity", "rate"):
+                if column not in columns:
+                    # tables from before sweeping; their rows get the columns on the next take
+                    try:
+                        conn.execute(f"ALTER TABLE buckets ADD COLUMN {column} REAL NOT NULL DEFAULT 0")
+                    except sqlite3.OperationalError:
+                        pass  # another worker added it first
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, capacity, rate, cost=1):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens, wait = _refill(tokens, updated, now, capacity, rate, cost)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated, capacity, rate) VALUES (?, ?, ?, ?, ?)",
+                (key, tokens, now, capacity, rate),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if now - self._swept >= self.sweep_interval:
+            self.sweep(now)
+        if wait:
+            raise RateLimited(key, wait)
+
+
+    def sweep(self, now=None):
+        """Delete the buckets that have refilled completely, returns how many"""
+        now = time.time() if now is None else now
+        self._swept = now
+        # rows without a rate predate sweeping; every limit here refills within a day
+        cursor = self._conn().execute(
+            "DELETE FROM buckets WHERE (rate > 0 AND tokens + (? - updated) * rate >= capacity) "
+            "OR (rate = 0 AND updated < ?)", (now, now - 86400),
+        )
+        return cursor.rowcount
+
+
+def make_rate_limiter(store=RATE_LIMIT_STORE):
+    if store == "sqlite":
+        return SQLiteRateLimiter()
+    return InMemoryRateLimiter()
+
+
+def check_chat_limits(limiter, client, conversation_id, new_conversation):
+    """Take one token from every bucket that applies to a /chat request, raises RateLimited"""
+    limiter.take(f"client:{client}", *CLIENT_LIMIT)
+    if new_conversation:
+        limiter.take(f"new:{client}", *NEW_CONVERSATION_LIMIT)
+    limiter.take(f"conversation:{conversation_id}", *CONVERSATION_LIMIT)
+
+
+class SchedulerTimeout(Exception):
+    def __init__(self, client, waited):
+        super().__init__(f"No upstream slot for {client} after {waited:.1f}s")
+        self.client = client
+        self.retry_after = waited
+
+
+class FairScheduler:
+    """Weighted fair queuing of upstream LLM calls.
+
+    Every request gets a virtual finish tag of max(virtual time, client's last tag) + cost / weight
+    and the free slots go to the lowest tags, so a client sending many requests queues behind
+    itself instead of ahead of everyone else.
+    """
+
+    def __init__(self, max_concurrency=MAX_UPSTREAM_CONCURRENCY, max_wait=MAX_QUEUE_WAIT, weights=None):
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.weights = CLIENT_WEIGHTS if weights is None else weights
+        self._cond = threading.Condition()
+        self._active = 0
+        self._virtual_time = 0.0
+        self._last_tag = {}
+        self._waiting = []
+        self._seq = itertools.count()
+
+    def acquire(self, client, cost=1.0):
+        weight = self.weights.get(client, 1.0)
+        started = time.monotonic()
+        with self._cond:
+            tag = max(self._virtual_time, self._last_tag.get(client, 0.0)) + cost / weight
+            self._last_tag[client] = tag
+            entry = (tag, next(self._seq), client)
+            heapq.heappush(self._waiting, entry)
+
+            while self._active >= self.max_concurrency or self._waiting[0] is not entry:
+                remaining = self.max_wait - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                    raise SchedulerTimeout(client, self.max_wait)
+                self._cond.wait(remaining)
+
+            heapq.heappop(self._waiting)
+            self._active += 1
+            self._virtual_time = max(self._virtual_time, tag)
+            # the next waiter may be able to take a free slot too
+            self._cond.notify_all()
+
+    def try_acquire(self, client, cost=1.0):
+        """Take a free slot without waiting, only when nobody is queued; returns whether one was taken"""
+        weight = self.weights.get(client, 1.0)
+        with self._cond:
+            if self._active >= self.max_concurrency or self._waiting:
+                return False
+            tag = max(self._virtual_time, self._last_tag.get(client, 0.0)) + cost / weight
+            self._last_tag[client] = tag
+            self._active += 1
+            self._virtual_time = max(self._virtual_time, tag)
+            return True
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            if len(self._last_tag) > 1024:
+                # tags at or below the virtual time carry no credit, same as a new client
+                self._last_tag = {c: t for c, t in self._last_tag.items() if t > self._virtual_time}
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, client, cost=1.0):
+        self.acquire(client, cost)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._cond:
+            return {"active": self._active, "waiting": len(self._waiting), "max_concurrency": self.max_concurrency}
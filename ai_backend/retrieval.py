@@ -0,0 +1,242 @@
+import os
+import re
+import json
+import mmap
+import math
+import struct
+import threading
+from array import array
+from collections import Counter, defaultdict
+
+# Knowledge sources: the token catalog (JSON) and web3/Clampify docs (markdown)
+KNOWLEDGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge")
+INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".rag_index")
+
+TOP_K = 3
+MAX_CHUNK_CHARS = 700
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+INDEX_VERSION = 1
+CHUNK_ENTRY = struct.Struct("<QII")  # offset, byte length, token count
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "how",
+    "i", "in", "is", "it", "its", "me", "my", "of", "on", "or", "so", "that", "the",
+    "their", "this", "to", "want", "what", "when", "which", "with", "you", "your",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def load_token_catalog():
+    """Return the list of tokens (name, symbol, description) the agent can trade"""
+    with open(os.path.join(KNOWLEDGE_DIR, "token_catalog.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _catalog_chunks(path):
+    with open(path, encoding="utf-8") as f:
+        tokens = json.load(f)
+
+    listing = "\n".join(f"- {t['name']} ({t['symbol']})" for t in tokens)
+    chunks = [{
+        "source": os.path.basename(path),
+        "title": "Meme coins available to buy and sell",
+        "text": "Meme coins (tokens) the user can buy or sell on Clampify:\n" + listing,
+    }]
+    for t in tokens:
+        chunks.append({
+            "source": os.path.basename(path),
+            "title": f"{t['name']} ({t['symbol']})",
+            "text": f"{t['name']} ({t['symbol']}) meme coin: {t['description']}",
+        })
+    return chunks
+
+
+def _markdown_chunks(path):
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+
+    chunks = []
+    for section in re.split(r"^#+\s*", content, flags=re.MULTILINE):
+        section = section.strip()
+        if not section:
+            continue
+        title, _, body = section.partition("\n")
+        buf = ""
+        for paragraph in body.split("\n\n"):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if buf and len(buf) + len(paragraph) > MAX_CHUNK_CHARS:
+                chunks.append({"source": os.path.basename(path), "title": title.strip(), "text": buf})
+                buf = ""
+            buf = f"{buf}\n{paragraph}" if buf else paragraph
+        if buf:
+            chunks.append({"source": os.path.basename(path), "title": title.strip(), "text": buf})
+    return chunks
+
+
+def collect_chunks(knowledge_dir=KNOWLEDGE_DIR):
+    chunks = []
+    for name in sorted(os.listdir(knowledge_dir)):
+        path = os.path.join(knowledge_dir, name)
+        if name.endswith(".json"):
+            chunks.extend(_catalog_chunks(path))
+        elif name.endswith(".md") or name.endswith(".txt"):
+            chunks.extend(_markdown_chunks(path))
+    return chunks
+
+
+def _sources_signature(knowledge_dir):
+    return {
+        name: os.path.getmtime(os.path.join(knowledge_dir, name))
+        for name in sorted(os.listdir(knowledge_dir))
+    }
+
+
+def build_index(knowledge_dir=KNOWLEDGE_DIR, index_dir=INDEX_DIR):
+    """Chunk the knowledge sources and write the chunk store and BM25 postings to index_dir.
+
+    Layout:
+        chunks.bin   - concatenated JSON-encoded chunks
+        chunks.idx   - CHUNK_ENTRY per chunk (offset, length, token count)
+        postings.ids - uint32 chunk ids, grouped by term
+        postings.tf  - uint32 term frequencies, parallel to postings.ids
+        meta.json    - term -> [postings offset, document frequency] plus corpus stats
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    chunks = collect_chunks(knowledge_dir)
+
+    postings = defaultdict(list)
+    total_len = 0
+    with open(os.path.join(index_dir, "chunks.bin"), "wb") as data, \
+            open(os.path.join(index_dir, "chunks.idx"), "wb") as idx:
+        offset = 0
+        for chunk_id, chunk in enumerate(chunks):
+            terms = tokenize(chunk["title"] + " " + chunk["text"])
+            for term, tf in Counter(terms).items():
+                postings[term].append((chunk_id, tf))
+            total_len += len(terms)
+
+            raw = json.dumps(chunk).encode("utf-8")
+            data.write(raw)
+            idx.write(CHUNK_ENTRY.pack(offset, len(raw), len(terms)))
+            offset += len(raw)
+
+    ids = array("I")
+    tfs = array("I")
+    vocabulary = {}
+    for term in sorted(postings):
+        vocabulary[term] = [len(ids), len(postings[term])]
+        for chunk_id, tf in postings[term]:
+            ids.append(chunk_id)
+            tfs.append(tf)
+
+    with open(os.path.join(index_dir, "postings.ids"), "wb") as f:
+        ids.tofile(f)
+    with open(os.path.join(index_dir, "postings.tf"), "wb") as f:
+        tfs.tofile(f)
+
+    meta = {
+        "version": INDEX_VERSION,
+        "sources": _sources_signature(knowledge_dir),
+        "num_chunks": len(chunks),
+        "avg_len": (total_len / len(chunks)) if chunks else 0.0,
+        "vocabulary": vocabulary,
+    }
+    # meta.json is written last so a partially built index is never picked up
+    with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    print(f"Built retrieval index with {len(chunks)} chunks and {len(vocabulary)} terms")
+    return meta
+
+
+def _map(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class RetrievalIndex:
+    """Read-only BM25 index over the memory-mapped chunk store"""
+
+    def __init__(self, index_dir=INDEX_DIR):
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.num_chunks = meta["num_chunks"]
+        self.avg_len = meta["avg_len"] or 1.0
+        self.vocabulary = meta["vocabulary"]
+
+        self._data = _map(os.path.join(index_dir, "chunks.bin"))
+        self._idx = _map(os.path.join(index_dir, "chunks.idx"))
+        self._ids = memoryview(_map(os.path.join(index_dir, "postings.ids"))).cast("B").cast("I")
+        self._tfs = memoryview(_map(os.path.join(index_dir, "postings.tf"))).cast("B").cast("I")
+
+    def _entry(self, chunk_id):
+        return CHUNK_ENTRY.unpack_from(self._idx, chunk_id * CHUNK_ENTRY.size)
+
+    def chunk(self, chunk_id):
+        offset, length, _ = self._entry(chunk_id)
+        return json.loads(bytes(self._data[offset:offset + length]).decode("utf-8"))
+
+    def search(self, query, top_k=TOP_K):
+        """Return up to top_k (score, chunk) pairs ranked by BM25"""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            if term not in self.vocabulary:
+                continue
+            start, df = self.vocabulary[term]
+            idf = math.log(1 + (self.num_chunks - df + 0.5) / (df + 0.5))
+            for chunk_id, tf in zip(self._ids[start:start + df], self._tfs[start:start + df]):
+                doc_len = self._entry(chunk_id)[2]
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_len / self.avg_len)
+                scores[chunk_id] += idf * tf * (BM25_K1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(score, self.chunk(chunk_id)) for chunk_id, score in ranked]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _index_is_stale(knowledge_dir, index_dir):
+    try:
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return True
+    return meta.get("version") != INDEX_VERSION or meta.get("sources") != _sources_signature(knowledge_dir)
+
+
+def get_index():
+    """Open the on-disk index, (re)building it first when the knowledge sources changed"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if _index_is_stale(KNOWLEDGE_DIR, INDEX_DIR):
+                    build_index(KNOWLEDGE_DIR, INDEX_DIR)
+                _index = RetrievalIndex(INDEX_DIR)
+    return _index
+
+
+def retrieve_context(query, top_k=TOP_K):
+    """Format the top_k chunks relevant to query as a prompt section, or "" when nothing matches"""
+    try:
+        results = get_index().search(query, top_k)
+    except Exception as e:
+        print(f"Retrieval failed: {e}")
+        return ""
+    if not results:
+        return ""
+
+    sections = [f"[{chunk['title']}]\n{chunk['text']}" for _, chunk in results]
+    return "Relevant knowledge for this message:\n\n" + "\n\n".join(sections)
@@ -0,0 +1,131 @@
+import math
+import time
+import threading
+from array import array
+
+# Rollup resolutions in seconds and how many buckets of each are kept per channel
+RESOLUTIONS = {1: 3600, 10: 4320, 60: 10080, 600: 4320}  # 1h of 1s, 12h of 10s, 1w of 1m, 30d of 10m
+RAW_SIZE = 8192
+
+
+class Rollup:
+    """Ring of fixed-width buckets stored column-wise (start, min, max, sum, count)"""
+
+    def __init__(self, resolution, size):
+        self.resolution = resolution
+        self.size = size
+        self.start = array('d', [math.nan]) * size
+        self.min = array('d', [0.0]) * size
+        self.max = array('d', [0.0]) * size
+        self.sum = array('d', [0.0]) * size
+        self.count = array('Q', [0]) * size
+
+    def _slot(self, bucket_start):
+        return int(bucket_start // self.resolution) % self.size
+
+    def add(self, timestamp, value):
+        bucket_start = timestamp - timestamp % self.resolution
+        i = self._slot(bucket_start)
+        if self.start[i] != bucket_start:
+            # a new bucket reuses the slot of the one a full ring ago
+            self.start[i] = bucket_start
+            self.min[i] = self.max[i] = self.sum[i] = value
+            self.count[i] = 1
+            return
+        if value < self.min[i]:
+            self.min[i] = value
+        if value > self.max[i]:
+            self.max[i] = value
+        self.sum[i] += value
+        self.count[i] += 1
+
+    def buckets(self, since, until):
+        """Yield (start, min, max, sum, count) for the buckets overlapping [since, until) in time order"""
+        bucket_start = max(since, until - self.size * self.resolution)
+        bucket_start -= bucket_start % self.resolution
+        while bucket_start < until:
+            i = self._slot(bucket_start)
+            if self.start[i] == bucket_start:
+                yield bucket_start, self.min[i], self.max[i], self.sum[i], self.count[i]
+            bucket_start += self.resolution
+
+
+class ChannelSeries:
+    def __init__(self, raw_size=RAW_SIZE, resolutions=RESOLUTIONS):
+        self.raw_size = raw_size
+        self.raw_time = array('d', [math.nan]) * raw_size
+        self.raw_value = array('d', [0.0]) * raw_size
+        self.raw_next = 0
+        self.rollups = {res: Rollup(res, size) for res, size in sorted(resolutions.items())}
+
+    def add(self, timestamp, value):
+        i = self.raw_next % self.raw_size
+        self.raw_time[i] = timestamp
+        self.raw_value[i] = value
+        self.raw_next += 1
+        for rollup in self.rollups.values():
+            rollup.add(timestamp, value)
+
+    def raw(self, since, until):
+        points = []
+        for n in range(max(0, self.raw_next - self.raw_size), self.raw_next):
+            i = n % self.raw_size
+            if since <= self.raw_time[i] < until:
+                points.append((self.raw_time[i], self.raw_value[i]))
+        return points
+
+    def rollup_for(self, resolution, span):
+        """Pick the rollup to answer from, None to use the raw samples.
+
+        Prefers the coarsest rollup that still covers the span and divides the requested
+        resolution, so windows are exact and as few buckets as possible are read.
+        """
+        finer = [r for res, r in self.rollups.items() if res <= resolution]
+        if not finer:
+            return None
+        covering = [r for r in finer if r.resolution * r.size >= span] or finer[-1:]
+        dividing = [r for r in covering if resolution % r.resolution == 0]
+        return (dividing or covering)[-1]
+
+
+class SensorStore:
+    """In-memory per-channel time series with min/max/mean rollups at several resolutions"""
+
+    def __init__(self, channels, raw_size=RAW_SIZE, resolutions=RESOLUTIONS):
+        self._lock = threading.Lock()
+        self.series = {channel: ChannelSeries(raw_size, resolutions) for channel in channels}
+
+    def add(self, channel, timestamp, value):
+        with self._lock:
+            self.series[channel].add(timestamp, value)
+
+    def aggregate(self, channel, resolution, since, until=None):
+        """Return one {t, min, max, mean, count} window per `resolution` seconds in [since, until)"""
+        if channel not in self.series:
+            raise KeyError(channel)
+        until = time.time() if until is None else until
+        series = self.series[channel]
+
+        windows = {}
+        with self._lock:
+            rollup = series.rollup_for(resolution, until - since)
+            if rollup is None:
+                source = ((t, v, v, v, 1) for t, v in series.raw(since, until))
+            else:
+                source = list(rollup.buckets(since, until))
+
+            for start, lo, hi, total, count in source:
+                window = start - start % resolution
+                w = windows.get(window)
+                if w is None:
+                    windows[window] = [lo, hi, total, count]
+                else:
+                    w[0] = min(w[0], lo)
+                    w[1] = max(w[1], hi)
+                    w[2] += total
+                    w[3] += count
+
+        return [
+            {"t": window, "min": lo, "max": hi, "mean": total / count, "count": count}
+            for window, (lo, hi, total, count) in sorted(windows.items())
+        ]
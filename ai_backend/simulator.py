@@ -0,0 +1,200 @@
+import math
+
+import numpy as np
+
+# ClampifyToken bonding curve constants (token units, not wei)
+STEP_SIZE = 10_000
+PRICE_INCREASE_PERCENT = 5
+# ClampifyFactory.tradingFeePercent default
+TRADING_FEE_PERCENT = 2
+# ClampifyDEX.getAmountOut keeps 0.3% of the input
+DEX_FEE_NUMERATOR, DEX_FEE_DENOMINATOR = 997, 1000
+
+DEFAULT_INITIAL_PRICE = 0.0001  # ETH per token
+DEFAULT_MAX_SUPPLY = 1_000_000
+MAX_SCENARIOS = 20_000
+MAX_TRADES = 1_000
+MAX_CELLS = 200_000    # scenarios * trades per run_tool call, so a chat turn never runs a huge simulation
+MIN_SCENARIOS = 100    # enough random orderings for the percentiles to mean something
+
+
+def calculate_trading_fee(amount, fee_percent=TRADING_FEE_PERCENT):
+    """ClampifyFactory.calculateTradingFee"""
+    return amount * fee_percent / 100
+
+
+def step_price(supply, initial_price):
+    """Price of the step `supply` falls in, like ClampifyToken.updatePrice"""
+    step = np.floor_divide(supply, STEP_SIZE)
+    return initial_price * (100 + step * PRICE_INCREASE_PERCENT) / 100
+
+
+def curve_cost(supply, initial_price):
+    """ETH needed to mint `supply` tokens from zero along the step curve (closed form of the per-step loop)"""
+    supply = np.asarray(supply, dtype=np.float64)
+    steps = np.floor_divide(supply, STEP_SIZE)
+    rest = supply - steps * STEP_SIZE
+    full = STEP_SIZE * (steps + PRICE_INCREASE_PERCENT / 100 * steps * (steps - 1) / 2)
+    return initial_price * (full + rest * (1 + PRICE_INCREASE_PERCENT / 100 * steps))
+
+
+def _supply_for_cost(cost, initial_price):
+    """Inverse of curve_cost"""
+    k = PRICE_INCREASE_PERCENT / 100
+    units = cost / (initial_price * STEP_SIZE)
+    # full steps n solve k/2 n^2 + (1 - k/2) n = units; nudge for float error at step boundaries
+    steps = np.floor((-(1 - k / 2) + np.sqrt((1 - k / 2) ** 2 + 2 * k * units)) / k)
+    steps = np.maximum(steps, 0)
+    steps -= curve_cost(steps * STEP_SIZE, initial_price) > cost
+    steps += curve_cost((steps + 1) * STEP_SIZE, initial_price) <= cost
+    rest = (cost - curve_cost(steps * STEP_SIZE, initial_price)) / (initial_price * (1 + k * steps))
+    return steps * STEP_SIZE + np.clip(rest, 0, STEP_SIZE)
+
+
+def purchase_return(supply, eth_amount, initial_price, max_supply=DEFAULT_MAX_SUPPLY):
+    """ClampifyToken.calculatePurchaseReturn: tokens minted for eth_amount, capped at max supply"""
+    new_supply = _supply_for_cost(curve_cost(supply, initial_price) + eth_amount, initial_price)
+    return np.minimum(new_supply, max_supply) - supply
+
+
+def purchase_price(supply, token_amount, initial_price):
+    """ClampifyToken.calculatePurchasePrice: ETH to mint token_amount"""
+    return curve_cost(supply + token_amount, initial_price) - curve_cost(supply, initial_price)
+
+
+def sale_return(supply, token_amount, initial_price, fee_percent=TRADING_FEE_PERCENT):
+    """ClampifyToken.calculateSaleReturn and the fee sellTokens takes: (net ETH to seller, fee)"""
+    gross = curve_cost(supply, initial_price) - curve_cost(supply - token_amount, initial_price)
+    fee = calculate_trading_fee(gross, fee_percent)
+    return gross - fee, fee
+
+
+def get_amount_out(amount_in, reserve_in, reserve_out):
+    """ClampifyDEX.getAmountOut"""
+    amount_in_with_fee = amount_in * DEX_FEE_NUMERATOR
+    return amount_in_with_fee * reserve_out / (reserve_in * DEX_FEE_DENOMINATOR + amount_in_with_fee)
+
+
+def simulate_curve(trades, initial_supply=0.0, initial_price=DEFAULT_INITIAL_PRICE,
+                   max_supply=DEFAULT_MAX_SUPPLY, fee_percent=TRADING_FEE_PERCENT):
+    """Run trade sequences against the bonding curve, one scenario per row.
+
+    trades: (scenarios, trades) array, positive values are ETH spent on buyTokensWithEth,
+    negative values are tokens passed to sellTokens. Sells are capped at what the simulated
+    traders hold, so the creator's initial supply is never sold.
+    """
+    trades = np.atleast_2d(np.asarray(trades, dtype=np.float64))
+    scenarios, steps = trades.shape
+    supply = np.full(scenarios, float(initial_supply))
+    held = np.zeros(scenarios)
+    reserve = np.zeros(scenarios)
+    fees = np.zeros(scenarios)
+    prices = np.empty((scenarios, steps + 1))
+    prices[:, 0] = step_price(supply, initial_price)
+
+    for i in range(steps):
+        amount = trades[:, i]
+        buying = amount > 0
+        minted = np.where(buying, purchase_return(supply, np.where(buying, amount, 0), initial_price, max_supply), 0)
+        sold = np.where(buying, 0, np.minimum(-amount, held))
+        net, fee = sale_return(supply, sold, initial_price, fee_percent)
+
+        supply += minted - sold
+        held += minted - sold
+        reserve += np.where(buying, amount, 0) - (net + fee)
+        fees += fee
+        prices[:, i + 1] = step_price(supply, initial_price)
+
+    return {"prices": prices, "supply": supply, "reserve": reserve, "fees": fees}
+
+
+def simulate_pool(trades, token_reserve, eth_reserve):
+    """Run trade sequences against a ClampifyDEX pool, one scenario per row.
+
+    trades: positive values are ETH in (swapETHForTokens), negative values tokens in (swapTokensForETH).
+    """
+    trades = np.atleast_2d(np.asarray(trades, dtype=np.float64))
+    scenarios, steps = trades.shape
+    tokens = np.full(scenarios, float(token_reserve))
+    eth = np.full(scenarios, float(eth_reserve))
+    prices = np.empty((scenarios, steps + 1))
+    prices[:, 0] = eth / tokens
+
+    for i in range(steps):
+        amount = trades[:, i]
+        buying = amount > 0
+        eth_in = np.where(buying, amount, 0)
+        tokens_in = np.where(buying, 0, -amount)
+        tokens_out = np.where(buying, get_amount_out(eth_in, eth, tokens), 0)
+        eth_out = np.where(buying, 0, get_amount_out(tokens_in, tokens, eth))
+
+        tokens += tokens_in - tokens_out
+        eth += eth_in - eth_out
+        prices[:, i + 1] = eth / tokens
+
+    return {"prices": prices, "token_reserve": tokens, "eth_reserve": eth}
+
+
+def random_trades(scenarios, trades, buy_probability=0.6, mean_eth=0.05, mean_tokens=500.0, seed=None):
+    """Monte Carlo trade sequences in the simulate_curve convention, lognormal trade sizes"""
+    rng = np.random.default_rng(seed)
+    buys = rng.random((scenarios, trades)) < buy_probability
+    eth = rng.lognormal(np.log(mean_eth), 0.75, (scenarios, trades))
+    tokens = rng.lognormal(np.log(mean_tokens), 0.75, (scenarios, trades))
+    return np.where(buys, eth, -tokens)
+
+
+def summarize(prices):
+    """Distribution of the final price and the max drawdown over the scenarios"""
+    start, final = prices[:, 0], prices[:, -1]
+    change = (final / start - 1) * 100
+    peak = np.maximum.accumulate(prices, axis=1)
+    drawdown = ((peak - prices) / peak).max(axis=1) * 100
+    p5, p50, p95 = np.percentile(final, [5, 50, 95])
+    return {
+        "start_price": float(start.mean()),
+        "final_price_p5": float(p5),
+        "final_price_median": float(p50),
+        "final_price_p95": float(p95),
+        "price_change_pct_median": float(np.median(change)),
+        "max_drawdown_pct_median": float(np.median(drawdown)),
+    }
+
+
+def run_tool(buyers, eth_per_buyer, sellers=0, scenarios=1000, initial_price=DEFAULT_INITIAL_PRICE,
+             initial_supply=0.0, seed=None):
+    """What-if for the agent: `buyers` buys of about eth_per_buyer ETH and `sellers` sells in random order.
+
+    Returns a short plain-text summary the LLM can explain to the user.
+    """
+    buyers, sellers = int(buyers), int(sellers)
+    if buyers < 0 or sellers < 0 or buyers + sellers == 0 or buyers + sellers > MAX_TRADES:
+        raise ValueError(f"buyers + sellers must be between 1 and {MAX_TRADES}")
+    eth_per_buyer, initial_price = float(eth_per_buyer), float(initial_price)
+    if not (math.isfinite(eth_per_buyer) and eth_per_buyer > 0):
+        raise ValueError("ETH per buyer must be a positive number")
+    if not (math.isfinite(initial_price) and initial_price > 0):
+        raise ValueError("the initial price must be a positive number")
+
+    rng = np.random.default_rng(seed)
+    n = buyers + sellers
+    # fewer orderings for longer trade sequences, the cost is scenarios * trades
+    scenarios = min(int(scenarios), MAX_SCENARIOS, max(MIN_SCENARIOS, MAX_CELLS // n))
+    buy_sizes = rng.lognormal(np.log(eth_per_buyer), 0.5, (scenarios, buyers))
+    # sellers dump roughly what a buyer would have bought at the starting price
+    sell_sizes = -rng.lognormal(np.log(eth_per_buyer / initial_price), 0.5, (scenarios, sellers))
+    trades = np.concatenate([buy_sizes, sell_sizes], axis=1)
+    order = np.argsort(rng.random((scenarios, n)), axis=1)
+    trades = np.take_along_axis(trades, order, axis=1)
+
+    result = simulate_curve(trades, initial_supply=initial_supply, initial_price=initial_price)
+    stats = summarize(result["prices"])
+    return (
+        f"Bonding curve simulation ({scenarios} random orderings of {buyers} buys of ~{eth_per_buyer} ETH "
+        f"and {sellers} sells, starting at {stats['start_price']:.8g} ETH per token): "
+        f"median final price {stats['final_price_median']:.8g} ETH "
+        f"({stats['price_change_pct_median']:+.1f}%), 90% range {stats['final_price_p5']:.8g} - "
+        f"{stats['final_price_p95']:.8g} ETH, median max drawdown {stats['max_drawdown_pct_median']:.1f}%, "
+        f"median supply {np.median(result['supply']):,.0f} tokens, median fees paid "
+        f"{np.median(result['fees']):.6g} ETH."
+    )
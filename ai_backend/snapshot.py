@@ -0,0 +1,302 @@
+import bisect
+import threading
+import time
+
+from chain import Contract, JsonRpcClient, RpcError, FACTORY_ADDRESS, DEX_ADDRESS
+
+REFRESH_INTERVAL = 30  # seconds between event polls; a lookup that finds stale entries wakes the poller early
+MAX_BACKOFF = 300      # seconds between attempts while the node keeps failing
+LOADING_RETRY_AFTER = 5
+MAX_CONTEXT_TOKENS = 3
+WEI = 10**18
+
+TOKEN_CALLS = ("name", "symbol", "totalSupply", "getTokenStatistics")
+
+
+class SnapshotLoading(Exception):
+    """The first load has not finished, lookups can't be answered yet"""
+
+    def __init__(self, retry_after=LOADING_RETRY_AFTER):
+        super().__init__("Token data is still loading")
+        self.retry_after = retry_after
+
+
+class TokenSnapshot:
+    """Cached view of the Clampify token catalog and DEX pools.
+
+    Everything is fetched with JSON-RPC batches (one batch for the whole catalog, not one call per
+    token) and kept in memory. TokenCreated, TokensPurchased, TokensSold, LiquidityAdded,
+    LiquidityRemoved and TokenSwap events only mark the affected entries stale; they are refetched
+    together by the background refresh. Lookups only read the cache: until the first load is done they
+    raise SnapshotLoading, afterwards they serve what is cached and wake the refresh for stale entries.
+    """
+
+    def __init__(self, rpc=None, factory_address=FACTORY_ADDRESS, dex_address=DEX_ADDRESS):
+        self.rpc = rpc or JsonRpcClient()
+        self.factory = Contract("ClampifyFactory", factory_address)
+        self.token_abi = Contract("ClampifyToken")
+        self.dex = Contract("ClampifyDEX", dex_address) if dex_address else None
+
+        self._lock = threading.RLock()
+        self.tokens = {}        # address -> token dict
+        self.pools = {}         # token address -> pool dict
+        self._by_symbol = {}    # lowercase symbol -> address
+        self._by_name = {}      # lowercase name -> address
+        self._prefixes = []     # sorted (lowercase name or symbol, address) for prefix search
+        self._stale_tokens = set()
+        self._stale_pools = set()
+        self._last_block = None
+        self._loaded = False
+        self._wake = threading.Event()
+
+    # --- fetching ---
+
+    def _fetch_tokens(self, addresses):
+        calls = []
+        for address in addresses:
+            calls += [("eth_call", [{"to": address, "data": self.token_abi.encode_call(fn)}, "latest"])
+                      for fn in TOKEN_CALLS]
+            calls.append(("eth_call", [{"to": self.factory.address,
+                                        "data": self.factory.encode_call("getTokenInfo", address)}, "latest"]))
+        results = self.rpc.batch(calls)
+
+        per_token = len(TOKEN_CALLS) + 1
+        fetched = {}
+        for i, address in enumerate(addresses):
+            name, symbol, supply, stats, info = results[i * per_token:(i + 1) * per_token]
+            price, market_cap, volume, ath, atl = self.token_abi.decode_result("getTokenStatistics", stats)
+            creator, created_at, lockup, liquidity_locked, unlock_time = self.factory.decode_result("getTokenInfo", info)
+            fetched[address] = {
+                "address": address,
+                "name": self.token_abi.decode_result("name", name)[0],
+                "symbol": self.token_abi.decode_result("symbol", symbol)[0],
+                "total_supply": self.token_abi.decode_result("totalSupply", supply)[0] / WEI,
+                "price": price / WEI,
+                "market_cap": market_cap / WEI,
+                "volume": volume / WEI,
+                "ath": ath / WEI,
+                "atl": atl / WEI,
+                "creator": creator,
+                "created_at": created_at,
+                "lockup_period": lockup,
+                "liquidity_locked": liquidity_locked,
+                "liquidity_unlock_time": unlock_time,
+            }
+        return fetched
+
+    def _fetch_pools(self, addresses):
+        results = self.rpc.batch([
+            ("eth_call", [{"to": self.dex.address, "data": self.dex.encode_call("getPoolData", address)}, "latest"])
+            for address in addresses
+        ])
+        fetched = {}
+        for address, result in zip(addresses, results):
+            token_reserve, eth_reserve, liquidity, updated, lock_period = self.dex.decode_result("getPoolData", result)
+            fetched[address] = {
+                "token_reserve": token_reserve / WEI,
+                "eth_reserve": eth_reserve / WEI,
+                "liquidity_tokens": liquidity / WEI,
+                "price": (eth_reserve / token_reserve) if token_reserve else 0.0,
+                "last_update": updated,
+                "liquidity_lock_period": lock_period,
+            }
+        return fetched
+
+    def load(self):
+        """Full reload: every token and pool in a handful of batched requests"""
+        calls = [("eth_blockNumber", []),
+                 ("eth_call", [{"to": self.factory.address, "data": self.factory.encode_call("getAllTokens")}, "latest"])]
+        if self.dex is not None:
+            calls.append(("eth_call", [{"to": self.dex.address, "data": self.dex.encode_call("getActivePools")}, "latest"]))
+        results = self.rpc.batch(calls)
+
+        addresses = [a.lower() for a in self.factory.decode_result("getAllTokens", results[1])[0]]
+        pool_addresses = [a.lower() for a in self.dex.decode_result("getActivePools", results[2])[0]] if self.dex else []
+        tokens = self._fetch_tokens(addresses) if addresses else {}
+        pools = self._fetch_pools(pool_addresses) if pool_addresses else {}
+
+        with self._lock:
+            self.tokens = tokens
+            self.pools = pools
+            self._stale_tokens.clear()
+            self._stale_pools.clear()
+            self._last_block = int(results[0], 16)
+            self._reindex()
+            self._loaded = True
+
+    def _reindex(self):
+        self._by_symbol = {t["symbol"].lower(): a for a, t in self.tokens.items()}
+        self._by_name = {t["name"].lower(): a for a, t in self.tokens.items()}
+        self._prefixes = sorted(
+            [(t["symbol"].lower(), a) for a, t in self.tokens.items()]
+            + [(t["name"].lower(), a) for a, t in self.tokens.items()]
+        )
+
+    # --- invalidation ---
+
+    def poll_events(self):
+        """Mark entries touched since the last poll as stale"""
+        with self._lock:
+            if not self._loaded:
+                self.load()
+                return
+            from_block = self._last_block + 1
+        head = self.rpc.block_number()
+        if head < from_block:
+            return
+
+        factory_logs = self.rpc.get_logs([self.factory.address], [[self.factory.topic("TokenCreated")]],
+                                         from_block, head)
+        with self._lock:
+            known = list(self.tokens)
+        # bonding curve trades change price, supply and volume without touching the factory or the DEX
+        trade_logs = self.rpc.get_logs(
+            known, [[self.token_abi.topic(name) for name in ("TokensPurchased", "TokensSold")]], from_block, head
+        ) if known else []
+        dex_logs = []
+        if self.dex is not None:
+            topics = [[self.dex.topic(name) for name in ("PoolCreated", "LiquidityAdded", "LiquidityRemoved", "TokenSwap")]]
+            dex_logs = self.rpc.get_logs([self.dex.address], topics, from_block, head)
+
+        with self._lock:
+            for log in factory_logs:
+                self._stale_tokens.add(self.factory.decode_log(log)["args"]["tokenAddress"])
+            for log in trade_logs:
+                self._stale_tokens.add(log["address"].lower())
+            for log in dex_logs:
+                event = self.dex.decode_log(log)
+                token = event["args"]["tokenAddress"]
+                self._stale_pools.add(token)
+                if event["event"] == "TokenSwap" and token in self.tokens:
+                    # swaps move the token's price and volume as well
+                    self._stale_tokens.add(token)
+            self._last_block = head
+
+    def _refresh_stale(self):
+        with self._lock:
+            stale_tokens, self._stale_tokens = sorted(self._stale_tokens), set()
+            stale_pools, self._stale_pools = sorted(self._stale_pools), set()
+        if not stale_tokens and not stale_pools:
+            return
+        try:
+            tokens = self._fetch_tokens(stale_tokens) if stale_tokens else {}
+            pools = self._fetch_pools(stale_pools) if stale_pools and self.dex else {}
+        except (RpcError, OSError, ValueError):
+            with self._lock:
+                self._stale_tokens.update(stale_tokens)
+                self._stale_pools.update(stale_pools)
+            raise
+        with self._lock:
+            self.tokens.update(tokens)
+            self.pools.update(pools)
+            if tokens:
+                self._reindex()
+
+    def refresh(self):
+        self.poll_events()
+        self._refresh_stale()
+
+    def _ensure_fresh(self):
+        """Raise SnapshotLoading before the first load, otherwise have the refresh thread pick up stale entries"""
+        if not self._loaded:
+            self._wake.set()
+            raise SnapshotLoading()
+        if self._stale_tokens or self._stale_pools:
+            self._wake.set()
+
+    # --- lookups ---
+
+    def get(self, query):
+        """Token (with its pool, if any) by address, symbol or exact name in O(1), None if unknown"""
+        self._ensure_fresh()
+        key = query.strip().lower()
+        with self._lock:
+            address = key if key in self.tokens else self._by_symbol.get(key.lstrip("$")) or self._by_name.get(key)
+            if address is None:
+                return None
+            return dict(self.tokens[address], pool=self.pools.get(address))
+
+    def search(self, prefix, limit=10):
+        """Tokens whose name or symbol starts with prefix"""
+        self._ensure_fresh()
+        prefix = prefix.strip().lower().lstrip("$")
+        if not prefix:
+            return []
+        with self._lock:
+            results, seen = [], set()
+            i = bisect.bisect_left(self._prefixes, (prefix, ""))
+            while i < len(self._prefixes) and self._prefixes[i][0].startswith(prefix) and len(results) < limit:
+                address = self._prefixes[i][1]
+                if address not in seen:
+                    seen.add(address)
+                    results.append(dict(self.tokens[address], pool=self.pools.get(address)))
+                i += 1
+            return results
+
+    def mentioned(self, text):
+        """Addresses of the cached tokens text refers to by address, name or symbol"""
+        with self._lock:
+            words = [w.strip(".,!?;:'\"()") for w in text.lower().replace("$", " ").split()]
+            mentioned = list(dict.fromkeys(w for w in words if w in self.tokens))
+            # names can be several words long, symbols are one
+            for n in (3, 2, 1):
+                for i in range(len(words) - n + 1):
+                    phrase = " ".join(words[i:i + n])
+                    address = self._by_name.get(phrase) or (self._by_symbol.get(phrase) if n == 1 else None)
+                    if address and address not in mentioned:
+                        mentioned.append(address)
+            return mentioned
+
+    def context_for(self, text):
+        """Prompt section with live data for the Clampify tokens mentioned in text, "" if none are.
+
+        Only reads the cache, so a slow or unreachable node never delays a chat turn.
+        """
+        mentioned = self.mentioned(text)
+        with self._lock:
+            lines = []
+            for address in mentioned[:MAX_CONTEXT_TOKENS]:
+                t = self.tokens[address]
+                line = (f"- {t['name']} ({t['symbol']}) at {address}: price {t['price']:.8g} ETH, "
+                        f"market cap {t['market_cap']:.6g} ETH, supply {t['total_supply']:,.0f}, "
+                        f"volume {t['volume']:,.0f} tokens, liquidity locked: {'yes' if t['liquidity_locked'] else 'no'}")
+                pool = self.pools.get(address)
+                if pool:
+                    line += (f", DEX pool {pool['token_reserve']:,.0f} tokens / {pool['eth_reserve']:.6g} ETH "
+                             f"(price {pool['price']:.8g} ETH)")
+                lines.append(line)
+        if not lines:
+            return ""
+        return "Live Clampify token data:\n" + "\n".join(lines)
+
+    def start(self, interval=REFRESH_INTERVAL, max_backoff=MAX_BACKOFF):
+        """Poll for invalidating events in a background thread, backing off while the node fails"""
+        def run():
+            delay = interval
+            while True:
+                self._wake.clear()
+                try:
+                    self.refresh()
+                    delay = interval
+                except Exception as e:
+                    # lookups keep serving the cached data meanwhile
+                    delay = min(delay * 2, max_backoff)
+                    print(f"Token snapshot refresh failed, retrying in {delay}s: {e}")
+                    time.sleep(delay)
+                    continue
+                self._wake.wait(delay)
+
+        threading.Thread(target=run, name="token-snapshot", daemon=True).start()
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None:
+            _snapshot = TokenSnapshot()
+            _snapshot.start()
+        return _snapshot
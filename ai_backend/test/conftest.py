@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the backend modules import each other as top-level modules, the way app.py is run
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# manual scripts against live services, not tests
+collect_ignore = ["meta_test.py"]
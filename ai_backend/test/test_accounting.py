@@ -0,0 +1,44 @@
+import pytest
+
+import accounting
+from accounting import AccountingUnavailable, UsageRecord, UsageWriter
+
+
+def record(conversation_id, fee):
+    usage = UsageRecord(conversation_id, "blockchain-advisor", "nillion")
+    usage.fee, usage.calls = fee, 1
+    return usage
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    path = str(tmp_path / "accounting.db")
+    monkeypatch.setattr(accounting, "ACCOUNTING_DB", path)
+    writer = UsageWriter(path, flush_interval=0.01)
+    monkeypatch.setattr(accounting, "writer", writer)
+    return writer
+
+
+def test_usage_is_aggregated_per_conversation(writer):
+    for conversation_id, fee in (("a", 1.0), ("a", 2.0), ("b", 0.5)):
+        writer.submit(record(conversation_id, fee))
+
+    rows = accounting.usage_by("conversation_id", "fee")
+    assert [(r["key"], r["requests"], r["fee"]) for r in rows] == [("a", 2, 3.0), ("b", 1, 0.5)]
+    assert len(accounting.conversation_usage("a")) == 2
+    with pytest.raises(ValueError):
+        accounting.usage_by("model")
+
+
+def test_writer_survives_a_database_it_cannot_open(tmp_path):
+    writer = UsageWriter(str(tmp_path / "missing" / "accounting.db"), flush_interval=0.01)
+    writer.submit(record("a", 1.0))
+    assert writer.flush(timeout=2)
+    assert writer._thread.is_alive()
+
+
+def test_queries_report_an_unreadable_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(accounting, "ACCOUNTING_DB", str(tmp_path / "missing" / "accounting.db"))
+    monkeypatch.setattr(accounting, "writer", UsageWriter(flush_interval=0.01))
+    with pytest.raises(AccountingUnavailable):
+        accounting.conversation_usage("a")
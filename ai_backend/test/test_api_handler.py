@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+import requests
+
+from api_handler import CreateTokenClient
+
+
+class Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+        self.text = str(body)
+
+    def json(self):
+        if self.body is None:
+            raise ValueError("no JSON")
+        return self.body
+
+
+class Session:
+    """Replays one outcome per POST: a Response or an exception to raise"""
+
+    def __init__(self, *outcomes, gate=None):
+        self.outcomes = list(outcomes)
+        self.posts = []
+        self.gate = gate
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        self.posts.append((json, headers))
+        if self.gate is not None:
+            self.gate.wait(5)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def client(*outcomes, **kwargs):
+    session = Session(*outcomes, **kwargs)
+    return CreateTokenClient(url="http://create", session=session), session
+
+
+def test_same_key_launches_once():
+    api, session = client(Response(200, {"success": True, "token": "0x1"}))
+    first = api.create("Moon Dog", "MDOG", 1000, idempotency_key="k")
+    assert api.create("Moon Dog", "MDOG", 1000, idempotency_key="k") is first
+    assert len(session.posts) == 1
+    assert session.posts[0][1] == {"Idempotency-Key": "k"}
+
+
+def test_concurrent_callers_share_the_request():
+    gate = threading.Event()
+    api, session = client(Response(200, {"success": True}), gate=gate)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(api.create("A", "A", 1, idempotency_key="k")))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(session.posts) == 1 and len(results) == 3
+
+
+@pytest.mark.parametrize("outcome", [
+    requests.ReadTimeout("read timed out"),
+    Response(502, "bad gateway"),
+    Response(200, None),
+])
+def test_unknown_outcomes_are_kept(outcome):
+    api, session = client(outcome, Response(200, {"success": True}))
+    result = api.create("A", "A", 1, idempotency_key="k")
+    assert result["success"] is False and result["unknown"] is True
+    # the token may exist, a retry must not launch a second one
+    assert api.create("A", "A", 1, idempotency_key="k") is result
+    assert len(session.posts) == 1
+
+
+@pytest.mark.parametrize("outcome", [
+    requests.ConnectTimeout("connect timed out"),
+    Response(400, "bad symbol"),
+])
+def test_rejected_launches_can_be_retried(outcome):
+    api, session = client(outcome, Response(200, {"success": True}))
+    assert api.create("A", "A", 1, idempotency_key="k")["success"] is False
+    assert api.create("A", "A", 1, idempotency_key="k") == {"success": True}
+    assert len(session.posts) == 2
+
+
+def test_waiters_are_released_when_the_request_raises():
+    api, _ = client(RuntimeError("bug"))
+    with pytest.raises(RuntimeError):
+        api.create("A", "A", 1, idempotency_key="k")
+    assert api.create("A", "A", 1, idempotency_key="k")["unknown"] is True
+
+
+def test_only_whitelisted_parameters_can_be_overridden():
+    api, _ = client()
+    assert api.payload("A", "A", 1, initialPrice="2")["initialPrice"] == "2"
+    with pytest.raises(ValueError):
+        api.payload("A", "A", 1, userAddress="0xattacker")
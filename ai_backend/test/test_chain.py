@@ -0,0 +1,74 @@
+import pytest
+
+from chain import Contract, LocalJsonRpc, RpcError, MAX_BATCH_SIZE, encode_abi, decode_abi, keccak256
+
+TOKEN = "0x" + "70" * 20
+BUYER = "0x" + "b0" * 20
+
+
+@pytest.mark.parametrize("data, digest", [
+    (b"", "c5d2460186f7233c927e7db2dcc703c0e500b653ca82273b7bfad8045d85a470"),
+    ("abc", "4e03657aea45a94fc7d47ba826c8d667c0d1e6e33a64a036ec44f58fa12d6c45"),
+    ("Transfer(address,address,uint256)", "ddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"),
+])
+def test_keccak256_matches_ethereum(data, digest):
+    assert keccak256(data).hex() == digest
+
+
+def test_keccak256_absorbs_every_block():
+    # 135 bytes pad within one block, 136 need a second one
+    assert len({keccak256(b"a" * n) for n in (134, 135, 136, 137, 272)}) == 5
+
+
+def test_abi_round_trip_with_dynamic_values():
+    types = ["address", "uint256", "int256", "bool", "string", "address[]", "bytes"]
+    values = (BUYER, 10**24, -5, True, "Moon Dog 🐶", [TOKEN, BUYER], b"\x01\x02")
+    encoded = encode_abi(types, values)
+    assert len(encoded) % 32 == 0
+    assert decode_abi(types, encoded) == values
+
+
+def test_encode_call_starts_with_the_selector():
+    token = Contract("ClampifyToken", TOKEN)
+    assert token.encode_call("name") == token.selector("name")
+    assert len(token.selector("name")) == 10
+
+
+def test_event_log_round_trip():
+    token = Contract("ClampifyToken", TOKEN)
+    log = token.encode_log("TokensPurchased", 7, log_index=2, buyer=BUYER, amountPaid=3, tokensMinted=30, price=1)
+    event = token.decode_log(log)
+    assert event["event"] == "TokensPurchased"
+    assert (event["address"], event["block"], event["log_index"]) == (TOKEN, 7, 2)
+    assert event["args"] == {"buyer": BUYER, "amountPaid": 3, "tokensMinted": 30, "price": 1}
+    assert Contract("ClampifyFactory").decode_log(log) is None
+
+
+def test_local_rpc_filters_logs_by_address_topic_and_range():
+    rpc = LocalJsonRpc()
+    token, other = Contract("ClampifyToken", TOKEN), Contract("ClampifyToken", BUYER)
+    for block in (1, 5, 9):
+        rpc.add_log(token.encode_log("TokensSold", block, seller=BUYER, amountReceived=1, tokensBurned=1, price=1))
+    rpc.add_log(other.encode_log("TokensSold", 5, seller=BUYER, amountReceived=1, tokensBurned=1, price=1))
+    rpc.add_log(token.encode_log("TokensPurchased", 5, log_index=1, buyer=BUYER, amountPaid=1,
+                                 tokensMinted=1, price=1))
+
+    logs = rpc.get_logs([TOKEN], [[token.topic("TokensSold")]], 2, 9, block_range=3)
+    assert [int(log["blockNumber"], 16) for log in logs] == [5, 9]
+    assert rpc.block_number() == 9
+
+
+def test_local_rpc_batches_block_lookups():
+    rpc = LocalJsonRpc(block_time=2, genesis_timestamp=1000)
+    timestamps = rpc.block_timestamps(range(MAX_BATCH_SIZE + 1))
+    assert timestamps[10] == 1020
+    assert rpc.requests_served == 2
+
+
+def test_local_rpc_eth_call_handlers():
+    rpc = LocalJsonRpc()
+    token = Contract("ClampifyToken", TOKEN)
+    rpc.on_call(TOKEN, token.selector("symbol"), lambda data: "0x" + encode_abi(["string"], ["PEPE"]).hex())
+    assert token.decode_result("symbol", rpc.eth_call(TOKEN, token.encode_call("symbol"))) == ("PEPE",)
+    with pytest.raises(RpcError):
+        rpc.eth_call(TOKEN, token.encode_call("name"))
@@ -0,0 +1,97 @@
+import gzip
+import zlib
+
+import brotli
+import pytest
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request, Response
+
+import compression
+from compression import MIN_SIZE, choose_encoding, compress, compress_stream, negotiate
+
+BODY = b'{"tokens": [' + b'{"symbol": "MDOG", "price": "0.0001"}, ' * 40 + b'{}]}'
+
+
+def get(headers=None, method="GET"):
+    return Request(EnvironBuilder(method=method, headers=headers or {}).get_environ())
+
+
+def served(request, response):
+    """Status, headers and body as the WSGI server sends them"""
+    sent = []
+    body = b"".join(response(request.environ, lambda status, headers: sent.append((status, dict(headers)))))
+    return sent[0] + (body,)
+
+
+@pytest.mark.parametrize("header, encoding", [
+    ("gzip, deflate, br", "br"),
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("*", "br"),
+    ("*;q=0", None),
+    ("gzip;q=nonsense", None),
+    ("identity", None),
+    (None, None),
+])
+def test_choose_encoding(header, encoding):
+    assert choose_encoding(header) == encoding
+
+
+def test_gzip_is_chosen_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("br, gzip") == "gzip"
+    assert choose_encoding("br") is None
+
+
+def test_compress_round_trips():
+    assert gzip.decompress(compress(BODY, "gzip")) == BODY
+    assert brotli.decompress(compress(BODY, "br")) == BODY
+    assert compress(BODY, None) is BODY
+
+
+@pytest.mark.parametrize("encoding, decompressor", [
+    ("gzip", lambda: zlib.decompressobj(compression.GZIP_WBITS)),
+    ("br", brotli.Decompressor),
+])
+def test_every_stream_chunk_decodes_on_arrival(encoding, decompressor):
+    chunks = ["data: 1\n\n", b"data: 2\n\n", "", "data: 3\n\n"]
+    decoder = decompressor()
+    decode = decoder.decompress if encoding == "gzip" else decoder.process
+    pieces = list(compress_stream(chunks, encoding))
+    # nothing is held back in the compressor between frames
+    assert [decode(piece) for piece in pieces[:-1]] == [b"data: 1\n\n", b"data: 2\n\n", b"data: 3\n\n"]
+    decode(pieces[-1])
+
+
+def test_large_bodies_are_compressed():
+    response = negotiate(get({"Accept-Encoding": "gzip"}), Response(BODY))
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.vary
+    assert gzip.decompress(response.get_data()) == BODY
+
+
+def test_small_and_error_bodies_are_left_alone():
+    small = negotiate(get({"Accept-Encoding": "gzip"}), Response(BODY[:MIN_SIZE - 1]))
+    assert "Content-Encoding" not in small.headers
+    error = negotiate(get({"Accept-Encoding": "gzip"}), Response(BODY, status=500))
+    assert "Content-Encoding" not in error.headers and error.get_data() == BODY
+
+
+def test_revalidated_get_gets_a_weak_etag_and_304():
+    first = negotiate(get({"Accept-Encoding": "br"}), Response(BODY), revalidate=True)
+    etag = first.headers["ETag"]
+    assert etag.startswith("W/") and first.headers["Cache-Control"] == "no-cache"
+
+    # the ETag was taken before compression, so it matches whatever encoding the client got
+    request = get({"If-None-Match": etag, "Accept-Encoding": "gzip"})
+    status, headers, body = served(request, negotiate(request, Response(BODY), revalidate=True))
+    assert status.startswith("304") and body == b""
+    assert headers["ETag"] == etag and "Content-Encoding" not in headers
+
+    changed = negotiate(get({"If-None-Match": etag}), Response(BODY + b" "), revalidate=True)
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+
+def test_only_revalidated_gets_get_an_etag():
+    assert "ETag" not in negotiate(get(), Response(BODY)).headers
+    assert "ETag" not in negotiate(get(method="POST"), Response(BODY), revalidate=True).headers
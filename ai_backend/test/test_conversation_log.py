@@ -0,0 +1,152 @@
+import os
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+import conversation_log
+from conversation_log import ConversationLog, LogLocked, PersistentHistory
+
+
+def open_log(path, **kwargs):
+    kwargs.setdefault("commit_interval", 0)
+    return ConversationLog(str(path), fsync=False, **kwargs)
+
+
+def restored(path, conversation_id):
+    log = open_log(path)
+    try:
+        messages = log.restore(conversation_id)
+        return None if messages is None else contents(messages)
+    finally:
+        log.close()
+
+
+def crash(log):
+    """Leave log as a killed process would: unflushed index, lock released"""
+    log.flush()
+    log._lock_file.close()
+
+
+def turns(n):
+    messages = [SystemMessage(content="system")]
+    for i in range(n):
+        messages += [HumanMessage(content=f"q{i}"), AIMessage(content=f"a{i}")]
+    return messages
+
+
+def contents(messages):
+    return [m.content for m in messages]
+
+
+def test_restore_after_restart(tmp_path):
+    log = open_log(tmp_path)
+    for n in range(1, 4):
+        log.sync("c", turns(n))
+    assert not log.sync("c", turns(3))  # nothing new
+    log.close()
+
+    assert restored(tmp_path, "c") == contents(turns(3))
+    assert restored(tmp_path, "other") is None
+
+
+def test_torn_record_is_cut_off(tmp_path):
+    log = open_log(tmp_path)
+    log.sync("c", turns(1))
+    log.sync("c", turns(2))
+    crash(log)
+    segment = log._segment_path(log._segment)
+    # a crash in the middle of writing the last record, before any checkpoint
+    assert not os.path.exists(os.path.join(str(tmp_path), "index.json"))
+    with open(segment, "r+b") as f:
+        f.truncate(os.path.getsize(segment) - 3)
+
+    recovered = open_log(tmp_path)
+    assert contents(recovered.restore("c")) == contents(turns(1))
+    recovered.sync("c", turns(3))
+    recovered.close()
+    assert restored(tmp_path, "c") == contents(turns(3))
+
+
+def test_segments_replayed_after_a_crash_are_still_compacted(tmp_path):
+    log = open_log(tmp_path, segment_size=256, snapshot_every=2, checkpoint_every=1000)
+    log.sync("c", turns(1))
+    crash(log)
+
+    recovered = open_log(tmp_path, segment_size=256, snapshot_every=2, checkpoint_every=1)
+    assert recovered._refs == {1: 1}
+    for n in range(2, 8):
+        recovered.sync("c", turns(n))
+        recovered.flush()
+    recovered.close()
+    # the conversation was snapshotted past segment 1, nothing refers to it any more
+    assert 1 not in recovered._segments()
+    assert restored(tmp_path, "c") == contents(turns(7))
+
+
+def test_log_directory_is_locked_to_one_process(tmp_path):
+    log = open_log(tmp_path)
+    with pytest.raises(LogLocked):
+        open_log(tmp_path)
+    log.close()
+    open_log(tmp_path).close()
+
+
+def test_snapshots_release_old_segments(tmp_path):
+    log = open_log(tmp_path, segment_size=256, snapshot_every=2, checkpoint_every=1)
+    for n in range(1, 12):
+        log.sync("c", turns(n))
+        log.flush()
+    log.close()
+
+    segments = log._segments()
+    assert len(segments) < 11
+    assert segments[0] > 1  # the segments before the last snapshot are gone
+    assert restored(tmp_path, "c") == contents(turns(11))
+
+
+def test_failed_commit_is_rewritten_as_a_snapshot(tmp_path):
+    log = open_log(tmp_path)
+    log.sync("c", turns(1))
+    log.flush()
+    write, calls = log._write, []
+
+    def fail_once(buffer):
+        calls.append(buffer)
+        if len(calls) == 1:
+            log._file.write(buffer[:5])
+            raise OSError("disk full")
+        write(buffer)
+
+    log._write = fail_once
+    log.sync("c", turns(2))
+    log.flush()
+    log.sync("c", turns(3))
+    log.close()
+    assert restored(tmp_path, "c") == contents(turns(3))
+
+
+def test_second_worker_keeps_history_in_memory(tmp_path, monkeypatch):
+    holder = open_log(tmp_path / "log")
+    monkeypatch.setattr(conversation_log, "_log", None)
+    monkeypatch.setattr(conversation_log, "_log_unavailable", False)
+    monkeypatch.setattr(conversation_log, "LOG_DIR", str(tmp_path / "log"))
+    monkeypatch.setattr(conversation_log, "FALLBACK_LOG_DIR", str(tmp_path / "fallback"))
+
+    assert conversation_log.get_log() is None
+    assert not (tmp_path / "fallback").exists()
+    holder.close()
+
+
+def test_history_falls_back_to_memory_without_a_log_dir(tmp_path, monkeypatch):
+    blocked = tmp_path / "file"
+    blocked.write_text("")
+    monkeypatch.setattr(conversation_log, "_log", None)
+    monkeypatch.setattr(conversation_log, "_log_unavailable", False)
+    monkeypatch.setattr(conversation_log, "LOG_DIR", str(blocked / "log"))
+    monkeypatch.setattr(conversation_log, "FALLBACK_LOG_DIR", str(blocked / "fallback"))
+
+    history = PersistentHistory()
+    assert "c" not in history
+    history["c"] = turns(1)
+    assert not history.sync("c")
+    assert contents(history["c"]) == contents(turns(1))
@@ -0,0 +1,97 @@
+import pytest
+
+from chain import Contract, LocalJsonRpc, encode_abi
+from governance_indexer import CONFIRMATIONS, WEI, GovernanceIndexer
+
+GOVERNANCE = "0x" + "90" * 20
+TOKEN = "0x" + "70" * 20
+ALICE, BOB, CAROL = ("0x" + c * 20 for c in ("a1", "b2", "c3"))
+VOTING_PERIOD = 3600
+
+
+@pytest.fixture
+def chain():
+    rpc = LocalJsonRpc()
+    governance = Contract("ClampifyGovernance", GOVERNANCE)
+    token = Contract("ClampifyToken", TOKEN)
+    rpc.on_call(TOKEN, token.selector("totalSupply"), lambda data: "0x" + encode_abi(["uint256"], [1000 * WEI]).hex())
+    rpc.add_log(governance.encode_log("GovernanceActivated", 1, tokenAddress=TOKEN, proposalThreshold=WEI,
+                                      quorum=10, votingPeriod=VOTING_PERIOD))
+    rpc.add_log(governance.encode_log("ProposalCreated", 2, tokenAddress=TOKEN, proposalId=1,
+                                      title="Burn the treasury", proposer=ALICE))
+
+    def vote(block, voter, support, weight, log_index=0):
+        rpc.add_log(governance.encode_log("VoteCast", block, log_index, tokenAddress=TOKEN, proposalId=1,
+                                          voter=voter, support=support, weight=weight * WEI))
+
+    return rpc, governance, vote
+
+
+def indexed(rpc, tmp_path):
+    rpc.head += CONFIRMATIONS
+    indexer = GovernanceIndexer(rpc, str(tmp_path), GOVERNANCE, start_block=0)
+    indexer.sync()
+    return indexer
+
+
+def test_votes_are_tallied_once_per_voter(chain, tmp_path):
+    rpc, _, vote = chain
+    vote(3, ALICE, True, 60)
+    vote(3, BOB, False, 30, log_index=1)
+    vote(4, ALICE, False, 60)  # a repeated vote is ignored, like the contract's hasVoted check
+    indexer = indexed(rpc, tmp_path)
+
+    assert indexer.has_voted(TOKEN, 1, ALICE) and indexer.has_voted(TOKEN, 1, BOB)
+    assert not indexer.has_voted(TOKEN, 1, CAROL)
+    assert indexer.vote_of(TOKEN, 1, ALICE) is True and indexer.vote_of(TOKEN, 1, BOB) is False
+    assert indexer.has_voted(TOKEN, 2, ALICE) is None
+    p = indexer.proposal(TOKEN, 1, now=0)
+    assert (p["yes_votes"], p["no_votes"], p["voters"], p["status"]) == (60, 30, 2, "active")
+
+
+def test_quorum_uses_the_contract_integer_math(chain, tmp_path):
+    rpc, _, vote = chain
+    vote(3, ALICE, True, 99)
+    indexer = indexed(rpc, tmp_path)
+    assert indexer.quorum_threshold(TOKEN) == 100 * WEI  # 10% of 1000 tokens
+    assert indexer.quorum_met(TOKEN, 1) is False
+    after_voting = indexer.proposal(TOKEN, 1)["voting_ends_at"] + 1
+    assert indexer.proposal(TOKEN, 1, now=after_voting)["status"] == "defeated"
+
+    vote(5, BOB, True, 1)
+    rpc.head = 5 + CONFIRMATIONS
+    indexer.sync()
+    assert indexer.quorum_met(TOKEN, 1) is True
+    assert indexer.proposal(TOKEN, 1, now=after_voting)["status"] == "passed"
+
+
+def test_state_survives_a_restart(chain, tmp_path):
+    rpc, governance, vote = chain
+    vote(3, ALICE, True, 60)
+    indexed(rpc, tmp_path)
+    rpc.add_log(governance.encode_log("ProposalExecuted", 6, tokenAddress=TOKEN, proposalId=1, success=True))
+    rpc.head = 6 + CONFIRMATIONS
+
+    restarted = GovernanceIndexer(rpc, str(tmp_path), GOVERNANCE, start_block=0)
+    assert restarted.has_voted(TOKEN, 1, ALICE)
+    assert restarted.sync() == 1  # only the new event
+    assert restarted.proposal(TOKEN, 1)["status"] == "executed"
+
+
+def test_blocks_within_the_confirmation_depth_wait(chain, tmp_path):
+    rpc, _, vote = chain
+    vote(3, ALICE, True, 60)
+    rpc.head = 3 + CONFIRMATIONS - 1
+    indexer = GovernanceIndexer(rpc, str(tmp_path), GOVERNANCE, start_block=0)
+    indexer.sync()
+    assert indexer.proposal(TOKEN, 1)["voters"] == 0
+
+
+def test_context_lists_the_proposals(chain, tmp_path):
+    rpc, _, vote = chain
+    vote(3, ALICE, True, 60)
+    indexer = indexed(rpc, tmp_path)
+    context = indexer.context_for([TOKEN], now=0)
+    assert context.startswith("Live Clampify governance proposals:")
+    assert '"Burn the treasury": active, 60 for / 0 against from 1 voters' in context
+    assert indexer.context_for(["0x" + "00" * 20]) == ""
@@ -0,0 +1,73 @@
+import pytest
+
+import intents
+from intents import BUY, CREATE, SELL, IntentRouter, classify, parse_amount, parse_supply
+
+CATALOG = [{"name": "Pepe", "symbol": "PEPE"}, {"name": "Moon Dog", "symbol": "MDOG"}]
+
+
+@pytest.mark.parametrize("text, amount", [
+    ("1,000", "1000"),
+    ("2.5k", "2500"),
+    ("3 million", "3000000"),
+    ("1000000000000000000000000", "1000000000000000000000000"),
+    ("9007199254740993", "9007199254740993"),  # 2^53 + 1
+    ("1.5 billion", "1500000000"),
+    ("0.25", "0.25"),
+    ("no number here", None),
+])
+def test_parse_amount_is_exact(text, amount):
+    assert parse_amount(text) == amount
+
+
+def test_supply_must_be_whole():
+    assert parse_supply("supply 1000.5") is None
+    assert parse_supply("2.5k") == "2500"
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("Create a meme coin named Moon Dog with symbol MDOG and initial supply 1000000", CREATE),
+    ("launch my own token", CREATE),
+    ("I want to buy a meme coin", BUY),
+    ("please buy 100 pepe", BUY),
+    ("can you sell my pepe", SELL),
+    ("sell my tokens", SELL),
+    ("I want to buy a house", None),
+    ("sell my car", None),
+    ("buy", None),
+    ("should I sell my pepe now", None),
+    ("How do I buy a coin", None),
+    ("Explain why people sell in a bear market", None),
+    ("make my token stand out, any tips", None),
+])
+def test_classify(text, intent):
+    router = IntentRouter(catalog=CATALOG)
+    assert classify(text, router.find_coin) == intent
+
+
+def test_large_supply_reaches_create_coin_unchanged(monkeypatch):
+    calls = []
+    monkeypatch.setattr(intents, "create_coin", lambda *args, **kwargs: calls.append(args) or {"success": True})
+    router = IntentRouter(catalog=CATALOG)
+    assert "Launch" in router.handle("c", "create a coin named Big with symbol BIG and supply 1000000000000000000000000")
+    assert calls == []  # nothing happens before the yes
+    router.handle("c", "yes")
+    assert calls == [("Big", "BIG", "1000000000000000000000000")]
+
+
+def test_buy_is_not_reported_as_done(monkeypatch):
+    monkeypatch.setattr(intents, "buy_coin", lambda name, amount: None)
+    router = IntentRouter(catalog=CATALOG)
+    assert "Buy 100" in router.handle("c", "buy 100 pepe")
+    reply = router.handle("c", "yes")
+    assert "isn't supported yet" in reply and "added to your account" not in reply
+
+
+def test_anything_but_yes_drops_the_pending_action(monkeypatch):
+    calls = []
+    monkeypatch.setattr(intents, "create_coin", lambda *args, **kwargs: calls.append(args))
+    router = IntentRouter(catalog=CATALOG)
+    router.handle("c", "create a coin named Big with symbol BIG and supply 1000")
+    assert router.handle("c", "tell me a joke") is None
+    assert router.handle("c", "yes") is None
+    assert calls == [] and router.pending("c") is None
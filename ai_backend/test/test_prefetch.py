@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+from prefetch import SpeculativeCache, list_topics, normalize, predict_followups
+from ratelimit import FairScheduler
+
+REPLY = "Here are some options:<ul><li><b>Staking</b>: earn yield</li><li>DeFi - lending</li><li>NFTs</li></ul>"
+
+
+def settle(cache):
+    if cache._executor is not None:
+        cache._executor.shutdown(wait=True)
+        cache._executor = None
+
+
+@pytest.fixture
+def cache():
+    cache = SpeculativeCache(enabled=True)
+    yield cache
+    settle(cache)
+
+
+def test_topics_and_followups():
+    assert list_topics(REPLY) == ["Staking", "DeFi", "NFTs"]
+    assert list_topics("1. Bitcoin (BTC)\n2) Ether\nsome text") == ["Bitcoin", "Ether"]
+    assert predict_followups(REPLY) == [("Tell me more about Staking", {"staking", "1"}),
+                                        ("Tell me more about DeFi", {"defi", "2"})]
+    assert normalize("Tell me more about <b>Staking</b>!") == "staking"
+
+
+def test_predicted_followup_is_served_once(cache):
+    assert cache.schedule("c", 1, REPLY, lambda query: f"reply to {query}") == 2
+    settle(cache)
+    assert cache.lookup("c", "tell me about staking", 1) == "reply to Tell me more about Staking"
+    # one reply per prediction, and the conversation has moved on
+    assert cache.lookup("c", "2", 1) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_stale_versions_and_other_questions_miss(cache):
+    cache.schedule("c", 1, REPLY, lambda query: "reply")
+    settle(cache)
+    assert cache.lookup("c", "staking", 2) is None
+    cache.schedule("c", 2, REPLY, lambda query: "reply")
+    settle(cache)
+    assert cache.lookup("c", "what about gas fees", 2) is None
+    assert cache.stats()["misses"] == 1 and cache.stats()["conversations"] == 0
+
+
+def test_failed_runs_are_discarded(cache):
+    def fail(query):
+        raise RuntimeError("upstream down")
+
+    cache.schedule("c", 1, REPLY, fail)
+    settle(cache)
+    assert cache.lookup("c", "staking", 1) is None
+    assert cache.stats()["discarded"] == 2
+
+
+def test_disabled_cache_does_nothing():
+    cache = SpeculativeCache(enabled=False)
+    assert cache.schedule("c", 1, REPLY, lambda query: "reply") == 0
+    assert cache.lookup("c", "staking", 1) is None
+
+
+def test_live_traffic_keeps_the_upstream():
+    scheduler = FairScheduler(max_concurrency=2, max_wait=5)
+    scheduler.acquire("user")
+    cache = SpeculativeCache(scheduler=scheduler, enabled=True)
+    calls = []
+    cache.schedule("c", 1, REPLY, calls.append)
+    settle(cache)
+    assert calls == [] and cache.stats()["skipped_busy"] == 2
+    scheduler.release()
+
+
+def test_budget_limits_speculative_calls():
+    cache = SpeculativeCache(enabled=True, budget=(1, 1e-9))
+    calls = []
+    cache.schedule("c", 1, REPLY, calls.append)
+    settle(cache)
+    assert len(calls) == 1 and cache.stats()["skipped_budget"] == 1
+
+
+def test_speculative_calls_release_their_slot():
+    scheduler = FairScheduler(max_concurrency=1, max_wait=5)
+    cache = SpeculativeCache(scheduler=scheduler, enabled=True)
+    running = threading.Event()
+    cache.schedule("c", 1, REPLY, lambda query: running.set() or "reply")
+    settle(cache)
+    assert running.is_set()
+    assert scheduler.stats()["active"] == 0
@@ -0,0 +1,87 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+from chain import Contract, LocalJsonRpc
+from price_indexer import ColumnStore, PriceIndexer, TRADE_COLUMNS, CONFIRMATIONS, WEI
+
+FACTORY = "0x" + "fa" * 20
+TOKEN = "0x" + "70" * 20
+BUYER = "0x" + "b0" * 20
+
+
+def trades(n, start=0):
+    return {name: np.arange(start, start + n) for name in TRADE_COLUMNS}
+
+
+def test_column_store_drops_rows_of_an_interrupted_append(tmp_path):
+    store = ColumnStore(str(tmp_path), TRADE_COLUMNS)
+    store.append(trades(3))
+    # a crash after the first column of the next append, halfway through one of its values
+    with open(tmp_path / "ts.bin", "ab") as f:
+        f.write(np.arange(2, dtype="<f8").tobytes() + b"\x00\x00\x00")
+
+    reopened = ColumnStore(str(tmp_path), TRADE_COLUMNS)
+    assert len(reopened) == 3
+    assert os.path.getsize(tmp_path / "ts.bin") == 3 * 8
+    reopened.append(trades(1, start=3))
+    assert list(ColumnStore(str(tmp_path), TRADE_COLUMNS)["ts"]) == [0, 1, 2, 3]
+
+
+def test_column_store_cuts_back_to_committed_rows(tmp_path):
+    store = ColumnStore(str(tmp_path), TRADE_COLUMNS)
+    store.append(trades(5))
+
+    reopened = ColumnStore(str(tmp_path), TRADE_COLUMNS, rows=2)
+    assert list(reopened["block"]) == [0, 1]
+    for name, dtype in TRADE_COLUMNS.items():
+        assert os.path.getsize(tmp_path / f"{name}.bin") == 2 * np.dtype(dtype).itemsize
+
+
+@pytest.fixture
+def chain():
+    rpc = LocalJsonRpc()
+    factory, token = Contract("ClampifyFactory", FACTORY), Contract("ClampifyToken", TOKEN)
+    rpc.add_log(factory.encode_log("TokenCreated", 1, tokenAddress=TOKEN, creator=BUYER, name="Pepe", symbol="PEPE"))
+
+    def buy(block):
+        rpc.add_log(token.encode_log("TokensPurchased", block, buyer=BUYER, amountPaid=WEI,
+                                     tokensMinted=10 * WEI, price=WEI // 10))
+    return rpc, buy
+
+
+def test_trades_ingested_before_a_crash_are_not_duplicated(tmp_path, chain):
+    rpc, buy = chain
+    buy(2)
+    rpc.head = 2 + CONFIRMATIONS
+    indexer = PriceIndexer(rpc, str(tmp_path), FACTORY, None, start_block=0)
+    assert indexer.sync() == 1
+
+    buy(3)
+    rpc.head = 3 + CONFIRMATIONS
+    indexer._save_state = lambda: (_ for _ in ()).throw(OSError("disk full"))
+    with pytest.raises(OSError):
+        indexer.sync()
+
+    # the restart indexes block 3 again, the trade appended before the crash must not count twice
+    restarted = PriceIndexer(rpc, str(tmp_path), FACTORY, None, start_block=0)
+    assert restarted.sync() == 1
+    assert list(restarted._store(TOKEN, "trades")["block"]) == [2, 3]
+    assert [c["volume"] for c in restarted.ohlcv("PEPE", resolution=86400)] == [20.0]
+
+
+def test_state_without_row_counts_keeps_existing_files(tmp_path, chain):
+    rpc, buy = chain
+    buy(2)
+    rpc.head = 2 + CONFIRMATIONS
+    PriceIndexer(rpc, str(tmp_path), FACTORY, None, start_block=0).sync()
+    state_path = tmp_path / "state.json"
+    state = json.loads(state_path.read_text())
+    del state["rows"]
+    state_path.write_text(json.dumps(state))
+
+    reopened = PriceIndexer(rpc, str(tmp_path), FACTORY, None, start_block=0)
+    assert reopened.state["rows"] == {f"{TOKEN}/trades": 1}
+    assert len(reopened._store(TOKEN, "trades")) == 1
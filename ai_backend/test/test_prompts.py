@@ -0,0 +1,44 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+import prompts
+from prompts import (AGENT_ACTIONS, CHARACTERS, COMPACT_BLOCKS, UI_INSTRUCTIONS, check_prompt, compress_history,
+                     compress_prompt, fingerprint, full_prompt, minify, system_prompt)
+
+
+@pytest.mark.parametrize("character", CHARACTERS)
+def test_compressed_prompts_keep_every_required_phrase(character):
+    original, compressed = full_prompt(character), compress_prompt(character)
+    assert check_prompt(original, compressed) == []
+    assert len(compressed) < len(original)
+
+
+def test_compact_blocks_match_the_verbose_ones():
+    # a failure means UI_INSTRUCTIONS or AGENT_ACTIONS changed, rewrite the compact block with it
+    assert fingerprint(UI_INSTRUCTIONS) == COMPACT_BLOCKS["UI"][0]
+    assert fingerprint(AGENT_ACTIONS) == COMPACT_BLOCKS["ACTIONS"][0]
+
+
+def test_dropped_phrases_are_reported():
+    original = full_prompt("crypto-trader")
+    marker = "~simulatetrades#buyers#eth_per_buyer#sellers~"
+    assert check_prompt(original, original.replace(marker, "")) == [marker]
+
+
+def test_minify():
+    assert minify("   a   b\n\n  A B!\n c ") == "a b\nc"
+
+
+def test_unknown_characters_get_the_advisor():
+    assert system_prompt("nobody") == system_prompt("blockchain-advisor")
+
+
+def test_old_replies_are_reduced_to_text(monkeypatch):
+    monkeypatch.setattr(prompts, "COMPRESS_HISTORY", True)
+    messages = [SystemMessage(content="<b>system</b>"), HumanMessage(content="<q>"),
+                AIMessage(content='<div class="bg-[#ffae5c]"><p>Hello &amp; welcome</p></div>'),
+                HumanMessage(content="next"), AIMessage(content="<p>recent</p>")]
+    compressed = compress_history(messages, keep_recent=2)
+    assert [m.content for m in compressed] == ["<b>system</b>", "<q>", "Hello & welcome", "next", "<p>recent</p>"]
+    monkeypatch.setattr(prompts, "COMPRESS_HISTORY", False)
+    assert compress_history(messages, keep_recent=2) is messages
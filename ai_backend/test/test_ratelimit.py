@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+import ratelimit
+from ratelimit import FairScheduler, InMemoryRateLimiter, RateLimited, SchedulerTimeout, SQLiteRateLimiter
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    monkeypatch.setattr(ratelimit.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def limiter(request, tmp_path, clock):
+    if request.param == "sqlite":
+        return SQLiteRateLimiter(str(tmp_path / "ratelimit.db"))
+    return InMemoryRateLimiter()
+
+
+def test_bucket_allows_a_burst_then_refills(limiter, clock):
+    for _ in range(3):
+        limiter.take("client:a", 3, 1.0)
+    with pytest.raises(RateLimited) as excinfo:
+        limiter.take("client:a", 3, 1.0)
+    assert excinfo.value.retry_after == pytest.approx(1.0)
+    assert excinfo.value.retry_after_header == "1"
+
+    limiter.take("client:b", 3, 1.0)  # other keys have their own bucket
+    clock.now += 1
+    limiter.take("client:a", 3, 1.0)
+
+
+def test_full_buckets_are_swept(clock):
+    limiter = InMemoryRateLimiter(sweep_interval=60)
+    limiter.take("idle", 2, 1.0)
+    limiter.take("busy", 100, 0.001)
+    clock.now += 60
+    limiter.take("new", 2, 1.0)
+    assert set(limiter._buckets) == {"busy", "new"}
+
+
+def test_full_sqlite_buckets_are_swept(tmp_path, clock):
+    limiter = SQLiteRateLimiter(str(tmp_path / "ratelimit.db"), sweep_interval=60)
+    limiter.take("idle", 2, 1.0)
+    limiter.take("busy", 100, 0.001)
+    clock.now += 60
+    limiter.take("new", 2, 1.0)
+    keys = {key for key, in limiter._conn().execute("SELECT key FROM buckets")}
+    assert keys == {"busy", "new"}
+
+
+def test_scheduler_serves_the_lighter_client_first():
+    scheduler = FairScheduler(max_concurrency=1, max_wait=5)
+    scheduler.acquire("holder")
+    order, threads = [], []
+
+    def request(client):
+        with scheduler.slot(client):
+            order.append(client)
+
+    # the heavy client queues three requests before the light one sends its first
+    for client in ("heavy", "heavy", "heavy", "light"):
+        thread = threading.Thread(target=request, args=(client,))
+        thread.start()
+        threads.append(thread)
+        while scheduler.stats()["waiting"] < len(threads):
+            time.sleep(0.001)
+    scheduler.release()
+    for thread in threads:
+        thread.join(5)
+    assert order.index("light") < 2
+
+
+def test_scheduler_times_out_waiters():
+    scheduler = FairScheduler(max_concurrency=1, max_wait=0.05)
+    scheduler.acquire("a")
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire("b")
+    assert scheduler.stats() == {"active": 1, "waiting": 0, "max_concurrency": 1}
+
+
+def test_try_acquire_never_waits_or_jumps_the_queue():
+    scheduler = FairScheduler(max_concurrency=1, max_wait=5)
+    assert scheduler.try_acquire("prefetch")
+    assert not scheduler.try_acquire("prefetch")  # full
+    scheduler.release()
+
+    scheduler.acquire("a")
+    waiter = threading.Thread(target=lambda: (scheduler.acquire("b"), scheduler.release()))
+    waiter.start()
+    while not scheduler.stats()["waiting"]:
+        time.sleep(0.001)
+    # a slot is free now, but "b" was queued first
+    scheduler.max_concurrency = 2
+    assert not scheduler.try_acquire("prefetch")
+    scheduler.release()
+    waiter.join(5)
+    assert scheduler.try_acquire("prefetch")
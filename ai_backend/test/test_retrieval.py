@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import retrieval
+from retrieval import RetrievalIndex, build_index, retrieve_context, tokenize
+
+CATALOG = [
+    {"name": "Pepe", "symbol": "PEPE", "description": "the frog meme coin"},
+    {"name": "Moon Dog", "symbol": "MDOG", "description": "a dog that wants to reach the moon"},
+]
+DOCS = """# Staking
+Staking locks tokens to secure a proof of stake network and earn rewards.
+
+# Gas
+Gas is the fee paid to validators for every transaction on Ethereum.
+"""
+
+
+@pytest.fixture
+def knowledge(tmp_path):
+    knowledge = tmp_path / "knowledge"
+    knowledge.mkdir()
+    (knowledge / "token_catalog.json").write_text(json.dumps(CATALOG))
+    (knowledge / "docs.md").write_text(DOCS)
+    return knowledge
+
+
+@pytest.fixture
+def index(knowledge, tmp_path):
+    build_index(str(knowledge), str(tmp_path / "index"))
+    return RetrievalIndex(str(tmp_path / "index"))
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("What is the Gas fee for an ERC-20?") == ["gas", "fee", "erc", "20"]
+
+
+def test_search_ranks_the_matching_chunk_first(index):
+    assert index.num_chunks == 5  # catalog listing, one chunk per token, two doc sections
+    (score, best), = index.search("how much is the gas fee", top_k=1)
+    assert best == {"source": "docs.md", "title": "Gas",
+                    "text": "Gas is the fee paid to validators for every transaction on Ethereum."}
+    assert index.search("frog")[0][1]["title"] == "Pepe (PEPE)"
+    assert index.search("unrelated words only") == []
+
+
+def test_index_is_rebuilt_when_the_sources_change(knowledge, tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval, "KNOWLEDGE_DIR", str(knowledge))
+    monkeypatch.setattr(retrieval, "INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(retrieval, "_index", None)
+    assert "[Staking]" in retrieve_context("earn staking rewards")
+
+    assert not retrieval._index_is_stale(str(knowledge), str(tmp_path / "index"))
+    (knowledge / "more.md").write_text("# Bridges\nBridges move tokens between chains.")
+    assert retrieval._index_is_stale(str(knowledge), str(tmp_path / "index"))
+
+
+def test_retrieval_failures_leave_the_prompt_alone(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval, "KNOWLEDGE_DIR", str(tmp_path / "missing"))
+    monkeypatch.setattr(retrieval, "INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(retrieval, "_index", None)
+    assert retrieve_context("gas") == ""
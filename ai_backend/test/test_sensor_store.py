@@ -0,0 +1,60 @@
+import pytest
+
+from sensor_store import ChannelSeries, Rollup, SensorStore
+
+RESOLUTIONS = {1: 120, 10: 60, 60: 60}
+
+
+@pytest.fixture
+def store():
+    store = SensorStore(["temperature"], raw_size=64, resolutions=RESOLUTIONS)
+    for t in range(600):
+        store.add("temperature", 1000.0 + t, float(t % 10))
+    return store
+
+
+def test_windows_are_aggregated(store):
+    windows = store.aggregate("temperature", 10, 1000, 1030)
+    assert [w["t"] for w in windows] == [1000, 1010, 1020]
+    assert windows[0] == {"t": 1000, "min": 0.0, "max": 9.0, "mean": 4.5, "count": 10}
+
+
+def test_raw_and_rollup_answers_agree(store):
+    # the last 60 seconds are still in the raw ring, the 1s rollup covers them too
+    raw = store.aggregate("temperature", 1, 1540, 1600)
+    assert len(raw) == 60 and all(w["count"] == 1 for w in raw)
+    assert store.aggregate("temperature", 30, 1540, 1600) == [
+        {"t": 1530, "min": 0.0, "max": 9.0, "mean": 4.5, "count": 20},
+        {"t": 1560, "min": 0.0, "max": 9.0, "mean": 4.5, "count": 30},
+        {"t": 1590, "min": 0.0, "max": 9.0, "mean": 4.5, "count": 10},
+    ]
+
+
+def test_long_spans_use_a_coarse_rollup(store):
+    series = store.series["temperature"]
+    assert series.rollup_for(60, 3600).resolution == 60
+    assert series.rollup_for(30, 60).resolution == 10
+    assert series.rollup_for(0.5, 60) is None
+    windows = store.aggregate("temperature", 60, 1000, 1600)
+    # windows line up with multiples of the resolution, not with since
+    assert windows[0]["t"] == 960 and len(windows) == 11
+    assert sum(w["count"] for w in windows) == 600
+
+
+def test_rollup_slots_are_reused_a_ring_later():
+    rollup = Rollup(10, 3)
+    rollup.add(0, 1.0)
+    rollup.add(30, 5.0)  # same slot as 0, a full ring later
+    assert list(rollup.buckets(0, 40)) == [(30, 5.0, 5.0, 5.0, 1)]
+
+
+def test_raw_ring_keeps_the_latest_samples():
+    series = ChannelSeries(raw_size=4, resolutions={})
+    for t in range(10):
+        series.add(float(t), float(t))
+    assert series.raw(0, 10) == [(6.0, 6.0), (7.0, 7.0), (8.0, 8.0), (9.0, 9.0)]
+
+
+def test_unknown_channel(store):
+    with pytest.raises(KeyError):
+        store.aggregate("humidity", 10, 0, 10)
@@ -0,0 +1,81 @@
+import math
+
+import numpy as np
+import pytest
+
+import simulator
+from simulator import (PRICE_INCREASE_PERCENT, STEP_SIZE, calculate_trading_fee, curve_cost, purchase_price,
+                       purchase_return, run_tool, sale_return, simulate_curve, step_price)
+
+PRICE = 0.0001
+
+
+def contract_purchase_return(supply, eth, initial_price=PRICE, max_supply=simulator.DEFAULT_MAX_SUPPLY):
+    """ClampifyToken.calculatePurchaseReturn, walking the curve one step at a time"""
+    minted = 0.0
+    while eth > 0 and supply < max_supply:
+        price = initial_price * (100 + (supply // STEP_SIZE) * PRICE_INCREASE_PERCENT) / 100
+        room = min(STEP_SIZE - supply % STEP_SIZE, max_supply - supply)
+        tokens = min(room, eth / price)
+        minted += tokens
+        supply += tokens
+        eth -= tokens * price
+    return minted
+
+
+@pytest.mark.parametrize("supply, eth", [
+    (0, 0.5),
+    (0, 1.0),  # exactly one full step
+    (9_999, 0.01),
+    (25_000, 7.3),
+    (990_000, 100.0),  # runs into the max supply
+])
+def test_purchase_return_matches_the_contract(supply, eth):
+    assert purchase_return(supply, eth, PRICE) == pytest.approx(contract_purchase_return(supply, eth), rel=1e-9)
+
+
+def test_step_price_and_cost():
+    assert step_price(0, PRICE) == pytest.approx(PRICE)
+    assert step_price(STEP_SIZE, PRICE) == pytest.approx(PRICE * (1 + PRICE_INCREASE_PERCENT / 100))
+    # two full steps at the two step prices
+    assert curve_cost(2 * STEP_SIZE, PRICE) == pytest.approx(STEP_SIZE * PRICE * (2 + PRICE_INCREASE_PERCENT / 100))
+    assert purchase_price(5_000, 10_000, PRICE) == pytest.approx(curve_cost(15_000, PRICE) - curve_cost(5_000, PRICE))
+
+
+def test_selling_what_was_bought_returns_the_eth_less_the_fee():
+    minted = purchase_return(12_345, 3.0, PRICE)
+    net, fee = sale_return(12_345 + minted, minted, PRICE)
+    assert fee == pytest.approx(calculate_trading_fee(3.0))
+    assert net + fee == pytest.approx(3.0)
+
+
+def test_simulated_traders_cannot_sell_more_than_they_hold():
+    result = simulate_curve([[-500.0, 0.5, -1e9]], initial_supply=50_000, initial_price=PRICE)
+    # the first sell is dropped, the last one only sells what the buy minted
+    assert result["supply"][0] == pytest.approx(50_000)
+    assert result["reserve"][0] == pytest.approx(0, abs=1e-9)
+    assert result["fees"][0] == pytest.approx(calculate_trading_fee(0.5))
+
+
+def test_run_tool_summarizes_the_scenarios():
+    summary = run_tool(10, 0.1, sellers=2, scenarios=200, seed=1)
+    assert "200 random orderings of 10 buys" in summary
+    assert "nan" not in summary
+
+
+@pytest.mark.parametrize("eth_per_buyer", [0, -1, math.nan, math.inf])
+def test_run_tool_rejects_a_bad_trade_size(eth_per_buyer):
+    with pytest.raises(ValueError):
+        run_tool(10, eth_per_buyer)
+
+
+@pytest.mark.parametrize("buyers, sellers", [(0, 0), (-1, 5), (simulator.MAX_TRADES, 1)])
+def test_run_tool_rejects_a_bad_trade_count(buyers, sellers):
+    with pytest.raises(ValueError):
+        run_tool(buyers, 0.1, sellers=sellers)
+
+
+def test_large_runs_use_fewer_scenarios():
+    summary = run_tool(simulator.MAX_TRADES, 0.01, scenarios=simulator.MAX_SCENARIOS, seed=1)
+    assert f"{simulator.MAX_CELLS // simulator.MAX_TRADES} random orderings" in summary
+    assert np.isfinite(float(summary.split("median final price ")[1].split()[0]))
@@ -0,0 +1,97 @@
+import pytest
+
+from chain import Contract, LocalJsonRpc, encode_abi
+from snapshot import SnapshotLoading, TokenSnapshot, WEI
+
+FACTORY = "0x" + "fa" * 20
+PEPE = "0x" + "11" * 20
+MDOG = "0x" + "22" * 20
+CREATOR = "0x" + "c0" * 20
+
+
+def returns(contract, function_name, *values):
+    types = [o["type"] for o in contract.functions[function_name]["outputs"]]
+    return lambda data: "0x" + encode_abi(types, values).hex()
+
+
+class Chain:
+    def __init__(self):
+        self.rpc = LocalJsonRpc()
+        self.factory = Contract("ClampifyFactory", FACTORY)
+        self.addresses = []
+        self.rpc.on_call(FACTORY, self.factory.selector("getAllTokens"),
+                         lambda data: returns(self.factory, "getAllTokens", self.addresses)(data))
+        self.rpc.on_call(FACTORY, self.factory.selector("getTokenInfo"),
+                         returns(self.factory, "getTokenInfo", CREATOR, 1_700_000_000, 86400, True, 0))
+
+    def token(self, address, name, symbol, price):
+        if address not in self.addresses:
+            self.addresses.append(address)
+        token = Contract("ClampifyToken", address)
+        for function_name, values in (("name", [name]), ("symbol", [symbol]), ("totalSupply", [1000 * WEI]),
+                                      ("getTokenStatistics", [int(price * WEI), 0, 0, 0, 0])):
+            self.rpc.on_call(address, token.selector(function_name), returns(token, function_name, *values))
+        return token
+
+
+@pytest.fixture
+def chain():
+    chain = Chain()
+    chain.token(PEPE, "Pepe", "PEPE", 0.001)
+    chain.token(MDOG, "Moon Dog", "MDOG", 0.002)
+    chain.rpc.head = 10
+    return chain
+
+
+def test_lookups_wait_for_the_first_load(chain):
+    snapshot = TokenSnapshot(chain.rpc, FACTORY, dex_address=None)
+    with pytest.raises(SnapshotLoading):
+        snapshot.get("PEPE")
+    assert snapshot._wake.is_set()  # the refresh thread was asked to load now
+
+
+def test_catalog_is_loaded_in_a_few_batches(chain):
+    snapshot = TokenSnapshot(chain.rpc, FACTORY, dex_address=None)
+    snapshot.load()
+    assert chain.rpc.requests_served == 2  # the token list, then every token's details in one batch
+    assert snapshot.get("$pepe")["price"] == pytest.approx(0.001)
+    assert snapshot.get("moon dog")["symbol"] == "MDOG"
+    assert snapshot.get(MDOG.upper().replace("0X", "0x"))["name"] == "Moon Dog"
+    assert snapshot.get("DOGE") is None
+    assert [t["symbol"] for t in snapshot.search("m")] == ["MDOG"]
+
+
+def test_trades_mark_tokens_stale_until_refreshed(chain):
+    snapshot = TokenSnapshot(chain.rpc, FACTORY, dex_address=None)
+    snapshot.load()
+    pepe = chain.token(PEPE, "Pepe", "PEPE", 0.005)
+    chain.rpc.add_log(pepe.encode_log("TokensSold", 11, seller=CREATOR, amountReceived=WEI // 1000,
+                                      tokensBurned=WEI, price=WEI // 200))
+
+    snapshot.poll_events()
+    assert snapshot._stale_tokens == {PEPE}
+    # lookups keep serving the cached price until the refresh
+    assert snapshot.get("PEPE")["price"] == pytest.approx(0.001)
+    snapshot.refresh()
+    assert snapshot.get("PEPE")["price"] == pytest.approx(0.005)
+    assert not snapshot._stale_tokens
+
+
+def test_new_tokens_are_picked_up(chain):
+    snapshot = TokenSnapshot(chain.rpc, FACTORY, dex_address=None)
+    snapshot.load()
+    doge = "0x" + "33" * 20
+    chain.token(doge, "Doge", "DOGE", 0.003)
+    chain.rpc.add_log(chain.factory.encode_log("TokenCreated", 12, tokenAddress=doge, creator=CREATOR,
+                                               name="Doge", symbol="DOGE"))
+    snapshot.refresh()
+    assert snapshot.get("DOGE")["address"] == doge
+
+
+def test_context_names_only_mentioned_tokens(chain):
+    snapshot = TokenSnapshot(chain.rpc, FACTORY, dex_address=None)
+    snapshot.load()
+    context = snapshot.context_for("Is Moon Dog a better buy than $PEPE?")
+    assert context.startswith("Live Clampify token data:")
+    assert "Moon Dog (MDOG)" in context and "Pepe (PEPE)" in context
+    assert snapshot.context_for("what is gas") == ""